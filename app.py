@@ -1,14 +1,32 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
+import base64
+import hashlib
+import html
+import json
+import math
 import random
 import string
-from datetime import datetime, timedelta
-import smtplib
-from email.mime.text import MIMEText
+import time
+from datetime import date, datetime, timedelta, time as time_of_day
 from dotenv import load_dotenv
-from password_manager import PasswordManager
+from password_manager import PasswordManager, PasswordManagerBusy
+from db_pool import db_connection, get_replicas, pool_stats, replica_stats
+from mail_outbox import get_outbox, outbox_stats
+from cache import CachedValue
+from rate_limit import get_limiter, limiter_stats
+from otp_store import get_otp_store, otp_store_stats
+from entry_import import (IMPORT_MAX_REPORTED_ERRORS, ImportRowError, chunks, copy_entries, load_rows, read_csv,
+                          read_ndjson, text_stream)
+from entry_revisions import load_revision, record_revision
+from mood_trends import next_period, set_mood, summarize_streaks, trend_range
+from resource_versions import (BUMP_VERSION_SQL, CALENDAR_EVENTS, ENTRIES, EVENTS, INTENTIONS, bump_version, get_version,
+                               version_etag)
+from metrics import RequestMetrics, stats_lines
+from compression import ResponseCompressor
+from queries import named_query, query_stats
 from flask_cors import CORS
 
 # Load environment variables
@@ -25,7 +43,25 @@ app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HT
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
-password_manager = PasswordManager()
+# bcrypt runs on a bounded worker pool so logins cannot starve request threads of CPU.
+# Set BCRYPT_TARGET_MS to pick the cost that takes about that long on this hardware.
+password_manager = PasswordManager(
+    rounds=int(os.getenv('BCRYPT_ROUNDS', 12)),
+    mode=os.getenv('BCRYPT_MODE', 'thread'),
+    workers=int(os.getenv('BCRYPT_WORKERS', 0)) or None
+)
+if os.getenv('BCRYPT_TARGET_MS'):
+    password_manager.calibrate(float(os.getenv('BCRYPT_TARGET_MS')))
+
+# Per-endpoint latency histograms, with time split into db / pool / bcrypt / app.
+# Each response carries the same breakdown in a Server-Timing header.
+request_metrics = RequestMetrics()
+request_metrics.init_app(app)
+
+# gzip/brotli/zstd negotiated from Accept-Encoding. Registered after request_metrics so it
+# runs first (after_request hooks run in reverse) and its time is part of the breakdown.
+response_compressor = ResponseCompressor(min_size=int(os.getenv('COMPRESSION_MIN_SIZE', 1024)))
+response_compressor.init_app(app)
 
 # Replace your existing CORS configuration (around line 25) with:
 CORS(app,
@@ -35,46 +71,51 @@ CORS(app,
      allow_headers=['Content-Type', 'Authorization'])
 
 
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST', 'aws-1-us-east-1.pooler.supabase.com'),
-            port=int(os.getenv('DB_PORT', 6543)),
-            user=os.getenv('DB_USER', 'postgres.fhhxgifimxcwfplenhmm'),
-            password=os.getenv('DB_PASS', 'OXsneQjf0vBsxfd5'),
-            database=os.getenv('DB_NAME', 'postgres'),
-            sslmode='require'
-        )
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        raise
+def send_otp_email(email, otp_code):
+    """Queue the OTP email for background delivery; returns False if the outbox is full"""
+    return get_outbox().enqueue(
+        email,
+        'Your Journal App OTP Code',
+        f'Your OTP code is: {otp_code}\nIt will expire in 10 minutes.'
+    )
 
 
-# Email configuration (your existing code)
-EMAIL_USER = os.getenv("EMAIL_ADDRESS")
-EMAIL_PASS = os.getenv("EMAIL_PASSWORD")
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+def issue_otp(email):
+    """Generate a 10-minute OTP for email and keep it in the OTP store"""
+    otp_code = generate_otp()
+    get_otp_store().issue(f'email:{email}', otp_code, ttl=600)
+    return otp_code
 
 
-def send_otp_email(email, otp_code):
-    """Send OTP to user's email"""
-    try:
-        msg = MIMEText(f'Your OTP code is: {otp_code}\nIt will expire in 10 minutes.')
-        msg['Subject'] = 'Your Journal App OTP Code'
-        msg['From'] = EMAIL_USER
-        msg['To'] = email
-
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASS)
-        server.send_message(msg)
-        server.quit()
-        return True
-    except Exception as e:
-        print(f"Email error: {e}")
-        return False
+# Turns away signin/signup/OTP requests over the per-IP or per-email limits (see rate_limit.py).
+# Call it before any bcrypt work or email, so shed requests cost almost nothing.
+def admission_check(route, email=None):
+    retry_after = get_limiter().check(route, ip=request.remote_addr, email=email)
+    if not retry_after:
+        return None
+    response = jsonify({'success': False, 'message': 'Too many attempts. Please try again later.'})
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response, 429
+
+
+# With DB_REPLICAS set, read-only handlers read from a replica (see db_pool.ReplicaSet), except
+# within READ_YOUR_WRITES_SECONDS of the user's own last write: those reads go to the primary,
+# so replication lag never hides a change from the person who made it. The time of the write
+# travels in the session cookie, so this holds whichever worker serves the next request.
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', 5))
+
+
+@app.after_request
+def remember_write(response):
+    if (request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and 'user_id' in session
+            and response.status_code < 400 and get_replicas() is not None):
+        session['last_write_at'] = time.time()
+    return response
+
+
+def use_replica():
+    """True if this request's reads may be served by a read replica"""
+    return time.time() - session.get('last_write_at', 0) >= READ_YOUR_WRITES_SECONDS
 
 
 def generate_otp():
@@ -103,33 +144,34 @@ def home():
 @app.route('/signup', methods=['GET','POST'])
 def signup():
     email = request.json.get('email')
+    shed = admission_check('signup', email)
+    if shed:
+        return shed
     username = request.json.get('username')
     password = request.json.get('password')
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with db_connection() as conn, conn.cursor() as cur:
+            # Check if user already exists
+            cur.execute("SELECT id FROM users WHERE email = %s OR username = %s", (email, username))
+            if cur.fetchone():
+                return jsonify({'success': False, 'message': 'User already exists'})
 
-        # Check if user already exists
-        cur.execute("SELECT id FROM users WHERE email = %s OR username = %s", (email, username))
-        if cur.fetchone():
-            return jsonify({'success': False, 'message': 'User already exists'})
-
-        # Hash the password
+        # Hash the password (without holding a database connection)
         password_hash = password_manager.hash_password(password)
 
-        # Generate OTP
-        otp_code = generate_otp()
-        otp_expires = datetime.now() + timedelta(minutes=10)
+        with db_connection() as conn, conn.cursor() as cur:
+            # Insert user into database
+            cur.execute("""
+                        INSERT INTO users (email, username, password_hash)
+                        VALUES (%s, %s, %s) RETURNING id
+                        """, (email, username, password_hash))
 
-        # Insert user into database
-        cur.execute("""
-                    INSERT INTO users (email, username, password_hash, otp_code, otp_expires_at)
-                    VALUES (%s, %s, %s, %s, %s) RETURNING id
-                    """, (email, username, password_hash, otp_code, otp_expires))
+            user_id = cur.fetchone()[0]
+            conn.commit()
 
-        user_id = cur.fetchone()[0]
-        conn.commit()
+        # Generate OTP (held in the OTP store, not on the users row)
+        otp_code = issue_otp(email)
 
         # Send OTP email
         if send_otp_email(email, otp_code):
@@ -137,129 +179,113 @@ def signup():
         else:
             return jsonify({'success': False, 'message': 'Failed to send OTP'})
 
+    except PasswordManagerBusy as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/signin', methods=['POST'])
 def signin():
     email = request.json.get('email')
+    shed = admission_check('signin', email)
+    if shed:
+        return shed
     password = request.json.get('password')
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with db_connection() as conn, conn.cursor() as cur:
+            # Check if user exists and get stored password hash
+            cur.execute("""
+                        SELECT id, username, password_hash, is_verified
+                        FROM users
+                        WHERE email = %s
+                        """, (email,))
 
-        # Check if user exists and get stored password hash
-        cur.execute("""
-                    SELECT id, username, password_hash, is_verified
-                    FROM users
-                    WHERE email = %s
-                    """, (email,))
-
-        user = cur.fetchone()
-        if user:
-            user_id, username, password_hash, is_verified = user
-
-            # Verify password
-            if password_manager.verify_password(password, password_hash):
-                if is_verified:
-                    # Set session variables
-                    session['user_id'] = user_id
-                    session['username'] = username
-                    session.permanent = True  # Make session permanent
-
-                    return jsonify({
-                        'success': True,
-                        'message': 'Login successful',
-                        'user_id': user_id,
-                        'username': username,
-                        'redirect_url': '/dashboard'  # Add redirect URL
-                    })
-                else:
-                    # User exists but not verified
-                    otp_code = generate_otp()
-                    otp_expires = datetime.now() + timedelta(minutes=10)
-
-                    cur.execute("""
-                                UPDATE users
-                                SET otp_code       = %s,
-                                    otp_expires_at = %s
-                                WHERE email = %s
-                                """, (otp_code, otp_expires, email))
-                    conn.commit()
+            user = cur.fetchone()
 
-                    send_otp_email(email, otp_code)
-                    return jsonify({
-                        'success': False,
-                        'message': 'Email not verified. New OTP sent.',
-                        'redirect_url': f'/verify-otp.html?email={email}'
-                    })
-            else:
-                return jsonify({'success': False, 'message': 'Invalid password'})
-        else:
+        if not user:
             return jsonify({'success': False, 'message': 'User not found'})
 
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)})
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
+        user_id, username, password_hash, is_verified = user
 
+        # Verify password (without holding a database connection); hashes made with
+        # an outdated cost are upgraded transparently
+        password_ok, new_hash = password_manager.verify_and_update(password, password_hash)
+        if not password_ok:
+            return jsonify({'success': False, 'message': 'Invalid password'})
 
-@app.route('/verify_otp', methods=['POST'])
-def verify_otp():
-    email = request.json.get('email')
-    otp_code = request.json.get('otp')
-
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Verify OTP
-        cur.execute("""
-                    UPDATE users
-                    SET is_verified    = TRUE,
-                        otp_code       = NULL,
-                        otp_expires_at = NULL
-                    WHERE email = %s
-                      AND otp_code = %s
-                      AND otp_expires_at > NOW() RETURNING id, username
-                    """, (email, otp_code))
-
-        result = cur.fetchone()
-        if result:
-            user_id, username = result
-            conn.commit()
+        if new_hash:
+            with db_connection() as conn, conn.cursor() as cur:
+                cur.execute("UPDATE users SET password_hash = %s WHERE id = %s", (new_hash, user_id))
+                conn.commit()
 
+        if is_verified:
             # Set session variables
             session['user_id'] = user_id
             session['username'] = username
-            session.permanent = True
+            session.permanent = True  # Make session permanent
 
             return jsonify({
                 'success': True,
-                'message': 'Email verified successfully',
+                'message': 'Login successful',
                 'user_id': user_id,
                 'username': username,
-                'redirect_url': '/dashboard'  # Redirect to journal after verification
+                'redirect_url': '/dashboard'  # Add redirect URL
             })
         else:
+            # User exists but not verified
+            otp_code = issue_otp(email)
+            send_otp_email(email, otp_code)
+            return jsonify({
+                'success': False,
+                'message': 'Email not verified. New OTP sent.',
+                'redirect_url': f'/verify-otp.html?email={email}'
+            })
+
+    except PasswordManagerBusy as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+
+@app.route('/verify_otp', methods=['POST'])
+def verify_otp():
+    email = request.json.get('email')
+    shed = admission_check('verify_otp', email)
+    if shed:
+        return shed
+    otp_code = request.json.get('otp')
+
+    try:
+        # Checked in memory; the users row is only written once the code matches
+        if not get_otp_store().verify(f'email:{email}', otp_code):
             return jsonify({'success': False, 'message': 'Invalid or expired OTP'})
 
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE users SET is_verified = TRUE WHERE email = %s RETURNING id, username", (email,))
+
+            result = cur.fetchone()
+            if result:
+                user_id, username = result
+                conn.commit()
+
+                # Set session variables
+                session['user_id'] = user_id
+                session['username'] = username
+                session.permanent = True
+
+                return jsonify({
+                    'success': True,
+                    'message': 'Email verified successfully',
+                    'user_id': user_id,
+                    'username': username,
+                    'redirect_url': '/dashboard'  # Redirect to journal after verification
+                })
+            else:
+                return jsonify({'success': False, 'message': 'Invalid or expired OTP'})
+
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @app.route('/verify-otp.html')
@@ -271,33 +297,21 @@ def verify_otp_page():
 @app.route('/resend_otp', methods=['POST'])
 def resend_otp():
     email = request.json.get('email')
+    shed = admission_check('resend_otp', email)
+    if shed:
+        return shed
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Check if user exists
-        cur.execute("SELECT username FROM users WHERE email = %s", (email,))
-        user = cur.fetchone()
+        with db_connection() as conn, conn.cursor() as cur:
+            # Check if user exists
+            cur.execute("SELECT username FROM users WHERE email = %s", (email,))
+            user = cur.fetchone()
 
         if not user:
             return jsonify({'success': False, 'message': 'User not found'})
 
-        username = user[0]
-
-        # Generate new OTP
-        otp_code = generate_otp()
-        otp_expires = datetime.now() + timedelta(minutes=10)
-
-        # Update user with new OTP
-        cur.execute("""
-                    UPDATE users
-                    SET otp_code       = %s,
-                        otp_expires_at = %s
-                    WHERE email = %s
-                    """, (otp_code, otp_expires, email))
-
-        conn.commit()
+        # Generate new OTP, replacing the previous one
+        otp_code = issue_otp(email)
 
         # Send new OTP email
         if send_otp_email(email, otp_code):
@@ -307,11 +321,6 @@ def resend_otp():
 
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @app.route('/dashboard')
@@ -328,6 +337,52 @@ def new_entry():
     return render_template('new-entry.html')
 
 
+# ==================== CONDITIONAL GETS ====================
+# List endpoints are tagged with the user's change version for that resource, so a
+# revisit with If-None-Match costs one primary-key lookup instead of the full query.
+
+def resource_etag(cur, resource):
+    """ETag for the current user's view of a resource.
+
+    The version is read before the data, so a write that lands in between can only
+    make the tag older than the body (a wasted 200 later), never newer (a stale 304).
+    """
+    return user_etag(resource, get_version(cur, session['user_id'], resource))
+
+
+def user_etag(resource, version):
+    """ETag for the current user's view of a resource at a known version"""
+    return version_etag(resource, version, session['user_id'], request.query_string, date.today())
+
+
+def not_modified(etag):
+    return tag_response(Response(status=304), etag)
+
+
+def tag_response(response, etag):
+    response.set_etag(etag)
+    # Always revalidate; private because the body belongs to the logged-in user
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# Finds or creates today's daily_journals row, adds the entry to it and bumps the entries
+# version, all in one statement (and so one round trip when run with autocommit)
+CREATE_ENTRY_SQL = named_query('create_entry', f"""
+    WITH journal AS (
+        INSERT INTO daily_journals (user_id, entry_date)
+            VALUES (%(user_id)s, %(day)s)
+            -- no-op update so RETURNING also yields an existing row
+            ON CONFLICT (user_id, entry_date) DO UPDATE SET entry_date = EXCLUDED.entry_date
+            RETURNING id),
+         version AS ({BUMP_VERSION_SQL})
+    INSERT INTO journal_entries (daily_journal_id, entry_title, entry_content)
+    SELECT id, %(title)s, %(content)s
+    FROM journal
+    RETURNING id, entry_title, entry_content, created_at
+""")
+
+
 # Create a new journal entry - CORRECTED
 @app.route('/api/entries', methods=['POST'])
 def create_entry():
@@ -342,104 +397,287 @@ def create_entry():
         if not title or not content:
             return jsonify({'success': False, 'message': 'Title and content are required'}), 400
 
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        # A single statement is atomic on its own, so skip BEGIN/COMMIT
+        with db_connection(autocommit=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(CREATE_ENTRY_SQL, {
+                'user_id': session['user_id'],
+                'day': datetime.now().date(),
+                'title': title,
+                'content': content,
+                'resource': ENTRIES
+            })
+            entry = cur.fetchone()
 
-        # First, get or create a daily_journals entry for today
-        today = datetime.now().date()
+            return jsonify({
+                'success': True,
+                'entry': format_entry(entry)
+            })
 
-        # Check if a daily_journals entry exists for today
-        cur.execute("""
-                    SELECT id
-                    FROM daily_journals
-                    WHERE user_id = %s
-                      AND entry_date = %s
-                    """, (session['user_id'], today))
+    except Exception as e:
+        print(f"Error creating entry: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
 
-        daily_journals_entry = cur.fetchone()
 
-        if daily_journals_entry:
-            daily_journal_id = daily_journals_entry['id']
-        else:
-            # Create a new daily_journals entry for today
-            cur.execute("""
-                        INSERT INTO daily_journals (user_id, entry_date)
-                        VALUES (%s, %s) RETURNING id
-                        """, (session['user_id'], today))
+# Keyset pagination over (created_at, id) for entry listings
+ENTRIES_PAGE_SIZE = 20
+ENTRIES_MAX_PAGE_SIZE = 100
+ENTRIES_STREAM_BATCH = 500
+# Listings show this much of each entry; must match migrations/0012_entry_excerpts.sql
+ENTRY_EXCERPT_LENGTH = 200
 
-            daily_journal_id = cur.fetchone()['id']
 
-        # Now create the journal entry
-        cur.execute("""
-                    INSERT INTO journal_entries (daily_journal_id, entry_title, entry_content)
-                    VALUES (%s, %s, %s) RETURNING id, entry_title, entry_content, created_at
-                    """, (daily_journal_id, title, content))
+def encode_cursor(*values):
+    """Encode the sort key of the last returned row as an opaque cursor string"""
+    raw = json.dumps(values, default=lambda value: value.isoformat()).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
 
-        entry = cur.fetchone()
-        conn.commit()
 
-        return jsonify({
-            'success': True,
-            'entry': {
-                'id': entry['id'],
-                'title': entry['entry_title'],
-                'content': entry['entry_content'],
-                'date': entry['created_at'].strftime('%d/%m/%Y')
-            }
-        })
+def decode_cursor(cursor, *types):
+    """Decode a cursor from encode_cursor(), converting each value with the matching type.
+    Raises ValueError if the cursor is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(types):
+            raise ValueError
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def format_entry(entry):
+    return {
+        'id': entry['id'],
+        'title': entry['entry_title'],
+        'content': entry['entry_content'],
+        'date': entry['created_at'].strftime('%d/%m/%Y')
+    }
+
+
+def format_entry_summary(entry):
+    """An entry as listings show it: the excerpt instead of the content, which
+    GET /api/entries/<id> returns on demand"""
+    excerpt = entry['entry_excerpt'] or ''
+    truncated = len(excerpt) > ENTRY_EXCERPT_LENGTH
+    return {
+        'id': entry['id'],
+        'title': entry['entry_title'],
+        'excerpt': excerpt[:ENTRY_EXCERPT_LENGTH].rstrip() + '…' if truncated else excerpt,
+        'truncated': truncated,
+        'word_count': entry['word_count'],
+        'date': entry['created_at'].strftime('%d/%m/%Y')
+    }
+
+
+def entries_page_query(after):
+    """SQL for one page of a user's entries, newest first, optionally after a cursor position"""
+    return f"""
+            SELECT je.id, je.entry_title, je.entry_excerpt, je.word_count, je.created_at
+            FROM journal_entries je
+                     JOIN daily_journals dj ON je.daily_journal_id = dj.id
+            WHERE dj.user_id = %(user_id)s
+              {"AND (je.created_at, je.id) < (%(after_created_at)s, %(after_id)s)" if after else ""}
+            ORDER BY je.created_at DESC, je.id DESC
+            """
+
+
+def entries_page(entries, limit):
+    """Response body for a page of entries fetched with one row more than limit"""
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1]['created_at'], entries[-1]['id'])
+    return {
+        'success': True,
+        'entries': [format_entry_summary(entry) for entry in entries],
+        'next_cursor': next_cursor
+    }
+
+
+ENTRIES_PAGE_SQL = named_query('entries_page', entries_page_query(None) + " LIMIT %(limit)s")
+ENTRIES_PAGE_AFTER_SQL = named_query('entries_page_after', entries_page_query(True) + " LIMIT %(limit)s")
+
+
+# Get entries for the logged-in user, one page at a time (or streamed with ?stream=1)
+@app.route('/api/entries', methods=['GET'])
+def get_entries():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        after = decode_cursor(request.args['cursor'], datetime.fromisoformat, int) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    params = {'user_id': session['user_id']}
+    if after:
+        params['after_created_at'], params['after_id'] = after
+
+    if request.args.get('stream') in ('1', 'true'):
+        return Response(stream_entries(entries_page_query(after), params, use_replica()), mimetype='application/json')
+
+    limit = max(1, min(request.args.get('limit', ENTRIES_PAGE_SIZE, type=int), ENTRIES_MAX_PAGE_SIZE))
+    params['limit'] = limit + 1  # one extra row tells us whether another page exists
+
+    try:
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            etag = resource_etag(cur, ENTRIES)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            # Join with daily_journals to get entries for this user
+            cur.execute(ENTRIES_PAGE_AFTER_SQL if after else ENTRIES_PAGE_SQL, params)
+            entries = cur.fetchall()
+
+            return tag_response(jsonify(entries_page(entries, limit)), etag)
 
     except Exception as e:
-        print(f"Error creating entry: {e}")
+        print(f"Error fetching entries: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
-# Get all entries for the logged-in user - CORRECTED
-@app.route('/api/entries', methods=['GET'])
-def get_entries():
+def stream_entries(sql, params, replica=False):
+    """Yield a user's entries as a JSON document, reading through a server-side cursor
+    so memory use stays flat no matter how many entries there are"""
+    started = False
+    try:
+        with db_connection(replica=replica) as conn, \
+                conn.cursor(name='entries_stream', cursor_factory=RealDictCursor) as cur:
+            cur.itersize = ENTRIES_STREAM_BATCH
+            cur.execute(sql, params)
+            yield '{"success": true, "entries": ['
+            started = True
+            separator = ''
+            for entry in cur:
+                yield separator + json.dumps(format_entry_summary(entry))
+                separator = ','
+            yield ']}'
+    except Exception as e:
+        print(f"Error streaming entries: {e}")
+        # Once the body has started the status is already sent, so just end the stream
+        if not started:
+            yield json.dumps({'success': False, 'message': str(e)})
+
+
+ENTRY_SQL = named_query('entry', """
+    SELECT je.id, je.entry_title, je.entry_content, je.word_count, je.created_at
+    FROM journal_entries je
+             JOIN daily_journals dj ON je.daily_journal_id = dj.id
+    WHERE je.id = %s
+      AND dj.user_id = %s
+""")
+
+
+# Get one entry with its full content (listings only carry an excerpt)
+@app.route('/api/entries/<int:entry_id>', methods=['GET'])
+def get_entry(entry_id):
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Tagged per entry: the entries version changes with any of the user's entries
+            etag = version_etag(ENTRIES, get_version(cur, session['user_id'], ENTRIES), session['user_id'], entry_id)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
 
-        # Join with daily_journals to get entries for this user
-        cur.execute("""
-                    SELECT je.id, je.entry_title, je.entry_content, je.created_at
-                    FROM journal_entries je
-                             JOIN daily_journals dj ON je.daily_journal_id = dj.id
-                    WHERE dj.user_id = %s
-                    ORDER BY je.created_at DESC
-                    """, (session['user_id'],))
-
-        entries = cur.fetchall()
-
-        # Format entries for frontend
-        formatted_entries = [{
-            'id': entry['id'],
-            'title': entry['entry_title'],
-            'content': entry['entry_content'],
-            'date': entry['created_at'].strftime('%d/%m/%Y')
-        } for entry in entries]
+            cur.execute(ENTRY_SQL, (entry_id, session['user_id']))
+            entry = cur.fetchone()
 
-        return jsonify({
+        if entry is None:
+            return jsonify({'success': False, 'message': 'Entry not found'}), 404
+
+        return tag_response(jsonify({
             'success': True,
-            'entries': formatted_entries
-        })
+            'entry': dict(format_entry(entry), word_count=entry['word_count'])
+        }), etag)
 
     except Exception as e:
-        print(f"Error fetching entries: {e}")
+        print(f"Error fetching entry: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# Full-text search settings; TEXT_SEARCH_CONFIG must match migrations/0002_entry_search.sql
+TEXT_SEARCH_CONFIG = 'english'
+SEARCH_PAGE_SIZE = 20
+# ts_headline marks matches with control characters so the snippet can be HTML-escaped first
+SEARCH_HEADLINE_OPTIONS = 'StartSel=\x01, StopSel=\x02, MaxFragments=2, MaxWords=25, MinWords=8, FragmentDelimiter=" … "'
+
+
+def format_snippet(headline):
+    """Escape a ts_headline() fragment and turn its match markers into <mark> tags"""
+    return html.escape(headline or '').replace('\x01', '<mark>').replace('\x02', '</mark>')
+
+
+# Search the logged-in user's entries, best matches first
+@app.route('/api/entries/search', methods=['GET'])
+def search_entries():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': 'Search query is required'}), 400
+
+    try:
+        after = decode_cursor(request.args['cursor'], float, int) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    limit = max(1, min(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), ENTRIES_MAX_PAGE_SIZE))
+    params = {
+        'user_id': session['user_id'],
+        'config': TEXT_SEARCH_CONFIG,
+        'query': query,
+        'headline_options': SEARCH_HEADLINE_OPTIONS,
+        'limit': limit + 1
+    }
+    if after:
+        params['after_rank'], params['after_id'] = after
+
+    try:
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # The inner query ranks matches using the GIN index; snippets are only
+            # generated for the rows on this page because ts_headline re-parses the text.
+            cur.execute(f"""
+                        SELECT page.id, page.entry_title, page.created_at, page.rank,
+                               ts_headline(%(config)s::regconfig, je.entry_content, page.query,
+                                           %(headline_options)s) AS snippet
+                        FROM (SELECT je.id, je.entry_title, je.created_at, q.query,
+                                     ts_rank_cd(je.search_vector, q.query) AS rank
+                              FROM websearch_to_tsquery(%(config)s::regconfig, %(query)s) AS q(query),
+                                   journal_entries je
+                                       JOIN daily_journals dj ON je.daily_journal_id = dj.id
+                              WHERE dj.user_id = %(user_id)s
+                                AND je.search_vector @@ q.query
+                                {"AND (ts_rank_cd(je.search_vector, q.query), je.id) < (%(after_rank)s::real, %(after_id)s)" if after else ""}
+                              ORDER BY rank DESC, je.id DESC
+                              LIMIT %(limit)s) AS page
+                                 JOIN journal_entries je ON je.id = page.id
+                        ORDER BY page.rank DESC, page.id DESC
+                        """, params)
+            results = cur.fetchall()
+
+            next_cursor = None
+            if len(results) > limit:
+                results = results[:limit]
+                next_cursor = encode_cursor(results[-1]['rank'], results[-1]['id'])
+
+            return jsonify({
+                'success': True,
+                'results': [{
+                    'id': result['id'],
+                    'title': result['entry_title'],
+                    'snippet': format_snippet(result['snippet']),
+                    'rank': result['rank'],
+                    'date': result['created_at'].strftime('%d/%m/%Y')
+                } for result in results],
+                'next_cursor': next_cursor
+            })
+
+    except Exception as e:
+        print(f"Error searching entries: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # Delete an entry - CORRECTED
@@ -449,36 +687,31 @@ def delete_entry(entry_id):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with db_connection() as conn, conn.cursor() as cur:
+            # Make sure the entry belongs to the current user (through daily_journals)
+            cur.execute("""
+                        DELETE
+                        FROM journal_entries
+                        WHERE id = %s
+                          AND daily_journal_id IN (SELECT id
+                                                   FROM daily_journals
+                                                   WHERE user_id = %s)
+                            RETURNING id
+                        """, (entry_id, session['user_id']))
+
+            deleted = cur.fetchone()
+            if deleted:
+                bump_version(cur, session['user_id'], ENTRIES)
+            conn.commit()
 
-        # Make sure the entry belongs to the current user (through daily_journals)
-        cur.execute("""
-                    DELETE
-                    FROM journal_entries
-                    WHERE id = %s
-                      AND daily_journal_id IN (SELECT id
-                                               FROM daily_journals
-                                               WHERE user_id = %s)
-                        RETURNING id
-                    """, (entry_id, session['user_id']))
-
-        deleted = cur.fetchone()
-        conn.commit()
-
-        if deleted:
-            return jsonify({'success': True, 'message': 'Entry deleted'})
-        else:
-            return jsonify({'success': False, 'message': 'Entry not found'}), 404
+            if deleted:
+                return jsonify({'success': True, 'message': 'Entry deleted'})
+            else:
+                return jsonify({'success': False, 'message': 'Entry not found'}), 404
 
     except Exception as e:
         print(f"Error deleting entry: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # Update an entry - CORRECTED
@@ -495,50 +728,232 @@ def update_entry(entry_id):
         if not title or not content:
             return jsonify({'success': False, 'message': 'Title and content are required'}), 400
 
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        with db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Update the entry if it belongs to the current user. The subquery locks the row
+            # first, so RETURNING also gives the version being replaced, for the history; its
+            # ownership check keeps a request for someone else's entry from locking it.
+            cur.execute("""
+                        UPDATE journal_entries je
+                        SET entry_title   = %s,
+                            entry_content = %s,
+                            updated_at    = CURRENT_TIMESTAMP
+                        FROM (SELECT id, entry_title, entry_content, updated_at
+                              FROM journal_entries
+                              WHERE id = %s
+                                AND daily_journal_id IN (SELECT id
+                                                         FROM daily_journals
+                                                         WHERE user_id = %s)
+                                  FOR UPDATE) previous
+                        WHERE je.id = previous.id
+                            RETURNING je.id, je.entry_title, je.entry_content, je.updated_at,
+                                previous.entry_title AS previous_title,
+                                previous.entry_content AS previous_content,
+                                previous.updated_at AS previous_updated_at
+                        """, (title, content, entry_id, session['user_id']))
+
+            entry = cur.fetchone()
+            if entry:
+                if (entry['previous_title'], entry['previous_content']) != (title, content):
+                    record_revision(cur, entry_id, {
+                        'entry_title': entry['previous_title'],
+                        'entry_content': entry['previous_content'],
+                        'updated_at': entry['previous_updated_at']
+                    }, title, content)
+                bump_version(cur, session['user_id'], ENTRIES)
+            conn.commit()
 
-        # Update the entry (making sure it belongs to the current user)
-        cur.execute("""
-                    UPDATE journal_entries
-                    SET entry_title   = %s,
-                        entry_content = %s,
-                        updated_at    = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                      AND daily_journal_id IN (SELECT id
-                                               FROM daily_journals
-                                               WHERE user_id = %s)
-                        RETURNING id, entry_title, entry_content, updated_at
-                    """, (title, content, entry_id, session['user_id']))
-
-        entry = cur.fetchone()
-        conn.commit()
-
-        if entry:
-            return jsonify({
-                'success': True,
-                'entry': {
-                    'id': entry['id'],
-                    'title': entry['entry_title'],
-                    'content': entry['entry_content'],
-                    'date': entry['updated_at'].strftime('%d/%m/%Y')
-                }
-            })
-        else:
-            return jsonify({'success': False, 'message': 'Entry not found'}), 404
+            if entry:
+                return jsonify({
+                    'success': True,
+                    'entry': {
+                        'id': entry['id'],
+                        'title': entry['entry_title'],
+                        'content': entry['entry_content'],
+                        'date': entry['updated_at'].strftime('%d/%m/%Y')
+                    }
+                })
+            else:
+                return jsonify({'success': False, 'message': 'Entry not found'}), 404
 
     except Exception as e:
         print(f"Error updating entry: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
+
+
+# Revision history of an entry, newest first. Entries that were never edited have one revision.
+@app.route('/api/entries/<int:entry_id>/revisions', methods=['GET'])
+def get_entry_revisions(entry_id):
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                        SELECT je.created_at AS entry_created_at,
+                               r.revision,
+                               r.is_snapshot,
+                               octet_length(r.data) AS size,
+                               r.created_at
+                        FROM journal_entries je
+                                 JOIN daily_journals dj ON je.daily_journal_id = dj.id
+                                 LEFT JOIN entry_revisions r ON r.entry_id = je.id
+                        WHERE je.id = %s
+                          AND dj.user_id = %s
+                        ORDER BY r.revision DESC
+                        """, (entry_id, session['user_id']))
+            rows = cur.fetchall()
+
+        if not rows:
+            return jsonify({'success': False, 'message': 'Entry not found'}), 404
+
+        if rows[0]['revision'] is None:
+            revisions = [{'revision': 1, 'created_at': rows[0]['entry_created_at'].isoformat(), 'snapshot': True,
+                          'size': None}]
+        else:
+            revisions = [{
+                'revision': row['revision'],
+                'created_at': row['created_at'].isoformat(),
+                'snapshot': row['is_snapshot'],
+                'size': row['size']
+            } for row in rows]
+
+        return jsonify({'success': True, 'entry_id': entry_id, 'revisions': revisions})
+
+    except Exception as e:
+        print(f"Error fetching entry revisions: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# One revision of an entry, rebuilt from the nearest snapshot and the deltas after it
+@app.route('/api/entries/<int:entry_id>/revisions/<int:revision>', methods=['GET'])
+def get_entry_revision(entry_id, revision):
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                        SELECT je.entry_title, je.entry_content, je.created_at,
+                               EXISTS (SELECT 1 FROM entry_revisions r WHERE r.entry_id = je.id) AS has_history
+                        FROM journal_entries je
+                                 JOIN daily_journals dj ON je.daily_journal_id = dj.id
+                        WHERE je.id = %s
+                          AND dj.user_id = %s
+                        """, (entry_id, session['user_id']))
+            entry = cur.fetchone()
+            if entry is None:
+                return jsonify({'success': False, 'message': 'Entry not found'}), 404
+
+            if entry['has_history']:
+                found = load_revision(cur, entry_id, revision)
+            elif revision == 1:
+                found = entry['entry_title'], entry['entry_content'], entry['created_at']
+            else:
+                found = None
+
+        if found is None:
+            return jsonify({'success': False, 'message': 'Revision not found'}), 404
+
+        title, content, created_at = found
+        return jsonify({
+            'success': True,
+            'entry_id': entry_id,
+            'revision': {
+                'revision': revision,
+                'title': title,
+                'content': content,
+                'created_at': created_at.isoformat()
+            }
+        })
+
+    except Exception as e:
+        print(f"Error fetching entry revision: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# Bulk-import entries from an NDJSON or CSV upload (title, content, date per row)
+@app.route('/api/entries/import', methods=['POST'])
+def import_entries():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    upload_format = request.args.get('format') or {
+        'application/x-ndjson': 'ndjson',
+        'application/jsonl': 'ndjson',
+        'text/csv': 'csv',
+    }.get(request.mimetype)
+    if upload_format not in ('ndjson', 'csv'):
+        return jsonify({'success': False, 'message': 'Upload NDJSON (application/x-ndjson) or CSV (text/csv)'}), 415
+
+    imported = 0
+    failed = 0
+    errors = []
+
+    def report(line, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append({'line': line, 'message': message})
+
+    def valid_rows(parsed):
+        # Bad rows are reported and skipped; the rest of the upload still goes in
+        for line, row in parsed:
+            if isinstance(row, ImportRowError):
+                report(line, str(row))
+            else:
+                yield line, row
+
+    try:
+        # The upload is parsed as it arrives and loaded in fixed-size chunks, one
+        # transaction each, so memory use doesn't grow with the size of the diary
+        reader = read_ndjson if upload_format == 'ndjson' else read_csv
+        parsed = reader(text_stream(request.stream))
+        with db_connection() as conn, conn.cursor() as cur:
+            def load(rows):
+                try:
+                    copy_entries(cur, session['user_id'], rows)
+                    bump_version(cur, session['user_id'], ENTRIES)
+                    conn.commit()
+                except psycopg2.Error:
+                    conn.rollback()
+                    raise
+
+            def reject(line, e):
+                # message_primary leaves out the CONTEXT line, which numbers rows within one COPY
+                report(line, f'Rejected by the database: {e.diag.message_primary or e}')
+
+            for chunk in chunks(valid_rows(parsed)):
+                imported += load_rows(load, chunk, reject)
+
+    except ImportRowError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except UnicodeDecodeError:
+        return jsonify({'success': False, 'message': 'Upload must be UTF-8 encoded',
+                        'imported': imported}), 400
+    except Exception as e:
+        print(f"Error importing entries: {e}")
+        return jsonify({'success': False, 'message': str(e), 'imported': imported}), 500
+
+    return jsonify({
+        'success': True,
+        'imported': imported,
+        'failed': failed,
+        'errors': errors
+    })
 
 
 # ==================== INTENTIONS API ====================
 
+def format_intention(intention):
+    return {
+        'id': intention['id'],
+        'text': intention['intention_text'],
+        'date': intention['for_date'].strftime('%Y-%m-%d'),
+        'completed': intention['is_completed'],
+        'completed_at': intention['completed_at'].isoformat() if intention['completed_at'] else None
+    }
+
+
 # Create a new intention
 @app.route('/api/intentions', methods=['POST'])
 def create_intention():
@@ -553,35 +968,38 @@ def create_intention():
         if not intention_text:
             return jsonify({'success': False, 'message': 'Intention text is required'}), 400
 
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        cur.execute("""
-                    INSERT INTO intentions (user_id, intention_text, for_date, is_completed)
-                    VALUES (%s, %s, %s, FALSE) RETURNING id, intention_text, for_date, is_completed
-                    """, (session['user_id'], intention_text, for_date))
+        with db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                        INSERT INTO intentions (user_id, intention_text, for_date, is_completed)
+                        VALUES (%s, %s, %s, FALSE) RETURNING id, intention_text, for_date, is_completed
+                        """, (session['user_id'], intention_text, for_date))
 
-        intention = cur.fetchone()
-        conn.commit()
+            intention = cur.fetchone()
+            bump_version(cur, session['user_id'], INTENTIONS)
+            conn.commit()
 
-        return jsonify({
-            'success': True,
-            'intention': {
-                'id': intention['id'],
-                'text': intention['intention_text'],
-                'date': intention['for_date'].strftime('%Y-%m-%d'),
-                'completed': intention['is_completed']
-            }
-        })
+            return jsonify({
+                'success': True,
+                'intention': {
+                    'id': intention['id'],
+                    'text': intention['intention_text'],
+                    'date': intention['for_date'].strftime('%Y-%m-%d'),
+                    'completed': intention['is_completed']
+                }
+            })
 
     except Exception as e:
         print(f"Error creating intention: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
+
+
+INTENTIONS_FOR_DATE_SQL = named_query('intentions_for_date', """
+    SELECT id, intention_text, for_date, is_completed, completed_at
+    FROM intentions
+    WHERE user_id = %s
+      AND for_date = %s
+    ORDER BY id ASC
+""")
 
 
 # Get all intentions for the logged-in user
@@ -594,40 +1012,25 @@ def get_intentions():
         # Get date from query parameter, default to today
         date_str = request.args.get('date', datetime.now().date().isoformat())
 
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            etag = resource_etag(cur, INTENTIONS)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
 
-        cur.execute("""
-                    SELECT id, intention_text, for_date, is_completed, completed_at
-                    FROM intentions
-                    WHERE user_id = %s
-                      AND for_date = %s
-                    ORDER BY id ASC
-                    """, (session['user_id'], date_str))
+            cur.execute(INTENTIONS_FOR_DATE_SQL, (session['user_id'], date_str))
 
-        intentions = cur.fetchall()
+            intentions = cur.fetchall()
 
-        formatted_intentions = [{
-            'id': intention['id'],
-            'text': intention['intention_text'],
-            'date': intention['for_date'].strftime('%Y-%m-%d'),
-            'completed': intention['is_completed'],
-            'completed_at': intention['completed_at'].isoformat() if intention['completed_at'] else None
-        } for intention in intentions]
+            formatted_intentions = [format_intention(intention) for intention in intentions]
 
-        return jsonify({
-            'success': True,
-            'intentions': formatted_intentions
-        })
+            return tag_response(jsonify({
+                'success': True,
+                'intentions': formatted_intentions
+            }), etag)
 
     except Exception as e:
         print(f"Error fetching intentions: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # Toggle intention completion
@@ -637,44 +1040,39 @@ def toggle_intention(intention_id):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        with db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Toggle completion status
+            cur.execute("""
+                        UPDATE intentions
+                        SET is_completed = NOT is_completed,
+                            completed_at = CASE
+                                               WHEN is_completed = FALSE THEN CURRENT_TIMESTAMP
+                                               ELSE NULL
+                                END
+                        WHERE id = %s
+                          AND user_id = %s RETURNING id, intention_text, is_completed
+                        """, (intention_id, session['user_id']))
+
+            intention = cur.fetchone()
+            if intention:
+                bump_version(cur, session['user_id'], INTENTIONS)
+            conn.commit()
 
-        # Toggle completion status
-        cur.execute("""
-                    UPDATE intentions
-                    SET is_completed = NOT is_completed,
-                        completed_at = CASE
-                                           WHEN is_completed = FALSE THEN CURRENT_TIMESTAMP
-                                           ELSE NULL
-                            END
-                    WHERE id = %s
-                      AND user_id = %s RETURNING id, intention_text, is_completed
-                    """, (intention_id, session['user_id']))
-
-        intention = cur.fetchone()
-        conn.commit()
-
-        if intention:
-            return jsonify({
-                'success': True,
-                'intention': {
-                    'id': intention['id'],
-                    'text': intention['intention_text'],
-                    'completed': intention['is_completed']
-                }
-            })
-        else:
-            return jsonify({'success': False, 'message': 'Intention not found'}), 404
+            if intention:
+                return jsonify({
+                    'success': True,
+                    'intention': {
+                        'id': intention['id'],
+                        'text': intention['intention_text'],
+                        'completed': intention['is_completed']
+                    }
+                })
+            else:
+                return jsonify({'success': False, 'message': 'Intention not found'}), 404
 
     except Exception as e:
         print(f"Error toggling intention: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # Delete an intention
@@ -684,32 +1082,27 @@ def delete_intention(intention_id):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-                    DELETE
-                    FROM intentions
-                    WHERE id = %s
-                      AND user_id = %s RETURNING id
-                    """, (intention_id, session['user_id']))
-
-        deleted = cur.fetchone()
-        conn.commit()
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                        DELETE
+                        FROM intentions
+                        WHERE id = %s
+                          AND user_id = %s RETURNING id
+                        """, (intention_id, session['user_id']))
+
+            deleted = cur.fetchone()
+            if deleted:
+                bump_version(cur, session['user_id'], INTENTIONS)
+            conn.commit()
 
-        if deleted:
-            return jsonify({'success': True, 'message': 'Intention deleted'})
-        else:
-            return jsonify({'success': False, 'message': 'Intention not found'}), 404
+            if deleted:
+                return jsonify({'success': True, 'message': 'Intention deleted'})
+            else:
+                return jsonify({'success': False, 'message': 'Intention not found'}), 404
 
     except Exception as e:
         print(f"Error deleting intention: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # ==================== CALENDAR EVENTS API ====================
@@ -730,93 +1123,143 @@ def create_calendar_event():
         if not event_title or not event_date:
             return jsonify({'success': False, 'message': 'Title and date are required'}), 400
 
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        cur.execute("""
-                    INSERT INTO calendar_events (user_id, event_title, event_description, event_date, event_time)
-                    VALUES (%s, %s, %s, %s,
-                            %s) RETURNING id, event_title, event_description, event_date, event_time, created_at
-                    """, (session['user_id'], event_title, event_description, event_date, event_time))
+        with db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                        INSERT INTO calendar_events (user_id, event_title, event_description, event_date, event_time)
+                        VALUES (%s, %s, %s, %s,
+                                %s) RETURNING id, event_title, event_description, event_date, event_time, created_at
+                        """, (session['user_id'], event_title, event_description, event_date, event_time))
 
-        event = cur.fetchone()
-        conn.commit()
+            event = cur.fetchone()
+            bump_version(cur, session['user_id'], CALENDAR_EVENTS)
+            conn.commit()
 
-        return jsonify({
-            'success': True,
-            'event': {
-                'id': event['id'],
-                'title': event['event_title'],
-                'description': event['event_description'],
-                'date': event['event_date'].strftime('%Y-%m-%d'),
-                'time': event['event_time'].strftime('%H:%M') if event['event_time'] else None
-            }
-        })
+            return jsonify({
+                'success': True,
+                'event': {
+                    'id': event['id'],
+                    'title': event['event_title'],
+                    'description': event['event_description'],
+                    'date': event['event_date'].strftime('%Y-%m-%d'),
+                    'time': event['event_time'].strftime('%H:%M') if event['event_time'] else None
+                }
+            })
 
     except Exception as e:
         print(f"Error creating calendar event: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
-# Get all calendar events for the logged-in user
+# Calendar range limits: ?around=N prefetches N months either side of ?month/&year
+CALENDAR_MAX_AROUND_MONTHS = 6
+CALENDAR_MAX_RANGE_DAYS = 400
+
+
+def add_months(first_of_month, months):
+    """Shift a first-of-month date by a number of months"""
+    index = first_of_month.year * 12 + first_of_month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def calendar_range(args):
+    """Work out the half-open [start, end) event_date range requested by the calendar.
+
+    Accepts either start/end dates (end exclusive) or month/year plus an optional
+    number of surrounding months. Returns None when no range was asked for and
+    raises ValueError for malformed or oversized ranges.
+    """
+    if args.get('start') or args.get('end'):
+        if not (args.get('start') and args.get('end')):
+            raise ValueError('start and end are both required')
+        start = date.fromisoformat(args['start'])
+        end = date.fromisoformat(args['end'])
+    elif args.get('month') and args.get('year'):
+        around = int(args.get('around', 0))
+        if not 0 <= around <= CALENDAR_MAX_AROUND_MONTHS:
+            raise ValueError(f'around must be between 0 and {CALENDAR_MAX_AROUND_MONTHS}')
+        month = date(int(args['year']), int(args['month']), 1)
+        start = add_months(month, -around)
+        end = add_months(month, around + 1)
+    else:
+        return None
+
+    if end <= start or (end - start).days > CALENDAR_MAX_RANGE_DAYS:
+        raise ValueError(f'Date range must be between 1 and {CALENDAR_MAX_RANGE_DAYS} days')
+    return start, end
+
+
+# Plain range predicates on event_date can use the
+# (user_id, event_date, event_time) index; EXTRACT() could not
+CALENDAR_EVENTS_RANGE_SQL = named_query('calendar_events_range', """
+    SELECT id, event_title, event_description, event_date, event_time
+    FROM calendar_events
+    WHERE user_id = %s
+      AND event_date >= %s
+      AND event_date < %s
+    ORDER BY event_date ASC, event_time ASC
+""")
+
+CALENDAR_EVENTS_ALL_SQL = named_query('calendar_events_all', """
+    SELECT id, event_title, event_description, event_date, event_time
+    FROM calendar_events
+    WHERE user_id = %s
+    ORDER BY event_date ASC, event_time ASC
+""")
+
+
+def calendar_events_query(user_id, date_range):
+    """(sql, params) for a user's calendar events, within date_range if given"""
+    if date_range:
+        return CALENDAR_EVENTS_RANGE_SQL, (user_id, *date_range)
+    return CALENDAR_EVENTS_ALL_SQL, (user_id,)
+
+
+def format_calendar_event(event):
+    return {
+        'id': event['id'],
+        'title': event['event_title'],
+        'description': event['event_description'],
+        'date': event['event_date'].strftime('%Y-%m-%d'),
+        'time': event['event_time'].strftime('%H:%M') if event['event_time'] else None
+    }
+
+
+def calendar_events_page(events, date_range):
+    response = {
+        'success': True,
+        'events': [format_calendar_event(event) for event in events]
+    }
+    if date_range:
+        response['start'] = date_range[0].isoformat()
+        response['end'] = date_range[1].isoformat()
+    return response
+
+
+# Get calendar events for the logged-in user, optionally limited to a date range
 @app.route('/api/calendar-events', methods=['GET'])
 def get_calendar_events():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
     try:
-        # Optional: filter by month/year
-        month = request.args.get('month')
-        year = request.args.get('year')
-
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        date_range = calendar_range(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid date range: {e}'}), 400
 
-        if month and year:
-            cur.execute("""
-                        SELECT id, event_title, event_description, event_date, event_time
-                        FROM calendar_events
-                        WHERE user_id = %s
-                          AND EXTRACT(MONTH FROM event_date) = %s
-                          AND EXTRACT(YEAR FROM event_date) = %s
-                        ORDER BY event_date ASC, event_time ASC
-                        """, (session['user_id'], month, year))
-        else:
-            cur.execute("""
-                        SELECT id, event_title, event_description, event_date, event_time
-                        FROM calendar_events
-                        WHERE user_id = %s
-                        ORDER BY event_date ASC, event_time ASC
-                        """, (session['user_id'],))
+    try:
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            etag = resource_etag(cur, CALENDAR_EVENTS)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
 
-        events = cur.fetchall()
+            cur.execute(*calendar_events_query(session['user_id'], date_range))
+            events = cur.fetchall()
 
-        formatted_events = [{
-            'id': event['id'],
-            'title': event['event_title'],
-            'description': event['event_description'],
-            'date': event['event_date'].strftime('%Y-%m-%d'),
-            'time': event['event_time'].strftime('%H:%M') if event['event_time'] else None
-        } for event in events]
-
-        return jsonify({
-            'success': True,
-            'events': formatted_events
-        })
+            return tag_response(jsonify(calendar_events_page(events, date_range)), etag)
 
     except Exception as e:
         print(f"Error fetching calendar events: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # Update a calendar event
@@ -832,45 +1275,40 @@ def update_calendar_event(event_id):
         event_date = data.get('event_date')
         event_time = data.get('event_time')
 
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        with db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                        UPDATE calendar_events
+                        SET event_title       = %s,
+                            event_description = %s,
+                            event_date        = %s,
+                            event_time        = %s,
+                            updated_at        = CURRENT_TIMESTAMP
+                        WHERE id = %s
+                          AND user_id = %s RETURNING id, event_title, event_description, event_date, event_time
+                        """, (event_title, event_description, event_date, event_time, event_id, session['user_id']))
+
+            event = cur.fetchone()
+            if event:
+                bump_version(cur, session['user_id'], CALENDAR_EVENTS)
+            conn.commit()
 
-        cur.execute("""
-                    UPDATE calendar_events
-                    SET event_title       = %s,
-                        event_description = %s,
-                        event_date        = %s,
-                        event_time        = %s,
-                        updated_at        = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                      AND user_id = %s RETURNING id, event_title, event_description, event_date, event_time
-                    """, (event_title, event_description, event_date, event_time, event_id, session['user_id']))
-
-        event = cur.fetchone()
-        conn.commit()
-
-        if event:
-            return jsonify({
-                'success': True,
-                'event': {
-                    'id': event['id'],
-                    'title': event['event_title'],
-                    'description': event['event_description'],
-                    'date': event['event_date'].strftime('%Y-%m-%d'),
-                    'time': event['event_time'].strftime('%H:%M') if event['event_time'] else None
-                }
-            })
-        else:
-            return jsonify({'success': False, 'message': 'Event not found'}), 404
+            if event:
+                return jsonify({
+                    'success': True,
+                    'event': {
+                        'id': event['id'],
+                        'title': event['event_title'],
+                        'description': event['event_description'],
+                        'date': event['event_date'].strftime('%Y-%m-%d'),
+                        'time': event['event_time'].strftime('%H:%M') if event['event_time'] else None
+                    }
+                })
+            else:
+                return jsonify({'success': False, 'message': 'Event not found'}), 404
 
     except Exception as e:
         print(f"Error updating calendar event: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # Delete a calendar event
@@ -880,71 +1318,96 @@ def delete_calendar_event(event_id):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-                    DELETE
-                    FROM calendar_events
-                    WHERE id = %s
-                      AND user_id = %s RETURNING id
-                    """, (event_id, session['user_id']))
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                        DELETE
+                        FROM calendar_events
+                        WHERE id = %s
+                          AND user_id = %s RETURNING id
+                        """, (event_id, session['user_id']))
 
-        deleted = cur.fetchone()
-        conn.commit()
+            deleted = cur.fetchone()
+            if deleted:
+                bump_version(cur, session['user_id'], CALENDAR_EVENTS)
+            conn.commit()
 
-        if deleted:
-            return jsonify({'success': True, 'message': 'Event deleted'})
-        else:
-            return jsonify({'success': False, 'message': 'Event not found'}), 404
+            if deleted:
+                return jsonify({'success': True, 'message': 'Event deleted'})
+            else:
+                return jsonify({'success': False, 'message': 'Event not found'}), 404
 
     except Exception as e:
         print(f"Error deleting calendar event: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # ==================== MOODS API ====================
 
-# Get all available moods
-@app.route('/api/moods', methods=['GET'])
-def get_all_moods():
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+# The moods table is static reference data, so it is cached in-process
+MOODS_CACHE_TTL = int(os.getenv('MOODS_CACHE_TTL', 3600))  # seconds
+MOODS_BROWSER_MAX_AGE = 60  # seconds before browsers revalidate with If-None-Match
+
 
+def load_mood_catalog():
+    """Load every mood once, plus an id lookup and a strong ETag for the catalog"""
+    with db_connection(replica=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute("""
                     SELECT id, mood_name, mood_emoji, description
                     FROM moods
                     ORDER BY id ASC
                     """)
 
-        moods = cur.fetchall()
-
-        formatted_moods = [{
+        moods = [{
             'id': mood['id'],
             'name': mood['mood_name'],
             'emoji': mood['mood_emoji'],
             'description': mood['description']
-        } for mood in moods]
+        } for mood in cur.fetchall()]
 
-        return jsonify({
+    etag = hashlib.sha256(json.dumps(moods, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+    return {'moods': moods, 'by_id': {mood['id']: mood for mood in moods}, 'etag': etag}
+
+
+mood_catalog = CachedValue(load_mood_catalog, ttl=MOODS_CACHE_TTL)
+
+
+def find_mood(mood_id):
+    """Look up a mood in the cached catalog, reloading once in case it was added recently"""
+    mood = mood_catalog.get()['by_id'].get(mood_id)
+    if mood is None:
+        mood_catalog.invalidate()
+        mood = mood_catalog.get()['by_id'].get(mood_id)
+    return mood
+
+
+# Get all available moods
+@app.route('/api/moods', methods=['GET'])
+def get_all_moods():
+    try:
+        catalog = mood_catalog.get()
+
+        response = jsonify({
             'success': True,
-            'moods': formatted_moods
+            'moods': catalog['moods']
         })
+        response.set_etag(catalog['etag'])
+        response.headers['Cache-Control'] = f'public, max-age={MOODS_BROWSER_MAX_AGE}'
+        # Answers a matching If-None-Match with an empty 304
+        return response.make_conditional(request)
 
     except Exception as e:
         print(f"Error fetching moods: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
+
+
+# Drop the cached moods catalog after the moods table is edited
+@app.route('/api/moods/refresh', methods=['POST'])
+def refresh_moods():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    mood_catalog.invalidate()
+    return jsonify({'success': True, 'message': 'Moods catalog will be reloaded'})
 
 
 # Set mood for today (updates daily_journals table)
@@ -960,118 +1423,149 @@ def set_today_mood():
         if not mood_id:
             return jsonify({'success': False, 'message': 'Mood ID is required'}), 400
 
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        # Resolve the mood details from the cached catalog before writing anything
+        try:
+            mood = find_mood(int(mood_id))
+        except (TypeError, ValueError):
+            mood = None
+        if mood is None:
+            return jsonify({'success': False, 'message': 'Mood not found'}), 400
+
+        # Lock today's row, then set the mood and update the rollups, in one transaction
+        with db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            set_mood(cur, session['user_id'], datetime.now().date(), mood['id'])
+            conn.commit()
 
-        today = datetime.now().date()
+            return jsonify({
+                'success': True,
+                'mood': mood
+            })
 
-        # Check if a daily_journals entry exists for today
-        cur.execute("""
-                    SELECT id
-                    FROM daily_journals
-                    WHERE user_id = %s
-                      AND entry_date = %s
-                    """, (session['user_id'], today))
+    except Exception as e:
+        print(f"Error setting mood: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
 
-        daily_journal = cur.fetchone()
 
-        if daily_journal:
-            # Update existing entry
-            cur.execute("""
-                        UPDATE daily_journals
-                        SET mood_id = %s
-                        WHERE id = %s RETURNING id, mood_id
-                        """, (mood_id, daily_journal['id']))
-        else:
-            # Create new daily_journals entry with mood
-            cur.execute("""
-                        INSERT INTO daily_journals (user_id, entry_date, mood_id)
-                        VALUES (%s, %s, %s) RETURNING id, mood_id
-                        """, (session['user_id'], today, mood_id))
+DAY_MOOD_SQL = named_query('day_mood', """
+    SELECT mood_id
+    FROM daily_journals
+    WHERE user_id = %s
+      AND entry_date = %s
+""")
 
-        result = cur.fetchone()
-        conn.commit()
 
-        # Get the mood details
-        cur.execute("""
-                    SELECT id, mood_name, mood_emoji, description
-                    FROM moods
-                    WHERE id = %s
-                    """, (mood_id,))
+# Get today's mood
+@app.route('/api/moods/today', methods=['GET'])
+def get_today_mood():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
-        mood = cur.fetchone()
+    try:
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            today = datetime.now().date()
+
+            # Get today's mood id from daily_journals; the details come from the catalog cache
+            cur.execute(DAY_MOOD_SQL, (session['user_id'], today))
+
+            row = cur.fetchone()
+
+        mood = find_mood(row['mood_id']) if row and row['mood_id'] else None
 
         return jsonify({
             'success': True,
-            'mood': {
-                'id': mood['id'],
-                'name': mood['mood_name'],
-                'emoji': mood['mood_emoji'],
-                'description': mood['description']
-            }
+            'mood': mood
         })
 
     except Exception as e:
-        print(f"Error setting mood: {e}")
+        print(f"Error fetching today's mood: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
-# Get today's mood
-@app.route('/api/moods/today', methods=['GET'])
-def get_today_mood():
+# Mood distribution per week or month, plus logging streaks, read from the rollups
+@app.route('/api/moods/trends', methods=['GET'])
+def get_mood_trends():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
+    today = datetime.now().date()
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        today = datetime.now().date()
-
-        # Get today's mood from daily_journals
-        cur.execute("""
-                    SELECT m.id, m.mood_name, m.mood_emoji, m.description
-                    FROM daily_journals dj
-                             JOIN moods m ON dj.mood_id = m.id
-                    WHERE dj.user_id = %s
-                      AND dj.entry_date = %s
-                    """, (session['user_id'], today))
+        period, first, end = trend_range(request.args, today)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid range: {e}'}), 400
 
-        mood = cur.fetchone()
-
-        if mood:
-            return jsonify({
-                'success': True,
-                'mood': {
-                    'id': mood['id'],
-                    'name': mood['mood_name'],
-                    'emoji': mood['mood_emoji'],
-                    'description': mood['description']
-                }
+    try:
+        with db_connection(replica=use_replica()) as conn, conn.cursor() as cur:
+            cur.execute("""
+                        SELECT period_start, mood_id, days
+                        FROM mood_rollups
+                        WHERE user_id = %s
+                          AND period = %s
+                          AND period_start >= %s
+                          AND period_start < %s
+                          AND days > 0
+                        ORDER BY period_start, mood_id
+                        """, (session['user_id'], period, first, end))
+            rollups = cur.fetchall()
+
+            # Runs overlapping the range, plus whichever run is still going today
+            cur.execute("""
+                        SELECT start_date, end_date
+                        FROM mood_streaks
+                        WHERE user_id = %(user_id)s
+                          AND ((start_date < %(end)s AND end_date >= %(first)s)
+                            OR end_date >= %(yesterday)s)
+                        ORDER BY start_date
+                        """, {'user_id': session['user_id'], 'first': first, 'end': end,
+                              'yesterday': today - timedelta(days=1)})
+            runs = cur.fetchall()
+
+        moods_by_bucket = {}
+        for bucket_start, mood_id, days in rollups:
+            mood = find_mood(mood_id) or {'id': mood_id, 'name': None, 'emoji': None}
+            moods_by_bucket.setdefault(bucket_start, []).append({
+                'id': mood_id,
+                'name': mood['name'],
+                'emoji': mood['emoji'],
+                'days': days
             })
-        else:
-            return jsonify({
-                'success': True,
-                'mood': None
+
+        buckets = []
+        bucket_start = first
+        while bucket_start < end:
+            moods = moods_by_bucket.get(bucket_start, [])
+            buckets.append({
+                'start': bucket_start.isoformat(),
+                'total': sum(mood['days'] for mood in moods),
+                'moods': moods
             })
+            bucket_start = next_period(bucket_start, period)
+
+        return jsonify({
+            'success': True,
+            'period': period,
+            'start': first.isoformat(),
+            'end': end.isoformat(),
+            'buckets': buckets,
+            'streaks': summarize_streaks(runs, first, end, today)
+        })
 
     except Exception as e:
-        print(f"Error fetching today's mood: {e}")
+        print(f"Error fetching mood trends: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # ==================== EVENTS API (for Today's Events section) ====================
 
+def format_event(event):
+    return {
+        'id': event['id'],
+        'title': event['title'],
+        'description': event['description'],
+        'date': event['event_date'].strftime('%Y-%m-%d') if event['event_date'] else None,
+        'time': event['event_time'].strftime('%H:%M') if event['event_time'] else None
+    }
+
+
 # Create a new event
 @app.route('/api/events', methods=['POST'])
 def create_event():
@@ -1088,36 +1582,24 @@ def create_event():
         if not title:
             return jsonify({'success': False, 'message': 'Title is required'}), 400
 
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        cur.execute("""
-                    INSERT INTO events (user_id, title, description, event_date, event_time)
-                    VALUES (%s, %s, %s, %s, %s) RETURNING id, title, description, event_date, event_time
-                    """, (session['user_id'], title, description, event_date, event_time))
+        with db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                        INSERT INTO events (user_id, title, description, event_date, event_time)
+                        VALUES (%s, %s, %s, %s, %s) RETURNING id, title, description, event_date, event_time
+                        """, (session['user_id'], title, description, event_date, event_time))
 
-        event = cur.fetchone()
-        conn.commit()
+            event = cur.fetchone()
+            bump_version(cur, session['user_id'], EVENTS)
+            conn.commit()
 
-        return jsonify({
-            'success': True,
-            'event': {
-                'id': event['id'],
-                'title': event['title'],
-                'description': event['description'],
-                'date': event['event_date'].strftime('%Y-%m-%d') if event['event_date'] else None,
-                'time': event['event_time'].strftime('%H:%M') if event['event_time'] else None
-            }
-        })
+            return jsonify({
+                'success': True,
+                'event': format_event(event)
+            })
 
     except Exception as e:
         print(f"Error creating event: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # Get all events for today
@@ -1127,42 +1609,33 @@ def get_today_events():
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            etag = resource_etag(cur, EVENTS)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
 
-        today = datetime.now().date()
+            today = datetime.now().date()
 
-        cur.execute("""
-                    SELECT id, title, description, event_date, event_time
-                    FROM events
-                    WHERE user_id = %s
-                      AND event_date = %s
-                    ORDER BY event_time ASC NULLS LAST
-                    """, (session['user_id'], today))
-
-        events = cur.fetchall()
-
-        formatted_events = [{
-            'id': event['id'],
-            'title': event['title'],
-            'description': event['description'],
-            'date': event['event_date'].strftime('%Y-%m-%d') if event['event_date'] else None,
-            'time': event['event_time'].strftime('%H:%M') if event['event_time'] else None
-        } for event in events]
+            cur.execute("""
+                        SELECT id, title, description, event_date, event_time
+                        FROM events
+                        WHERE user_id = %s
+                          AND event_date = %s
+                        ORDER BY event_time ASC NULLS LAST
+                        """, (session['user_id'], today))
 
-        return jsonify({
-            'success': True,
-            'events': formatted_events
-        })
+            events = cur.fetchall()
+
+            formatted_events = [format_event(event) for event in events]
+
+            return tag_response(jsonify({
+                'success': True,
+                'events': formatted_events
+            }), etag)
 
     except Exception as e:
         print(f"Error fetching events: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # Update an event
@@ -1176,42 +1649,31 @@ def update_event(event_id):
         title = data.get('title')
         description = data.get('description')
 
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        cur.execute("""
-                    UPDATE events
-                    SET title       = %s,
-                        description = %s
-                    WHERE id = %s
-                      AND user_id = %s RETURNING id, title, description, event_date, event_time
-                    """, (title, description, event_id, session['user_id']))
-
-        event = cur.fetchone()
-        conn.commit()
+        with db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                        UPDATE events
+                        SET title       = %s,
+                            description = %s
+                        WHERE id = %s
+                          AND user_id = %s RETURNING id, title, description, event_date, event_time
+                        """, (title, description, event_id, session['user_id']))
+
+            event = cur.fetchone()
+            if event:
+                bump_version(cur, session['user_id'], EVENTS)
+            conn.commit()
 
-        if event:
-            return jsonify({
-                'success': True,
-                'event': {
-                    'id': event['id'],
-                    'title': event['title'],
-                    'description': event['description'],
-                    'date': event['event_date'].strftime('%Y-%m-%d') if event['event_date'] else None,
-                    'time': event['event_time'].strftime('%H:%M') if event['event_time'] else None
-                }
-            })
-        else:
-            return jsonify({'success': False, 'message': 'Event not found'}), 404
+            if event:
+                return jsonify({
+                    'success': True,
+                    'event': format_event(event)
+                })
+            else:
+                return jsonify({'success': False, 'message': 'Event not found'}), 404
 
     except Exception as e:
         print(f"Error updating event: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 # Delete an event
@@ -1221,32 +1683,217 @@ def delete_event(event_id):
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                        DELETE
+                        FROM events
+                        WHERE id = %s
+                          AND user_id = %s RETURNING id
+                        """, (event_id, session['user_id']))
+
+            deleted = cur.fetchone()
+            if deleted:
+                bump_version(cur, session['user_id'], EVENTS)
+            conn.commit()
 
-        cur.execute("""
-                    DELETE
-                    FROM events
-                    WHERE id = %s
-                      AND user_id = %s RETURNING id
-                    """, (event_id, session['user_id']))
+            if deleted:
+                return jsonify({'success': True, 'message': 'Event deleted'})
+            else:
+                return jsonify({'success': False, 'message': 'Event not found'}), 404
 
-        deleted = cur.fetchone()
-        conn.commit()
+    except Exception as e:
+        print(f"Error deleting event: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
 
-        if deleted:
-            return jsonify({'success': True, 'message': 'Event deleted'})
-        else:
-            return jsonify({'success': False, 'message': 'Event not found'}), 404
+
+# ==================== JOURNAL PAGE BOOTSTRAP ====================
+
+# Today's mood id, intentions and events as one row; the lists come back as JSON arrays
+JOURNAL_TODAY_SQL = named_query('journal_today', """
+    SELECT (SELECT mood_id
+            FROM daily_journals
+            WHERE user_id = %(user_id)s
+              AND entry_date = %(today)s) AS mood_id,
+           (SELECT COALESCE(json_agg(i ORDER BY i.id), '[]'::json)
+            FROM (SELECT id, intention_text, for_date, is_completed, completed_at
+                  FROM intentions
+                  WHERE user_id = %(user_id)s
+                    AND for_date = %(today)s) i) AS intentions,
+           (SELECT COALESCE(json_agg(e ORDER BY e.event_time ASC NULLS LAST), '[]'::json)
+            FROM (SELECT id, title, description, event_date, event_time
+                  FROM events
+                  WHERE user_id = %(user_id)s
+                    AND event_date = %(today)s) e) AS events
+""")
+
+
+def journal_today(row, catalog, today):
+    """Response body for /api/journal/today from a JOURNAL_TODAY_SQL row"""
+    # json_agg renders dates and times as ISO strings; parse them back so the
+    # shared formatters produce exactly what /api/intentions and /api/events/today return
+    intentions = [format_intention(dict(
+        intention,
+        for_date=date.fromisoformat(intention['for_date']),
+        completed_at=datetime.fromisoformat(intention['completed_at']) if intention['completed_at'] else None
+    )) for intention in row['intentions']]
+
+    events = [format_event(dict(
+        event,
+        event_date=date.fromisoformat(event['event_date']) if event['event_date'] else None,
+        event_time=time_of_day.fromisoformat(event['event_time']) if event['event_time'] else None
+    )) for event in row['events']]
+
+    return {
+        'success': True,
+        'date': today.isoformat(),
+        'moods': catalog['moods'],
+        'mood': catalog['by_id'].get(row['mood_id']) if row['mood_id'] else None,
+        'intentions': intentions,
+        'events': events
+    }
+
+
+# Everything the journal page needs on load, in one response and one round trip
+@app.route('/api/journal/today', methods=['GET'])
+def get_journal_today():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        # Served from the in-process cache, so it costs no query when warm
+        catalog = mood_catalog.get()
+        today = datetime.now().date()
+
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(JOURNAL_TODAY_SQL, {'user_id': session['user_id'], 'today': today})
+            row = cur.fetchone()
+
+        return jsonify(journal_today(row, catalog, today))
 
     except Exception as e:
-        print(f"Error deleting event: {e}")
+        print(f"Error fetching today's journal: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# ==================== DELTA SYNC ====================
+
+# Changes per /api/sync response; clients keep calling with the returned cursor while has_more
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 2000
+SYNC_RESOURCES = ('entries', 'intentions', 'calendar_events', 'events', 'moods')
+
+# One page of the user's change log (migrations/0010_sync_changes.sql) plus the current
+# state of every item in it that still exists, as one row in one round trip
+SYNC_SQL = named_query('sync_changes', """
+    WITH changes AS (SELECT resource, item_id, seq, deleted
+                     FROM sync_changes
+                     WHERE user_id = %(user_id)s
+                       AND seq > %(since)s
+                     ORDER BY seq
+                     LIMIT %(limit)s),
+         changed AS (SELECT resource, item_id FROM changes WHERE NOT deleted)
+    SELECT (SELECT seq FROM sync_cursors WHERE user_id = %(user_id)s) AS latest,
+           (SELECT COALESCE(json_agg(c ORDER BY c.seq), '[]'::json) FROM changes c) AS changes,
+           (SELECT COALESCE(json_agg(je), '[]'::json)
+            FROM (SELECT je.id, je.entry_title, je.entry_content, je.created_at
+                  FROM journal_entries je
+                           JOIN changed ON changed.resource = 'entries' AND changed.item_id = je.id) je) AS entries,
+           (SELECT COALESCE(json_agg(i), '[]'::json)
+            FROM (SELECT i.id, i.intention_text, i.for_date, i.is_completed, i.completed_at
+                  FROM intentions i
+                           JOIN changed ON changed.resource = 'intentions' AND changed.item_id = i.id) i) AS intentions,
+           (SELECT COALESCE(json_agg(ce), '[]'::json)
+            FROM (SELECT ce.id, ce.event_title, ce.event_description, ce.event_date, ce.event_time
+                  FROM calendar_events ce
+                           JOIN changed ON changed.resource = 'calendar_events' AND changed.item_id = ce.id) ce)
+               AS calendar_events,
+           (SELECT COALESCE(json_agg(e), '[]'::json)
+            FROM (SELECT e.id, e.title, e.description, e.event_date, e.event_time
+                  FROM events e
+                           JOIN changed ON changed.resource = 'events' AND changed.item_id = e.id) e) AS events,
+           (SELECT COALESCE(json_agg(m), '[]'::json)
+            FROM (SELECT dj.id, dj.entry_date, dj.mood_id
+                  FROM daily_journals dj
+                           JOIN changed ON changed.resource = 'moods' AND changed.item_id = dj.id) m) AS moods
+""")
+
+
+def sync_changes(row, catalog, since):
+    """Response body for /api/sync from a SYNC_SQL row.
+
+    Each resource lists the items changed since the cursor, formatted as their own
+    endpoints return them, and the ids of those deleted since.
+    """
+    changes = row['changes']
+    current = {
+        'entries': [format_entry(dict(entry, created_at=datetime.fromisoformat(entry['created_at'])))
+                    for entry in row['entries']],
+        'intentions': [format_intention(dict(
+            intention,
+            for_date=date.fromisoformat(intention['for_date']),
+            completed_at=datetime.fromisoformat(intention['completed_at']) if intention['completed_at'] else None
+        )) for intention in row['intentions']],
+        'calendar_events': [format_calendar_event(dict(
+            event,
+            event_date=date.fromisoformat(event['event_date']),
+            event_time=time_of_day.fromisoformat(event['event_time']) if event['event_time'] else None
+        )) for event in row['calendar_events']],
+        'events': [format_event(dict(
+            event,
+            event_date=date.fromisoformat(event['event_date']) if event['event_date'] else None,
+            event_time=time_of_day.fromisoformat(event['event_time']) if event['event_time'] else None
+        )) for event in row['events']],
+        'moods': [{
+            'id': mood['id'],
+            'date': mood['entry_date'],
+            'mood': catalog['by_id'].get(mood['mood_id'])
+        } for mood in row['moods']],
+    }
+
+    # Keep log order, so a client applying the lists in turn sees items in the order they changed
+    order = {(change['resource'], change['item_id']): change['seq'] for change in changes}
+    response = {'success': True}
+    for resource in SYNC_RESOURCES:
+        response[resource] = {
+            'changed': sorted(current[resource], key=lambda item: order[(resource, item['id'])]),
+            'deleted': [change['item_id'] for change in changes
+                        if change['resource'] == resource and change['deleted']]
+        }
+
+    last = changes[-1]['seq'] if changes else since
+    response['cursor'] = encode_cursor(last)
+    response['has_more'] = last < (row['latest'] or 0)
+    return response
+
+
+# Everything that changed since the cursor from an earlier call; no cursor means everything
+@app.route('/api/sync', methods=['GET'])
+def get_sync():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        since = decode_cursor(request.args['since'], int)[0] if request.args.get('since') else 0
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    limit = max(1, min(request.args.get('limit', SYNC_PAGE_SIZE, type=int), SYNC_MAX_PAGE_SIZE))
+
+    try:
+        catalog = mood_catalog.get()
+
+        with db_connection(replica=use_replica()) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(SYNC_SQL, {'user_id': session['user_id'], 'since': since, 'limit': limit})
+            row = cur.fetchone()
+
+        # A cursor past the end came from another account or a database that was reset
+        if since > (row['latest'] or 0):
+            return jsonify({'success': False, 'message': 'Cursor is no longer valid; sync again without one'}), 410
+
+        return jsonify(sync_changes(row, catalog, since))
+
+    except Exception as e:
+        print(f"Error syncing changes: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @app.route('/journal')
@@ -1286,16 +1933,15 @@ def logout():
 @app.route('/health')
 def health():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT 1;')
-        result = cur.fetchone()
-        status = "ok" if result else "error"
-        return jsonify({
-            'success': True,
-            'status': status,
-            'message': 'Server and database are running properly.'
-        })
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT 1;')
+            result = cur.fetchone()
+            status = "ok" if result else "error"
+            return jsonify({
+                'success': True,
+                'status': status,
+                'message': 'Server and database are running properly.'
+            })
     except Exception as e:
         print(f"Health check error: {e}")
         return jsonify({
@@ -1303,39 +1949,107 @@ def health():
             'status': 'error',
             'message': str(e)
         }), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
 @app.route('/debug-users')
 def debug_users():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        cur.execute("""
-                    SELECT id, username, email, created_at
-                    FROM users
-                    ORDER BY id ASC
-                    """)
-        users = cur.fetchall()
+        with db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                        SELECT id, username, email, created_at
+                        FROM users
+                        ORDER BY id ASC
+                        """)
+            users = cur.fetchall()
 
-        return jsonify({
-            'success': True,
-            'users': users
-        })
+            return jsonify({
+                'success': True,
+                'users': users
+            })
     except Exception as e:
         print(f"Error fetching users: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 
+@app.route('/debug-pool')
+def debug_pool():
+    return jsonify({
+        'success': True,
+        'pool': pool_stats(),
+        'replicas': replica_stats()
+    })
+
+
+
+@app.route('/debug-outbox')
+def debug_outbox():
+    return jsonify({
+        'success': True,
+        'outbox': outbox_stats()
+    })
+
+
+@app.route('/debug-passwords')
+def debug_passwords():
+    return jsonify({
+        'success': True,
+        'passwords': password_manager.stats()
+    })
+
+@app.route('/debug-compression')
+def debug_compression():
+    return jsonify({
+        'success': True,
+        'compression': response_compressor.stats()
+    })
+
+
+@app.route('/debug-rate-limits')
+def debug_rate_limits():
+    return jsonify({
+        'success': True,
+        'rate_limits': limiter_stats()
+    })
+
+
+@app.route('/debug-queries')
+def debug_queries():
+    return jsonify({
+        'success': True,
+        'queries': query_stats()
+    })
+
+
+@app.route('/debug-otp')
+def debug_otp():
+    return jsonify({
+        'success': True,
+        'otp_store': otp_store_stats()
+    })
+
+# Prometheus scrape endpoint. SMTP time is reported from the outbox's own histograms
+# because mail is sent on background threads, outside any request.
+@app.route('/metrics')
+def metrics():
+    lines = stats_lines('db_pool', pool_stats(),
+                        counters=('checkouts', 'timeouts', 'connections_opened', 'connections_closed',
+                                  'health_check_failures', 'wait_count', 'wait_time_total_ms'))
+    lines += stats_lines('db_replicas', replica_stats(), counters=('replica_reads', 'primary_reads', 'ejections'))
+    lines += stats_lines('mail_outbox', outbox_stats(),
+                         counters=('sent', 'failed', 'retried', 'rejected', 'sessions_opened'))
+    lines += stats_lines('password', password_manager.stats(), counters=('rejected', 'rehashed'))
+    compression_stats = response_compressor.stats()
+    lines += stats_lines('compression', compression_stats,
+                         counters=[key for key in compression_stats if not key.endswith('_ratio')])
+    rate_limit_stats = limiter_stats()
+    lines += stats_lines('rate_limit', rate_limit_stats,
+                         counters=[key for key in rate_limit_stats if key != 'buckets'])
+    lines += stats_lines('query', query_stats(), counters=('prepares',))
+    lines += stats_lines('otp_store', otp_store_stats(),
+                         counters=('issued', 'verified', 'rejected', 'expired', 'loaded', 'write_behind_flushes',
+                                   'write_behind_rows', 'write_behind_errors'))
+    body = request_metrics.render() + '\n'.join(lines) + '\n'
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
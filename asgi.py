@@ -0,0 +1,605 @@
+# asgi.py
+"""ASGI entry point for the journal app, alongside the WSGI `app.app`.
+
+    uvicorn asgi:application --workers 4
+
+The busiest /api/* handlers run here as coroutines on an async PostgreSQL pool
+(psycopg 3), so a request waiting on the database holds no thread and one worker
+can keep hundreds of requests in flight. They run inside a regular Flask request
+context, so session cookies, before/after_request hooks (metrics, compression,
+CORS) and the JSON they return are exactly those of the WSGI app, and reads go to
+DB_REPLICAS under the same read-your-writes rule (app.use_replica). Every other
+route - pages, auth, uploads, streamed listings - is handed to the Flask app on a
+thread pool, so both entry points serve every URL.
+
+Needs psycopg 3 with its pool, and uvicorn (both in requirement.txt).
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from urllib.parse import parse_qs
+
+from flask import jsonify, request, session
+from psycopg import OperationalError, errors
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from werkzeug.exceptions import HTTPException
+
+from app import (CREATE_ENTRY_SQL, DAY_MOOD_SQL, ENTRIES_MAX_PAGE_SIZE, ENTRIES_PAGE_AFTER_SQL, ENTRIES_PAGE_SIZE,
+                 ENTRIES_PAGE_SQL, INTENTIONS_FOR_DATE_SQL, JOURNAL_TODAY_SQL, app, calendar_events_page,
+                 calendar_events_query, calendar_range, decode_cursor, entries_page, find_mood, format_entry,
+                 format_intention, journal_today, mood_catalog, not_modified, tag_response, use_replica, user_etag)
+from db_pool import (DB_POOL_CHECKOUT_TIMEOUT, DB_POOL_MAX_IDLE, DB_POOL_MAX_LIFETIME, DB_POOL_MAX_SIZE,
+                     DB_POOL_MIN_SIZE, DB_REPLICA_EJECT_SECONDS, DB_REPLICA_LAG_CHECK_INTERVAL, DB_REPLICA_MAX_LAG,
+                     DB_REPLICAS, ReplicaSet, connection_params, replica_params)
+from metrics import record_timing
+from queries import NamedQuery, prepared_statements_enabled
+from mood_trends import LOCK_DAY_SQL, SET_MOOD_SQL, set_mood_params
+from resource_versions import CALENDAR_EVENTS, ENTRIES, GET_VERSION_SQL, INTENTIONS
+
+# Threads for the routes that still run as plain Flask views
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 32))
+
+
+# ---------- async database access ----------
+_pool = None
+_replicas = None
+_pool_lock = asyncio.Lock()
+
+
+async def open_pool(params: dict) -> AsyncConnectionPool:
+    """An async pool of connections to one server, sized by the same DB_POOL_* settings as db_pool.
+
+    Connections run in autocommit, so a single statement needs no BEGIN/COMMIT. A
+    handler whose statements must be atomic together, or that relies on a lock one of
+    them takes, wraps them in conn.transaction(), as its Flask view gets a transaction
+    from db_pool.db_connection(). psycopg prepares statements at the protocol level;
+    with DB_PREPARED_STATEMENTS off it never does, as a transaction-mode pooler may
+    not support that either.
+    """
+    pool = AsyncConnectionPool(
+        make_conninfo(**params),
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+        max_idle=DB_POOL_MAX_IDLE,
+        timeout=DB_POOL_CHECKOUT_TIMEOUT,
+        kwargs={'autocommit': True, 'row_factory': dict_row,
+                'prepare_threshold': 5 if prepared_statements_enabled() else None},
+        open=False,
+    )
+    await pool.open()
+    return pool
+
+
+async def get_pool() -> AsyncConnectionPool:
+    """Return this worker's async pool on the primary, opening it on first use."""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await open_pool(connection_params())
+    return _pool
+
+
+class AsyncReplicaSet:
+    """Async twin of db_pool.ReplicaSet, with the same round robin, ejection and lag limit.
+
+    primary is a coroutine function returning the pool to fall back to.
+    """
+
+    def __init__(self, pools: list, primary, eject_seconds: float = 30.0, max_lag: float = 2.0,
+                 lag_check_interval: float = 5.0, clock=time.monotonic):
+        self.pools = list(pools)
+        self.primary = primary
+        self.eject_seconds = eject_seconds
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self._clock = clock
+        self._next = 0
+        self._ejected_until = [0.0] * len(self.pools)
+        self._lag_checked_at = [None] * len(self.pools)
+        self._reads = [0] * len(self.pools)
+        self._ejections = 0
+        self._primary_reads = 0
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a connection from the next healthy replica, or from the primary."""
+        for index in self._candidates():
+            started = False
+            try:
+                async with self.pools[index].connection() as conn:
+                    if not await self._lag_ok(index, conn):
+                        continue
+                    self._reads[index] += 1
+                    started = True
+                    yield conn
+                    return
+            except OperationalError as e:
+                if isinstance(e, errors.QueryCanceled):
+                    raise  # a statement timeout says nothing about the replica's health
+                self._eject(index, e)
+                if started:
+                    # The caller's queries already ran here; retrying them is up to the caller
+                    raise
+        self._primary_reads += 1
+        pool = await self.primary()
+        async with pool.connection() as conn:
+            yield conn
+
+    def stats(self) -> dict:
+        now = self._clock()
+        return {
+            'replicas': len(self.pools),
+            'healthy': sum(until <= now for until in self._ejected_until),
+            'replica_reads': sum(self._reads),
+            'primary_reads': self._primary_reads,
+            'ejections': self._ejections,
+        }
+
+    def _candidates(self) -> list:
+        """Healthy replicas, starting with the next one in turn."""
+        now = self._clock()
+        start = self._next
+        self._next = (self._next + 1) % len(self.pools)
+        order = [(start + offset) % len(self.pools) for offset in range(len(self.pools))]
+        return [index for index in order if self._ejected_until[index] <= now]
+
+    async def _lag_ok(self, index: int, conn) -> bool:
+        now = self._clock()
+        checked_at = self._lag_checked_at[index]
+        if checked_at is not None and now - checked_at < self.lag_check_interval:
+            return True
+        self._lag_checked_at[index] = now
+        cur = await conn.execute(ReplicaSet.LAG_SQL)
+        lag = next(iter((await cur.fetchone()).values()))
+        if lag is not None and float(lag) > self.max_lag:
+            self._eject(index, f'{float(lag):.1f}s behind the primary')
+            return False
+        return True
+
+    def _eject(self, index: int, reason) -> None:
+        self._ejected_until[index] = self._clock() + self.eject_seconds
+        self._ejections += 1
+        print(f"Ejecting read replica {index} for {self.eject_seconds:g}s: {reason}")
+
+
+async def get_replicas():
+    """Return this worker's AsyncReplicaSet, or None when DB_REPLICAS is not set."""
+    global _replicas
+    if _replicas is None and DB_REPLICAS:
+        async with _pool_lock:
+            if _replicas is None:
+                pools = [await open_pool(params) for params in replica_params(DB_REPLICAS, connection_params())]
+                _replicas = AsyncReplicaSet(pools, get_pool, eject_seconds=DB_REPLICA_EJECT_SECONDS,
+                                            max_lag=DB_REPLICA_MAX_LAG,
+                                            lag_check_interval=DB_REPLICA_LAG_CHECK_INTERVAL)
+    return _replicas
+
+
+async def close_pool() -> None:
+    global _pool, _replicas
+    if _replicas is not None:
+        for pool in _replicas.pools:
+            await pool.close()
+        _replicas = None
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+@asynccontextmanager
+async def db_connection(replica: bool = False):
+    """Borrow a connection from the async pool, counting the wait as 'pool' time.
+
+    replica=True borrows from a read replica instead, when DB_REPLICAS is set, on the
+    same terms as db_pool.db_connection(): pass app.use_replica() so a user's reads
+    never miss their own recent writes.
+    """
+    replicas = await get_replicas() if replica else None
+    connection = replicas.connection() if replicas is not None else (await get_pool()).connection()
+    start = time.perf_counter()
+    async with connection as conn:
+        record_timing('pool', (time.perf_counter() - start) * 1000)
+        yield conn
+
+
+async def execute(conn, sql, params, fetch):
+    """Run sql and return fetch(cursor); queries.NamedQuery statements are prepared right away."""
+    named = isinstance(sql, NamedQuery)
+    start = time.perf_counter()
+    try:
+        cur = await conn.execute(sql, params, prepare=True if named and prepared_statements_enabled() else None)
+        return await fetch(cur)
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        record_timing('db', elapsed_ms)
+        if named:
+            sql.duration.observe(elapsed_ms)
+
+
+async def fetchall(conn, sql, params=None) -> list:
+    return await execute(conn, sql, params, lambda cur: cur.fetchall())
+
+
+async def fetchone(conn, sql, params=None):
+    return await execute(conn, sql, params, lambda cur: cur.fetchone())
+
+
+async def resource_etag(conn, resource):
+    """Async twin of app.resource_etag()."""
+    row = await fetchone(conn, GET_VERSION_SQL, (session['user_id'], resource))
+    return user_etag(resource, row['version'] if row else 0)
+
+
+# ---------- coroutine handlers, keyed by the Flask endpoint they replace ----------
+ASYNC_VIEWS = {}
+
+
+def async_view(endpoint, unless=None):
+    """Serve endpoint with the decorated coroutine.
+
+    unless(query_args) can hand individual requests back to the Flask view.
+    """
+    def register(view):
+        ASYNC_VIEWS[endpoint] = (view, unless)
+        return view
+    return register
+
+
+@async_view('create_entry')
+async def create_entry():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        data = request.json
+        title = data.get('title')
+        content = data.get('content')
+
+        if not title or not content:
+            return jsonify({'success': False, 'message': 'Title and content are required'}), 400
+
+        async with db_connection() as conn:
+            entry = await fetchone(conn, CREATE_ENTRY_SQL, {
+                'user_id': session['user_id'],
+                'day': datetime.now().date(),
+                'title': title,
+                'content': content,
+                'resource': ENTRIES
+            })
+
+        return jsonify({
+            'success': True,
+            'entry': format_entry(entry)
+        })
+
+    except Exception as e:
+        print(f"Error creating entry: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# ?stream=1 reads through a server-side cursor; that stays on the Flask view
+@async_view('get_entries', unless=lambda args: args.get('stream', [''])[0] in ('1', 'true'))
+async def get_entries():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        after = decode_cursor(request.args['cursor'], datetime.fromisoformat, int) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    params = {'user_id': session['user_id']}
+    if after:
+        params['after_created_at'], params['after_id'] = after
+
+    limit = max(1, min(request.args.get('limit', ENTRIES_PAGE_SIZE, type=int), ENTRIES_MAX_PAGE_SIZE))
+    params['limit'] = limit + 1  # one extra row tells us whether another page exists
+
+    try:
+        async with db_connection(replica=use_replica()) as conn:
+            etag = await resource_etag(conn, ENTRIES)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            entries = await fetchall(conn, ENTRIES_PAGE_AFTER_SQL if after else ENTRIES_PAGE_SQL, params)
+
+        return tag_response(jsonify(entries_page(entries, limit)), etag)
+
+    except Exception as e:
+        print(f"Error fetching entries: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@async_view('get_intentions')
+async def get_intentions():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        date_str = request.args.get('date', datetime.now().date().isoformat())
+
+        async with db_connection(replica=use_replica()) as conn:
+            etag = await resource_etag(conn, INTENTIONS)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            intentions = await fetchall(conn, INTENTIONS_FOR_DATE_SQL, (session['user_id'], date_str))
+
+        return tag_response(jsonify({
+            'success': True,
+            'intentions': [format_intention(intention) for intention in intentions]
+        }), etag)
+
+    except Exception as e:
+        print(f"Error fetching intentions: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@async_view('get_calendar_events')
+async def get_calendar_events():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        date_range = calendar_range(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid date range: {e}'}), 400
+
+    try:
+        async with db_connection(replica=use_replica()) as conn:
+            etag = await resource_etag(conn, CALENDAR_EVENTS)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+
+            events = await fetchall(conn, *calendar_events_query(session['user_id'], date_range))
+
+        return tag_response(jsonify(calendar_events_page(events, date_range)), etag)
+
+    except Exception as e:
+        print(f"Error fetching calendar events: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@async_view('set_today_mood')
+async def set_today_mood():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        mood_id = request.json.get('mood_id')
+
+        if not mood_id:
+            return jsonify({'success': False, 'message': 'Mood ID is required'}), 400
+
+        # The catalog is cached in-process; only a cold cache touches the database
+        try:
+            mood = await asyncio.to_thread(find_mood, int(mood_id))
+        except (TypeError, ValueError):
+            mood = None
+        if mood is None:
+            return jsonify({'success': False, 'message': 'Mood not found'}), 400
+
+        # Pool connections are in autocommit, so open a transaction: LOCK_DAY_SQL's row lock
+        # must be held until SET_MOOD_SQL has moved the rollups (see mood_trends.set_mood)
+        today = datetime.now().date()
+        async with db_connection() as conn, conn.transaction():
+            journal = await fetchone(conn, LOCK_DAY_SQL, {'user_id': session['user_id'], 'day': today})
+            await fetchone(conn, SET_MOOD_SQL, set_mood_params(session['user_id'], today, mood['id'], journal))
+
+        return jsonify({
+            'success': True,
+            'mood': mood
+        })
+
+    except Exception as e:
+        print(f"Error setting mood: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@async_view('get_today_mood')
+async def get_today_mood():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        async with db_connection(replica=use_replica()) as conn:
+            row = await fetchone(conn, DAY_MOOD_SQL, (session['user_id'], datetime.now().date()))
+
+        mood = await asyncio.to_thread(find_mood, row['mood_id']) if row and row['mood_id'] else None
+
+        return jsonify({
+            'success': True,
+            'mood': mood
+        })
+
+    except Exception as e:
+        print(f"Error fetching today's mood: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@async_view('get_journal_today')
+async def get_journal_today():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+
+    try:
+        catalog = await asyncio.to_thread(mood_catalog.get)
+        today = date.today()
+
+        async with db_connection(replica=use_replica()) as conn:
+            row = await fetchone(conn, JOURNAL_TODAY_SQL, {'user_id': session['user_id'], 'today': today})
+
+        return jsonify(journal_today(row, catalog, today))
+
+    except Exception as e:
+        print(f"Error fetching today's journal: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# ---------- ASGI <-> Flask bridge ----------
+_executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix='asgi-wsgi')
+
+
+def build_environ(scope) -> dict:
+    """WSGI environ for an ASGI http scope, without wsgi.input."""
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'], environ['SERVER_PORT'] = server[0], str(server[1] or 80)
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class ReceiveStream(io.RawIOBase):
+    """Blocking, file-like view of an ASGI request body for a Flask view on a worker thread."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._pending = b''
+        self._more = True
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                self._more = False
+            else:
+                self._pending = message.get('body', b'')
+                self._more = message.get('more_body', False)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+
+def asgi_headers(headers) -> list:
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+async def run_async_view(view, view_args, environ, send) -> None:
+    """Run a coroutine view through Flask's request lifecycle and send its response."""
+    with app.request_context(environ):
+        try:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view(**view_args)
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            response = app.finalize_request(rv)
+        except Exception as e:
+            response = app.handle_exception(e)
+        body = b''.join(response.get_app_iter(environ))
+        headers = asgi_headers(response.headers.to_wsgi_list())
+        status = response.status_code
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def run_wsgi(environ, receive, send) -> None:
+    """Run the Flask app on the thread pool, streaming its response back."""
+    loop = asyncio.get_running_loop()
+    environ['wsgi.input'] = io.BufferedReader(ReceiveStream(receive, loop))
+    environ['wsgi.input_terminated'] = True
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = asgi_headers(headers)
+
+    iterable = await loop.run_in_executor(_executor, app, environ, start_response)
+    try:
+        chunks = iter(iterable)
+        first = await loop.run_in_executor(_executor, next, chunks, None)
+        await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+        chunk = first
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await loop.run_in_executor(_executor, next, chunks, None)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(iterable, 'close'):
+            await loop.run_in_executor(_executor, iterable.close)
+
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await get_pool()
+            except Exception as e:
+                # Not fatal: the pool is opened again on first use
+                print(f"Async database pool failed to open: {e}")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_pool()
+            _executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send) -> None:
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        raise RuntimeError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    environ = build_environ(scope)
+    try:
+        endpoint, view_args = app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        endpoint = None  # 404, 405 or a redirect; Flask renders those
+
+    view, unless = ASYNC_VIEWS.get(endpoint, (None, None))
+    if view is None or (unless and unless(parse_qs(environ['QUERY_STRING']))):
+        return await run_wsgi(environ, receive, send)
+
+    body = await read_body(receive)
+    environ['wsgi.input'] = io.BytesIO(body)
+    environ['CONTENT_LENGTH'] = str(len(body))
+    await run_async_view(view, view_args, environ, send)
@@ -0,0 +1,220 @@
+"""Compare concurrent-request throughput of the WSGI app and the ASGI entry point.
+
+Each server runs in its own process against a local PostgreSQL database, optionally
+through a proxy that adds latency to every database round trip - a remote database
+is where async serving pays off. Virtual users sign in, then hit the /api/* mix
+below as fast as they can. The WSGI server gets a fixed number of request threads
+and no keep-alive, like `gunicorn --workers 1 --threads N`; the ASGI one is a single
+uvicorn worker. Both use a DB_POOL_MAX_SIZE connection pool.
+
+    python benchmarks/async_throughput.py --db-name journal_bench --added-latency-ms 5 --concurrency 16 64 256
+
+Needs httpx and uvicorn on top of the app's own requirements.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.load_test import (BENCH_PASSWORD, add_database_arguments, configure_environment, git_commit,  # noqa: E402
+                                  prepare_database, seed, summarize)
+
+# (weight, method, path); paths are formatted with today's year and month
+REQUEST_MIX = (
+    (4, 'GET', '/api/journal/today'),
+    (3, 'GET', '/api/entries'),
+    (2, 'GET', '/api/calendar-events?year={year}&month={month}&around=1'),
+    (1, 'GET', '/api/intentions'),
+    (1, 'POST', '/api/entries'),
+)
+
+
+# ---------- servers (run in child processes) ----------
+def serve(args) -> None:
+    if args.added_latency_ms:
+        from benchmarks.latency_proxy import LatencyProxy
+
+        proxy = LatencyProxy(os.environ['DB_HOST'], int(os.environ['DB_PORT']), args.added_latency_ms).start()
+        os.environ.update({'DB_HOST': '127.0.0.1', 'DB_PORT': str(proxy.port), 'DB_SSLMODE': 'disable'})
+
+    if args.serve == 'asgi':
+        import uvicorn
+
+        uvicorn.run('asgi:application', host='127.0.0.1', port=args.port, log_level='warning', access_log=False)
+        return
+
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    from app import app
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class PooledWSGIServer(BaseWSGIServer):
+        "Serves each connection on one of a fixed number of threads."
+
+        def __init__(self, threads):
+            super().__init__('127.0.0.1', args.port, app, handler=QuietRequestHandler)
+            self.request_queue_size = 1024
+            self.executor = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.executor.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    PooledWSGIServer(args.wsgi_threads).serve_forever()
+
+
+def start_server(kind: str, port: int, args) -> subprocess.Popen:
+    command = [sys.executable, os.path.abspath(__file__), '--serve', kind, '--port', str(port),
+               '--wsgi-threads', str(args.wsgi_threads), '--added-latency-ms', str(args.added_latency_ms)]
+    server = subprocess.Popen(command, cwd=REPO_DIR)
+    wait_until_up(f'http://127.0.0.1:{port}/', server)
+    return server
+
+
+def wait_until_up(url: str, server: subprocess.Popen, timeout: float = 30.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'Server exited with status {server.returncode}')
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f'Server at {url} did not start')
+
+
+# ---------- load ----------
+async def run_load(base_url: str, emails: list, concurrency: int, duration: float, warmup: float,
+                   seed_value: int):
+    """Drive the server with `concurrency` signed-in users. Returns (samples, measured_seconds)."""
+    import httpx
+
+    today = date.today()
+    weights = [weight for weight, _, _ in REQUEST_MIX]
+    requests = [(method, path.format(year=today.year, month=today.month)) for _, method, path in REQUEST_MIX]
+    samples = []
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async def user(index):
+        rng = random.Random(seed_value + index)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as http:
+            await http.post('/signin', json={'email': emails[index % len(emails)], 'password': BENCH_PASSWORD})
+            while time.perf_counter() < stop_at:
+                method, path = rng.choices(requests, weights)[0]
+                body = {'title': 'Async bench', 'content': 'benchmark entry ' * 20} if method == 'POST' else None
+                started = time.perf_counter()
+                try:
+                    response = await http.request(method, path, json=body)
+                    ok = response.status_code < 400 and response.json().get('success', True) is not False
+                except httpx.HTTPError:
+                    ok = False
+                if started >= measure_from:
+                    samples.append((f'{method} {path.split("?")[0]}', (time.perf_counter() - started) * 1000, ok))
+
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return samples, duration
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    add_database_arguments(parser)
+    parser.add_argument('--pool-size', type=int, default=10, help='DB_POOL_MAX_SIZE for both servers')
+    parser.add_argument('--wsgi-threads', type=int, default=8, help='request threads for the WSGI server')
+    parser.add_argument('--added-latency-ms', type=float, default=0.0,
+                        help='delay added to every database round trip by a local proxy')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64, 256],
+                        help='concurrent virtual users; one run per value and server')
+    parser.add_argument('--users', type=int, default=50, help='synthetic users to seed')
+    parser.add_argument('--duration', type=float, default=10.0, help='measured seconds per run')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds run before measuring')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    parser.add_argument('--serve', choices=('wsgi', 'asgi'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.bcrypt_rounds = 4  # signing in is not what is being measured
+
+    if args.serve:
+        # The database settings come from the parent's environment
+        return serve(args)
+    configure_environment(args, smtp_port=25)
+
+    import psycopg2
+    import bcrypt
+
+    conn = psycopg2.connect(host=args.db_host, port=args.db_port, user=args.db_user, password=args.db_password,
+                            dbname=args.db_name, sslmode=args.db_sslmode)
+    try:
+        prepare_database(conn)
+        password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(4)).decode('utf-8')
+        emails = seed(conn, password_hash, args.users, 30, 40, random.Random(args.seed))
+    finally:
+        conn.close()
+
+    runs = {}
+    for index, kind in enumerate(('wsgi', 'asgi')):
+        port = 18700 + index
+        server = start_server(kind, port, args)
+        try:
+            for concurrency in args.concurrency:
+                print(f'{kind}: {concurrency} virtual users for {args.warmup:g}s + {args.duration:g}s', file=sys.stderr)
+                samples, elapsed = asyncio.run(run_load(f'http://127.0.0.1:{port}', emails, concurrency,
+                                                        args.duration, args.warmup, args.seed))
+                runs.setdefault(kind, {})[str(concurrency)] = summarize(samples, elapsed)['total']
+        finally:
+            server.terminate()
+            server.wait()
+
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'config': {key: value for key, value in vars(args).items()
+                       if key not in ('db_password', 'serve', 'port')},
+        },
+        'runs': runs,
+        'rps_speedup': {concurrency: round(runs['asgi'][concurrency]['rps'] / runs['wsgi'][concurrency]['rps'], 2)
+                        for concurrency in runs['wsgi'] if runs['wsgi'][concurrency]['rps']},
+    }
+
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    print(f'\n{"server":<8}{"users":>7}{"req":>8}{"err":>6}{"rps":>9}{"p50":>9}{"p99":>9}', file=sys.stderr)
+    for kind, by_concurrency in runs.items():
+        for concurrency, row in by_concurrency.items():
+            print(f'{kind:<8}{concurrency:>7}{row["requests"]:>8}{row["errors"]:>6}{row["rps"]:>9.1f}'
+                  f'{row["p50_ms"]:>9.1f}{row["p99_ms"]:>9.1f}', file=sys.stderr)
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# latency_proxy.py
+import os
+import socket
+import threading
+import time
+
+
+class LatencyProxy:
+    """TCP proxy that delays every client-to-server chunk by a fixed amount.
+
+    Request/response protocols like PostgreSQL's wait for each reply before sending
+    the next message, so this adds roughly `delay_ms` to every round trip - a local
+    stand-in for a remote connection pooler. The upstream may be host:port or, when
+    host is a directory, the PostgreSQL Unix socket inside it.
+    """
+
+    def __init__(self, upstream_host: str, upstream_port: int, delay_ms: float):
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.delay = delay_ms / 1000
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(64)
+
+    @property
+    def port(self) -> int:
+        return self._listener.getsockname()[1]
+
+    def start(self) -> 'LatencyProxy':
+        threading.Thread(target=self._accept_forever, name='latency-proxy', daemon=True).start()
+        return self
+
+    def _connect_upstream(self):
+        if self.upstream_host.startswith('/'):
+            upstream = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            upstream.connect(os.path.join(self.upstream_host, f'.s.PGSQL.{self.upstream_port}'))
+        else:
+            upstream = socket.create_connection((self.upstream_host, self.upstream_port))
+            upstream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return upstream
+
+    def _accept_forever(self) -> None:
+        while True:
+            client, _ = self._listener.accept()
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            upstream = self._connect_upstream()
+            threading.Thread(target=self._pump, args=(client, upstream, self.delay), daemon=True).start()
+            threading.Thread(target=self._pump, args=(upstream, client, 0), daemon=True).start()
+
+    @staticmethod
+    def _pump(source, destination, delay: float) -> None:
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                if delay:
+                    time.sleep(delay)
+                destination.sendall(data)
+        except OSError:
+            pass
+        finally:
+            for sock in (source, destination):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
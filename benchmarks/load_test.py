@@ -0,0 +1,383 @@
+"""Offline load test for the journal API.
+
+Boots app.py on a local port against a local PostgreSQL database and a fake SMTP
+sink, seeds synthetic users with entries, intentions and calendar events, then
+drives a weighted mix of realistic scenarios from concurrent virtual users.
+Per-endpoint p50/p95/p99 latency and requests/sec are written as JSON so runs can
+be diffed between commits.
+
+Use a dedicated database: the seeding step deletes every user whose username
+starts with "bench_" (and, through ON DELETE CASCADE, their data).
+
+    createdb journal_bench
+    python benchmarks/load_test.py --db-name journal_bench --users 200 --concurrency 16 \\
+        --duration 30 --output results.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.smtp_sink import SMTPSink  # noqa: E402
+
+BENCH_PASSWORD = 'bench-password-123'
+
+# Relative frequency of each scenario in the mix
+SCENARIO_WEIGHTS = {
+    'login': 1,
+    'journal_page': 5,
+    'create_entry': 2,
+    'list_entries': 3,
+    'calendar_month': 2,
+    'signup': 0,
+}
+
+WORDS = ('morning walk coffee meeting project deadline friend dinner gratitude rain sunshine '
+         'reading music workout family travel idea worry progress sleep garden').split()
+
+
+# ---------- statistics ----------
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(len(sorted_values) * pct / 100))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed: float) -> dict:
+    """Group (endpoint, latency_ms, ok) samples into per-endpoint latency and throughput stats."""
+    by_endpoint = {}
+    for endpoint, latency_ms, ok in samples:
+        by_endpoint.setdefault(endpoint, []).append((latency_ms, ok))
+
+    def stats(rows):
+        latencies = sorted(latency for latency, _ in rows)
+        return {
+            'requests': len(rows),
+            'errors': sum(1 for _, ok in rows if not ok),
+            'rps': round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+        }
+
+    return {
+        'endpoints': {endpoint: stats(rows) for endpoint, rows in sorted(by_endpoint.items())},
+        'total': stats([(latency, ok) for _, latency, ok in samples]),
+    }
+
+
+# ---------- environment, schema and seed data ----------
+def configure_environment(args, smtp_port: int) -> None:
+    """Point app.py's database, mail and bcrypt settings at the local stand-ins.
+
+    Must run before app is imported; values already in the environment win over db.env.
+    """
+    os.environ.update({
+        'DB_HOST': args.db_host,
+        'DB_PORT': str(args.db_port),
+        'DB_USER': args.db_user,
+        'DB_PASS': args.db_password,
+        'DB_NAME': args.db_name,
+        'DB_SSLMODE': args.db_sslmode,
+        'DB_POOL_MAX_SIZE': str(args.pool_size),
+        'SMTP_SERVER': '127.0.0.1',
+        'SMTP_PORT': str(smtp_port),
+        'SMTP_USE_TLS': 'false',
+        'EMAIL_ADDRESS': 'bench@localhost',
+        'EMAIL_PASSWORD': 'bench',
+        'BCRYPT_ROUNDS': str(args.bcrypt_rounds),
+        # Every virtual user signs in from 127.0.0.1
+        'RATE_LIMIT_ENABLED': 'false',
+    })
+
+
+def prepare_database(conn) -> None:
+    """Bring the bench database up to the current schema."""
+    from migrate import migrate
+
+    migrate(conn, log=lambda message: print(message, file=sys.stderr))
+
+
+def seed(conn, password_hash: str, users: int, entries_per_user: int, events_per_user: int,
+         rng: random.Random) -> list:
+    """Replace the bench_ users and their data. Returns the seeded users' emails."""
+    from psycopg2.extras import execute_values
+
+    today = date.today()
+    conn.autocommit = False
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM users WHERE username LIKE 'bench\\_%'")
+        cur.execute("SELECT id FROM moods ORDER BY id")
+        mood_ids = [row[0] for row in cur.fetchall()] or [None]
+
+        user_rows = [(f'bench_{i}@example.com', f'bench_{i}', password_hash, True) for i in range(users)]
+        user_ids = [row[0] for row in execute_values(cur, """
+            INSERT INTO users (email, username, password_hash, is_verified) VALUES %s RETURNING id
+            """, user_rows, fetch=True)]
+
+        # One daily journal per day that has entries, going back from today
+        journal_rows = []
+        for user_id in user_ids:
+            days = max(1, entries_per_user // 2)
+            for day in range(days):
+                journal_rows.append((user_id, today - timedelta(days=day), rng.choice(mood_ids)))
+        journals = execute_values(cur, """
+            INSERT INTO daily_journals (user_id, entry_date, mood_id) VALUES %s RETURNING id, user_id
+            """, journal_rows, fetch=True, page_size=1000)
+
+        journals_by_user = {}
+        for journal_id, user_id in journals:
+            journals_by_user.setdefault(user_id, []).append(journal_id)
+        entry_rows = []
+        for user_id in user_ids:
+            for _ in range(entries_per_user):
+                words = rng.choices(WORDS, k=rng.randint(40, 200))
+                entry_rows.append((rng.choice(journals_by_user[user_id]), ' '.join(words[:5]).capitalize(),
+                                   ' '.join(words)))
+        execute_values(cur, """
+            INSERT INTO journal_entries (daily_journal_id, entry_title, entry_content) VALUES %s
+            """, entry_rows, page_size=1000)
+
+        event_rows = []
+        intention_rows = []
+        for user_id in user_ids:
+            for _ in range(events_per_user):
+                event_date = today + timedelta(days=rng.randint(-180, 180))
+                event_time = f'{rng.randint(7, 21):02d}:{rng.choice((0, 15, 30, 45)):02d}'
+                event_rows.append((user_id, ' '.join(rng.choices(WORDS, k=3)).capitalize(), '', event_date, event_time))
+            for _ in range(3):
+                intention_rows.append((user_id, ' '.join(rng.choices(WORDS, k=4)).capitalize(), today))
+        execute_values(cur, """
+            INSERT INTO calendar_events (user_id, event_title, event_description, event_date, event_time) VALUES %s
+            """, event_rows, page_size=1000)
+        execute_values(cur, """
+            INSERT INTO intentions (user_id, intention_text, for_date) VALUES %s
+            """, intention_rows, page_size=1000)
+    conn.commit()
+    return [email for email, _, _, _ in user_rows]
+
+
+# ---------- virtual users ----------
+class VirtualUser:
+    "One browser session working through randomly chosen scenarios."
+
+    def __init__(self, base_url: str, email: str, rng: random.Random, record):
+        import requests
+
+        self.base_url = base_url
+        self.email = email
+        self.rng = rng
+        self.record = record
+        self.http = requests.Session()
+
+    def request(self, method: str, path: str, endpoint: str = None, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, allow_redirects=False, **kwargs)
+        except Exception:
+            self.record(endpoint or f'{method} {path}', (time.perf_counter() - start) * 1000, False)
+            return None
+        latency_ms = (time.perf_counter() - start) * 1000
+        ok = response.status_code < 400
+        if ok and response.headers.get('Content-Type', '').startswith('application/json'):
+            ok = response.json().get('success', True) is not False
+        self.record(endpoint or f'{method} {path}', latency_ms, ok)
+        return response
+
+    def run(self, scenario: str) -> None:
+        getattr(self, f'scenario_{scenario}')()
+
+    def scenario_login(self) -> None:
+        self.request('POST', '/signin', json={'email': self.email, 'password': BENCH_PASSWORD})
+
+    def scenario_journal_page(self) -> None:
+        self.request('GET', '/journal')
+        self.request('GET', '/api/journal/today')
+
+    def scenario_create_entry(self) -> None:
+        words = self.rng.choices(WORDS, k=self.rng.randint(40, 200))
+        self.request('POST', '/api/entries', json={'title': ' '.join(words[:5]).capitalize(),
+                                                   'content': ' '.join(words)})
+
+    def scenario_list_entries(self) -> None:
+        self.request('GET', '/new-entry')
+        self.request('GET', '/api/entries')
+
+    def scenario_calendar_month(self) -> None:
+        month = date.today() + timedelta(days=self.rng.randint(-90, 90))
+        self.request('GET', '/calendar')
+        self.request('GET', f'/api/calendar-events?year={month.year}&month={month.month}&around=2',
+                     endpoint='GET /api/calendar-events')
+
+    def scenario_signup(self) -> None:
+        name = f'bench_new_{os.getpid()}_{self.rng.getrandbits(48):x}'
+        self.request('POST', '/signup', json={'email': f'{name}@example.com', 'username': name,
+                                              'password': BENCH_PASSWORD})
+
+
+def run_load(base_url: str, emails: list, concurrency: int, duration: float, warmup: float,
+             weights: dict, seed_value: int):
+    """Drive the server with `concurrency` virtual users. Returns (samples, measured_seconds)."""
+    samples = []
+    samples_lock = threading.Lock()
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+    scenarios = [name for name, weight in weights.items() if weight > 0]
+    scenario_weights = [weights[name] for name in scenarios]
+
+    def record(endpoint, latency_ms, ok):
+        if time.perf_counter() >= measure_from:
+            with samples_lock:
+                samples.append((endpoint, latency_ms, ok))
+
+    def worker(index):
+        rng = random.Random(seed_value + index)
+        user = VirtualUser(base_url, emails[index % len(emails)], rng, record)
+        user.scenario_login()
+        while time.perf_counter() < stop_at:
+            user.run(rng.choices(scenarios, scenario_weights)[0])
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, i) for i in range(concurrency)]:
+            future.result()
+    return samples, duration
+
+
+def add_database_arguments(parser) -> None:
+    parser.add_argument('--db-host', default=os.getenv('BENCH_DB_HOST', 'localhost'),
+                        help='host name, or a directory containing the server socket')
+    parser.add_argument('--db-port', type=int, default=int(os.getenv('BENCH_DB_PORT', 5432)))
+    parser.add_argument('--db-user', default=os.getenv('BENCH_DB_USER', 'postgres'))
+    parser.add_argument('--db-password', default=os.getenv('BENCH_DB_PASS', ''))
+    parser.add_argument('--db-name', default=os.getenv('BENCH_DB_NAME', 'journal_bench'))
+    parser.add_argument('--db-sslmode', default=os.getenv('BENCH_DB_SSLMODE', 'disable'))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def parse_weights(values) -> dict:
+    weights = dict(SCENARIO_WEIGHTS)
+    for value in values or ():
+        name, _, weight = value.partition('=')
+        if name not in weights:
+            raise SystemExit(f'Unknown scenario {name!r}; choose from {", ".join(weights)}')
+        weights[name] = int(weight)
+    return weights
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    add_database_arguments(parser)
+    parser.add_argument('--pool-size', type=int, default=10, help='DB_POOL_MAX_SIZE for the app')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--users', type=int, default=100, help='synthetic users to seed')
+    parser.add_argument('--entries-per-user', type=int, default=30)
+    parser.add_argument('--events-per-user', type=int, default=40)
+    parser.add_argument('--skip-seed', action='store_true', help='reuse bench_ users from a previous run')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3.0, help='seconds run before measuring')
+    parser.add_argument('--scenario', action='append', metavar='NAME=WEIGHT',
+                        help='override a scenario weight, e.g. --scenario signup=1')
+    parser.add_argument('--seed', type=int, default=1234, help='random seed for data and scenario choice')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+    weights = parse_weights(args.scenario)
+
+    sink = SMTPSink().start()
+    configure_environment(args, sink.port)
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    import app as journal_app
+    from db_pool import create_connection, pool_stats
+
+    conn = create_connection()
+    try:
+        prepare_database(conn)
+        if args.skip_seed:
+            with conn.cursor() as cur:
+                cur.execute("SELECT email FROM users WHERE username LIKE 'bench\\_%' AND is_verified ORDER BY id")
+                emails = [row[0] for row in cur.fetchall()]
+            conn.commit()
+        else:
+            started = time.perf_counter()
+            password_hash = journal_app.password_manager.hash_password(BENCH_PASSWORD)
+            emails = seed(conn, password_hash, args.users, args.entries_per_user, args.events_per_user,
+                          random.Random(args.seed))
+            print(f'Seeded {len(emails)} users in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+    finally:
+        conn.close()
+    if not emails:
+        raise SystemExit('No bench_ users found; run without --skip-seed first')
+
+    server = make_server('127.0.0.1', 0, journal_app.app, threaded=True,
+                         request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, name='bench-server', daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    print(f'Running {args.concurrency} virtual users for {args.warmup:g}s warmup + {args.duration:g}s '
+          f'against {base_url}', file=sys.stderr)
+
+    try:
+        samples, elapsed = run_load(base_url, emails, args.concurrency, args.duration, args.warmup,
+                                    weights, args.seed)
+        journal_app.get_outbox().flush(timeout=10)
+    finally:
+        server.shutdown()
+
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'config': {key: value for key, value in vars(args).items() if not key.startswith('db_password')},
+            'scenario_weights': weights,
+        },
+        **summarize(samples, elapsed),
+        'db_pool': {key: value for key, value in pool_stats().items() if not isinstance(value, dict)},
+        'mail_received': sink.received,
+    }
+    sink.shutdown()
+
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    print(f'\n{"endpoint":<32}{"req":>7}{"err":>6}{"rps":>9}{"p50":>9}{"p95":>9}{"p99":>9}', file=sys.stderr)
+    for endpoint, row in list(result['endpoints'].items()) + [('TOTAL', result['total'])]:
+        print(f'{endpoint:<32}{row["requests"]:>7}{row["errors"]:>6}{row["rps"]:>9.1f}'
+              f'{row["p50_ms"]:>9.1f}{row["p95_ms"]:>9.1f}{row["p99_ms"]:>9.1f}', file=sys.stderr)
+    return result
+
+
+if __name__ == '__main__':
+    main()
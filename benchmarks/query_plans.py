@@ -0,0 +1,434 @@
+"""Catch query plan regressions by EXPLAINing every statement the app.py routes run.
+
+Seeds a local PostgreSQL database with a large synthetic dataset, then calls every
+data route once, in-process, as a signed-in user. Just before each statement runs,
+the same statement with the same parameters is run under EXPLAIN (ANALYZE, BUFFERS)
+on the same connection and rolled back, so it is planned exactly as the route runs
+it. A statement fails when its plan
+  - sequentially scans a table of at least --large-table-rows rows, or
+  - costs more, or touches more buffers, than its entry in query_plan_budgets.json
+    allows with --tolerance headroom.
+The JSON report lists every statement's plan summary so runs can be diffed between
+commits; the exit status is 1 if anything failed.
+
+    python benchmarks/query_plans.py --db-name journal_bench --output plans.json
+    python benchmarks/query_plans.py --db-name journal_bench --update-budgets
+
+Use a dedicated database: seeding replaces the "bench_" users, as for load_test.py.
+query_plan_budgets.json is the output of the second command run against a freshly
+created database, seeded by this script with its default --users, --entries-per-user,
+--events-per-user and --seed. Regenerate it the same way when a change is meant to
+alter a plan; costs from a differently sized dataset are not comparable.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+from datetime import date, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from benchmarks.load_test import (BENCH_PASSWORD, WORDS, add_database_arguments, configure_environment,  # noqa: E402
+                                  git_commit, prepare_database, seed)
+
+BUDGETS_PATH = os.path.join(BENCH_DIR, 'query_plan_budgets.json')
+# Added to every budget so tiny plans don't fail on noise
+BUDGET_FLOOR = 10
+
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+
+# (method, path, request kwargs), run in order. Placeholders are filled in just before
+# each request, from the signed-in user's rows; deletes come last so the other routes
+# still find the rows they work on.
+SCENARIOS = (
+    ('POST', '/signup', {'json': {'email': '{new_email}', 'username': '{new_username}', 'password': BENCH_PASSWORD}}),
+    ('POST', '/resend_otp', {'json': {'email': '{new_email}'}}),
+    ('POST', '/verify_otp', {'json': {'email': '{new_email}', 'otp': '{otp}'}}),
+    ('POST', '/signin', {'json': {'email': '{email}', 'password': BENCH_PASSWORD}}),
+    ('GET', '/health', {}),
+    ('POST', '/api/entries', {'json': {'title': 'Plan check', 'content': 'query plan check entry'}}),
+    ('GET', '/api/entries', {}),
+    ('GET', '/api/entries?cursor={entries_cursor}', {}),
+    ('GET', '/api/entries?stream=1', {}),
+    ('GET', '/api/entries/search?q={search_word}', {}),
+    ('PUT', '/api/entries/{entry_id}', {'json': {'title': 'Plan check', 'content': 'edited'}}),
+    ('GET', '/api/entries/{entry_id}', {}),
+    ('GET', '/api/entries/{entry_id}/revisions', {}),
+    ('GET', '/api/entries/{entry_id}/revisions/2', {}),
+    ('POST', '/api/entries/import?format=ndjson', {'json': {'title': 'Imported', 'content': 'plan', 'date': '{today}'}}),
+    ('POST', '/api/intentions', {'json': {'intention_text': 'Plan check'}}),
+    ('GET', '/api/intentions', {}),
+    ('PUT', '/api/intentions/{intention_id}/toggle', {}),
+    ('POST', '/api/calendar-events', {'json': {'event_title': 'Plan check', 'event_date': '{today}',
+                                               'event_time': '09:00'}}),
+    ('GET', '/api/calendar-events?year={year}&month={month}&around=1', {}),
+    ('GET', '/api/calendar-events', {}),
+    ('PUT', '/api/calendar-events/{calendar_event_id}', {'json': {'event_title': 'Plan check', 'event_date': '{today}',
+                                                                  'event_time': '10:00'}}),
+    ('GET', '/api/moods', {}),
+    ('POST', '/api/moods/today', {'json': {'mood_id': '{mood_id}'}}),
+    ('GET', '/api/moods/today', {}),
+    ('GET', '/api/moods/trends', {}),
+    ('GET', '/api/moods/trends?period=month', {}),
+    ('POST', '/api/events', {'json': {'title': 'Plan check', 'event_date': '{today}', 'event_time': '09:00'}}),
+    ('GET', '/api/events/today', {}),
+    ('PUT', '/api/events/{event_id}', {'json': {'title': 'Plan check', 'event_date': '{today}', 'event_time': '11:00'}}),
+    ('GET', '/api/journal/today', {}),
+    ('GET', '/api/sync', {}),
+    ('DELETE', '/api/entries/{entry_id}', {}),
+    ('DELETE', '/api/intentions/{intention_id}', {}),
+    ('DELETE', '/api/calendar-events/{calendar_event_id}', {}),
+    ('DELETE', '/api/events/{event_id}', {}),
+)
+
+
+# ---------- plans ----------
+def fingerprint(sql: str) -> str:
+    return hashlib.sha1(' '.join(sql.split()).encode('utf-8')).hexdigest()[:10]
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def summarize_plan(explain: list, table_rows: dict, large_table_rows: int) -> dict:
+    """Cost, buffers, timing and scans from EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) output."""
+    root = explain[0]['Plan']
+    nodes = list(plan_nodes(root))
+    seq_scans = sorted({node['Relation Name'] for node in nodes if node['Node Type'] == 'Seq Scan'})
+    return {
+        'cost': root['Total Cost'],
+        'buffers': root.get('Shared Hit Blocks', 0) + root.get('Shared Read Blocks', 0),
+        'rows': root.get('Actual Rows'),
+        'execution_ms': explain[0].get('Execution Time'),
+        'tables': sorted({node['Relation Name'] for node in nodes if 'Relation Name' in node}),
+        'seq_scans': seq_scans,
+        'large_seq_scans': [table for table in seq_scans if table_rows.get(table, 0) >= large_table_rows],
+    }
+
+
+def over_budget(value: float, budget: float, tolerance: float) -> bool:
+    return value > budget * (1 + tolerance) + BUDGET_FLOOR
+
+
+def check_plan(summary: dict, budget, tolerance: float) -> list:
+    """Reasons the plan fails; empty if it passes."""
+    problems = [f'seq scan on {table}' for table in summary['large_seq_scans']
+                if table not in (budget or {}).get('allow_seq_scan', ())]
+    if budget:
+        for measure in ('cost', 'buffers'):
+            if over_budget(summary[measure], budget[measure], tolerance):
+                problems.append(f'{measure} {summary[measure]:g} over budget {budget[measure]:g}')
+    return problems
+
+
+class PlanRecorder:
+    "EXPLAINs each distinct statement the app runs during a scenario."
+
+    def __init__(self):
+        self.scenario = None
+        self.plans = {}  # key -> {'scenario', 'sql', 'explain'} or {..., 'error'}
+
+    def explain(self, cursor, sql, params) -> None:
+        if self.scenario is None or not isinstance(sql, str) or not _EXPLAINABLE.match(sql):
+            return
+        key = f'{self.scenario} #{fingerprint(sql)}'
+        if key in self.plans:
+            return
+        import psycopg2
+        from psycopg2 import extensions
+
+        conn = cursor.connection
+        in_transaction = not conn.autocommit
+        # A plain cursor, so the EXPLAIN itself is neither timed nor recorded
+        raw = extensions.connection.cursor(conn)
+        entry = {'scenario': self.scenario, 'sql': ' '.join(sql.split())}
+        try:
+            raw.execute('SAVEPOINT query_plan' if in_transaction else 'BEGIN')
+            try:
+                raw.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+                entry['explain'] = raw.fetchone()[0]
+            except psycopg2.Error as e:
+                entry['error'] = str(e).strip()
+            # Undo whatever EXPLAIN ANALYZE wrote; the route then runs the statement for real
+            if in_transaction:
+                raw.execute('ROLLBACK TO SAVEPOINT query_plan')
+                raw.execute('RELEASE SAVEPOINT query_plan')
+            else:
+                raw.execute('ROLLBACK')
+        finally:
+            raw.close()
+        self.plans[key] = entry
+
+
+def recording_connection_class(recorder: PlanRecorder):
+    """A db_pool.TimedConnection whose cursors hand each statement to recorder first."""
+    from psycopg2 import extensions
+
+    from db_pool import TimedConnection
+
+    classes = {}
+
+    def recording_cursor_class(base):
+        if base not in classes:
+            def execute(self, query, vars=None):
+                recorder.explain(self, query, vars)
+                return base.execute(self, query, vars)
+
+            def executemany(self, query, vars_list):
+                vars_list = list(vars_list)
+                if vars_list:
+                    recorder.explain(self, query, vars_list[0])
+                return base.executemany(self, query, vars_list)
+
+            classes[base] = type(f'Recording{base.__name__}', (base,),
+                                 {'execute': execute, 'executemany': executemany})
+        return classes[base]
+
+    class RecordingConnection(TimedConnection):
+        def cursor(self, *args, **kwargs):
+            kwargs['cursor_factory'] = recording_cursor_class(
+                kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor)
+            return super().cursor(*args, **kwargs)
+
+    return RecordingConnection
+
+
+# ---------- scenarios ----------
+class LazyContext(dict):
+    "Placeholder values for str.format_map; callables are evaluated when first used."
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        return value() if callable(value) else value
+
+
+def fill(value, context):
+    if isinstance(value, str):
+        return value.format_map(context)
+    if isinstance(value, dict):
+        return {key: fill(item, context) for key, item in value.items()}
+    return value
+
+
+def seed_events(conn, user_ids: list, per_user: int, rng: random.Random) -> None:
+    """Daily-planner events, which load_test.seed() leaves out."""
+    from psycopg2.extras import execute_values
+
+    today = date.today()
+    rows = [(user_id, ' '.join(rng.choices(WORDS, k=3)).capitalize(), today + timedelta(days=rng.randint(-30, 30)),
+             f'{rng.randint(7, 21):02d}:00') for user_id in user_ids for _ in range(per_user)]
+    with conn.cursor() as cur:
+        execute_values(cur, "INSERT INTO events (user_id, title, event_date, event_time) VALUES %s", rows,
+                       page_size=1000)
+
+
+def run_scenarios(app, recorder: PlanRecorder, context: LazyContext) -> list:
+    """Call each of SCENARIOS with one test client. Returns [(scenario, status, ok)]."""
+    client = app.test_client()
+    results = []
+    for method, path, kwargs in SCENARIOS:
+        recorder.scenario = f'{method} {path}'
+        try:
+            response = client.open(fill(path, context), method=method, **fill(kwargs, context))
+            body = response.get_data()
+            ok = response.status_code < 400
+            if ok and response.is_json:
+                ok = json.loads(body).get('success', True) is not False
+            results.append((recorder.scenario, response.status_code, ok))
+        finally:
+            recorder.scenario = None
+    return results
+
+
+def routes_not_exercised(app) -> list:
+    adapter = app.url_map.bind('localhost')
+    hit = {adapter.match(path.split('?')[0].format_map({'entry_id': 1, 'intention_id': 1, 'calendar_event_id': 1,
+                                                       'event_id': 1}), method=method)[0]
+           for method, path, _ in SCENARIOS}
+    return sorted(f'{method} {rule.rule}' for rule in app.url_map.iter_rules()
+                  if rule.endpoint != 'static' and rule.endpoint not in hit
+                  for method in rule.methods - {'HEAD', 'OPTIONS'})
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    add_database_arguments(parser)
+    parser.add_argument('--users', type=int, default=1000, help='synthetic users to seed')
+    parser.add_argument('--entries-per-user', type=int, default=40)
+    parser.add_argument('--events-per-user', type=int, default=40)
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the bench_ users already in the database')
+    parser.add_argument('--large-table-rows', type=int, default=10000,
+                        help='tables with at least this many rows must not be scanned sequentially')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='fraction a statement may exceed its cost or buffer budget by')
+    parser.add_argument('--budgets', default=BUDGETS_PATH, help='budget file to check against')
+    parser.add_argument('--update-budgets', action='store_true', help='write this run\'s plans as the new budgets')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+    args.pool_size = 2
+    args.bcrypt_rounds = 4  # signing in is not what is being measured
+
+    from benchmarks.smtp_sink import SMTPSink
+
+    sink = SMTPSink().start()
+    configure_environment(args, sink.port)
+    # EXPLAIN needs the SQL text, not EXECUTE of a prepared statement
+    os.environ['DB_PREPARED_STATEMENTS'] = 'off'
+
+    import bcrypt
+    import psycopg2
+
+    import db_pool
+
+    recorder = PlanRecorder()
+    connection_class = recording_connection_class(recorder)
+    # Replica pools pass their own params (db_pool.get_replicas), so forward them
+    db_pool.create_connection = lambda params=None: psycopg2.connect(
+        connection_factory=connection_class, **(params or db_pool.connection_params()))
+
+    conn = psycopg2.connect(**db_pool.connection_params())
+    try:
+        prepare_database(conn)
+        if args.skip_seed:
+            with conn.cursor() as cur:
+                cur.execute("SELECT email FROM users WHERE username LIKE 'bench\\_%' AND is_verified ORDER BY id")
+                emails = [row[0] for row in cur.fetchall()]
+        else:
+            started = time.perf_counter()
+            password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(4)).decode('utf-8')
+            rng = random.Random(args.seed)
+            emails = seed(conn, password_hash, args.users, args.entries_per_user, args.events_per_user, rng)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT id FROM users WHERE username LIKE 'bench\\_%'")
+                seed_events(conn, [row[0] for row in cur.fetchall()], args.events_per_user // 2, rng)
+            print(f'Seeded {len(emails)} users in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+        if not emails:
+            raise SystemExit('No bench_ users found; run without --skip-seed first')
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+            cur.execute("""
+                        SELECT relname, reltuples::bigint
+                        FROM pg_class
+                        WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace
+                        """)
+            table_rows = dict(cur.fetchall())
+
+        import app as journal_app
+        from otp_store import get_otp_store
+
+        def scalar(sql, *params):
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                return cur.fetchone()[0]
+
+        user_id = scalar("SELECT id FROM users WHERE email = %s", emails[0])
+        today = date.today()
+        suffix = f'{os.getpid()}_{int(time.time())}'
+        context = LazyContext(
+            email=emails[0],
+            new_email=f'bench_plans_{suffix}@example.com',
+            new_username=f'bench_plans_{suffix}',
+            otp=lambda: get_otp_store().peek(f"email:{context['new_email']}")[0],
+            today=today.isoformat(), year=today.year, month=today.month,
+            search_word=WORDS[0],
+            mood_id=lambda: scalar("SELECT MIN(id) FROM moods"),
+            entries_cursor=lambda: journal_app.encode_cursor(*scalar("""
+                SELECT ARRAY[je.created_at::text, je.id::text]
+                FROM journal_entries je JOIN daily_journals dj ON je.daily_journal_id = dj.id
+                WHERE dj.user_id = %s ORDER BY je.created_at DESC, je.id DESC OFFSET 9 LIMIT 1
+                """, user_id)),
+            entry_id=lambda: scalar("""
+                SELECT MAX(je.id) FROM journal_entries je JOIN daily_journals dj ON je.daily_journal_id = dj.id
+                WHERE dj.user_id = %s
+                """, user_id),
+            intention_id=lambda: scalar("SELECT MAX(id) FROM intentions WHERE user_id = %s", user_id),
+            calendar_event_id=lambda: scalar("SELECT MAX(id) FROM calendar_events WHERE user_id = %s", user_id),
+            event_id=lambda: scalar("SELECT MAX(id) FROM events WHERE user_id = %s", user_id),
+        )
+        scenarios = run_scenarios(journal_app.app, recorder, context)
+        journal_app.get_outbox().flush(timeout=10)
+    finally:
+        conn.close()
+        sink.shutdown()
+
+    budgets = {}
+    if os.path.exists(args.budgets):
+        with open(args.budgets, encoding='utf-8') as f:
+            budgets = json.load(f)
+
+    statements = []
+    for key, entry in sorted(recorder.plans.items()):
+        statement = {'key': key, 'scenario': entry['scenario'], 'sql': entry['sql']}
+        if 'error' in entry:
+            statement.update(status='error', problems=[entry['error']])
+        else:
+            summary = summarize_plan(entry['explain'], table_rows, args.large_table_rows)
+            if not summary['tables']:
+                continue  # SELECT 1 and the like
+            problems = check_plan(summary, budgets.get(key), args.tolerance)
+            status = 'fail' if problems else ('ok' if key in budgets else 'new')
+            statement.update(summary, status=status, problems=problems)
+        statements.append(statement)
+
+    failed_scenarios = [name for name, _, ok in scenarios if not ok]
+    failures = len(failed_scenarios) + sum(statement['status'] in ('fail', 'error') for statement in statements)
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'config': {key: value for key, value in vars(args).items() if key != 'db_password'},
+        },
+        'table_rows': table_rows,
+        'statements': statements,
+        'scenarios': [{'scenario': name, 'status': status, 'ok': ok} for name, status, ok in scenarios],
+        'routes_not_exercised': routes_not_exercised(journal_app.app),
+        'budgets_not_seen': sorted(set(budgets) - {statement['key'] for statement in statements}),
+        'failures': failures,
+    }
+
+    if args.update_budgets:
+        new_budgets = {
+            statement['key']: {
+                'cost': statement['cost'],
+                'buffers': statement['buffers'],
+                'sql': statement['sql'],
+                **({'allow_seq_scan': budgets[statement['key']]['allow_seq_scan']}
+                   if 'allow_seq_scan' in budgets.get(statement['key'], {}) else {}),
+            }
+            for statement in statements if 'cost' in statement
+        }
+        with open(args.budgets, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(new_budgets, indent=2, sort_keys=True) + '\n')
+        print(f'Wrote {len(new_budgets)} budgets to {args.budgets}', file=sys.stderr)
+
+    text = json.dumps(result, indent=2, sort_keys=True, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    print(f'\n{"status":<8}{"cost":>10}{"buffers":>9}{"ms":>8}  statement', file=sys.stderr)
+    for statement in statements:
+        print(f'{statement["status"]:<8}{statement.get("cost", 0):>10.1f}{statement.get("buffers", 0):>9}'
+              f'{statement.get("execution_ms") or 0:>8.2f}  {statement["key"]}', file=sys.stderr)
+        for problem in statement['problems']:
+            print(f'{"":<8}-> {problem}', file=sys.stderr)
+    for name in failed_scenarios:
+        print(f'Scenario failed: {name}', file=sys.stderr)
+    print(f'{failures} failure(s)', file=sys.stderr)
+    return result
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main()['failures'] else 0)
@@ -0,0 +1,58 @@
+# smtp_sink.py
+import socketserver
+import threading
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib: accepts any login and discards every message."""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self) -> None:
+        self.reply('220 localhost benchmark sink ready')
+        in_data = False
+        for raw in self.rfile:
+            line = raw.rstrip(b'\r\n')
+            if in_data:
+                if line == b'.':
+                    in_data = False
+                    with self.server.lock:
+                        self.server.received += 1
+                    self.reply('250 OK')
+                continue
+
+            command = line.split(b' ', 1)[0].upper()
+            if command == b'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif command == b'AUTH':
+                self.reply('235 Authentication successful')
+            elif command == b'DATA':
+                in_data = True
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:  # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    "Local SMTP server that counts and drops mail, so benchmarks never reach a real mailbox."
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _SinkHandler)
+        self.received = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> 'SMTPSink':
+        threading.Thread(target=self.serve_forever, name='smtp-sink', daemon=True).start()
+        return self
@@ -0,0 +1,223 @@
+"""Benchmark the daily_journals write paths: SELECT-then-write vs single-statement upserts.
+
+Runs create_entry's and set_today_mood's database work both ways against a local
+PostgreSQL database: the previous multi-statement transactions, reproduced here,
+and the INSERT ... ON CONFLICT statements app.py now uses (create_entry's with
+autocommit; set_mood's locks the day's row, then updates it and the rollups).
+Half of the writes are the first of their day. --added-latency-ms routes the
+connection through a local proxy that delays each round trip, to approximate a
+remote connection pooler, where round trips dominate.
+
+    python benchmarks/write_paths.py --db-name journal_bench --iterations 500 --added-latency-ms 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import psycopg2  # noqa: E402
+from psycopg2 import extensions  # noqa: E402
+
+from app import CREATE_ENTRY_SQL  # noqa: E402
+from benchmarks.latency_proxy import LatencyProxy  # noqa: E402
+from benchmarks.load_test import add_database_arguments, git_commit, prepare_database, summarize  # noqa: E402
+from mood_trends import PERIODS, period_start, set_mood  # noqa: E402
+from resource_versions import ENTRIES, bump_version  # noqa: E402
+
+BENCH_USERNAME = 'bench_writes'
+
+
+class CountingCursor(extensions.cursor):
+    def execute(self, query, vars=None):
+        conn = self.connection
+        if not conn.autocommit and conn.status == extensions.STATUS_READY:
+            conn.round_trips += 1  # psycopg2 sends BEGIN first
+        conn.round_trips += 1
+        return super().execute(query, vars)
+
+
+class CountingConnection(extensions.connection):
+    """Counts round trips: statements, plus BEGIN and COMMIT outside autocommit."""
+
+    round_trips = 0
+
+    def cursor(self, *args, **kwargs):
+        kwargs.setdefault('cursor_factory', CountingCursor)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        if self.status != extensions.STATUS_READY:
+            self.round_trips += 1
+        return super().commit()
+
+
+# ---------- the previous code paths ----------
+def legacy_create_entry(conn, user_id, day, title, content):
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM daily_journals WHERE user_id = %s AND entry_date = %s", (user_id, day))
+        row = cur.fetchone()
+        if row:
+            daily_journal_id = row[0]
+        else:
+            cur.execute("INSERT INTO daily_journals (user_id, entry_date) VALUES (%s, %s) RETURNING id",
+                        (user_id, day))
+            daily_journal_id = cur.fetchone()[0]
+        cur.execute("""
+                    INSERT INTO journal_entries (daily_journal_id, entry_title, entry_content)
+                    VALUES (%s, %s, %s) RETURNING id, entry_title, entry_content, created_at
+                    """, (daily_journal_id, title, content))
+        cur.fetchone()
+        bump_version(cur, user_id, ENTRIES)
+    conn.commit()
+
+
+def legacy_set_mood(conn, user_id, day, mood_id):
+    with conn.cursor() as cur:
+        cur.execute("""
+                    SELECT id, mood_id FROM daily_journals
+                    WHERE user_id = %s AND entry_date = %s FOR UPDATE
+                    """, (user_id, day))
+        row = cur.fetchone()
+        if row:
+            cur.execute("UPDATE daily_journals SET mood_id = %s WHERE id = %s RETURNING id", (mood_id, row[0]))
+        else:
+            cur.execute("INSERT INTO daily_journals (user_id, entry_date, mood_id) VALUES (%s, %s, %s) RETURNING id",
+                        (user_id, day, mood_id))
+        cur.fetchone()
+        previous = row[1] if row else None
+        if previous != mood_id:
+            for period in PERIODS:
+                start = period_start(day, period)
+                if previous is not None:
+                    cur.execute("""
+                                UPDATE mood_rollups SET days = days - 1
+                                WHERE user_id = %s AND period = %s AND period_start = %s AND mood_id = %s
+                                """, (user_id, period, start, previous))
+                cur.execute("""
+                            INSERT INTO mood_rollups (user_id, period, period_start, mood_id, days)
+                            VALUES (%s, %s, %s, %s, 1)
+                            ON CONFLICT (user_id, period, period_start, mood_id)
+                                DO UPDATE SET days = mood_rollups.days + 1
+                            """, (user_id, period, start, mood_id))
+            if previous is None:
+                cur.execute("UPDATE mood_streaks SET end_date = %s WHERE user_id = %s AND end_date = %s",
+                            (day, user_id, day - timedelta(days=1)))
+                if cur.rowcount == 0:
+                    cur.execute("""
+                                INSERT INTO mood_streaks (user_id, start_date, end_date) VALUES (%s, %s, %s)
+                                ON CONFLICT (user_id, start_date) DO NOTHING
+                                """, (user_id, day, day))
+    conn.commit()
+
+
+# ---------- the single-statement paths from app.py ----------
+def upsert_create_entry(conn, user_id, day, title, content):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_ENTRY_SQL, {'user_id': user_id, 'day': day, 'title': title, 'content': content,
+                                       'resource': ENTRIES})
+        cur.fetchone()
+
+
+def upsert_set_mood(conn, user_id, day, mood_id):
+    with conn.cursor() as cur:
+        set_mood(cur, user_id, day, mood_id)
+    conn.commit()
+
+
+def reset_user(conn) -> int:
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM users WHERE username = %s", (BENCH_USERNAME,))
+        cur.execute("""
+                    INSERT INTO users (email, username, password_hash, is_verified)
+                    VALUES (%s, %s, 'x', TRUE) RETURNING id
+                    """, (f'{BENCH_USERNAME}@example.com', BENCH_USERNAME))
+        return cur.fetchone()[0]
+
+
+def run_scenario(conn, name, write, autocommit, iterations, mood_ids):
+    """Time `iterations` writes; every other write is the first one of a new day."""
+    user_id = reset_user(conn)
+    conn.autocommit = autocommit
+    conn.round_trips = 0
+    start_day = date.today()
+    samples = []
+    for i in range(iterations):
+        day = start_day - timedelta(days=i // 2)
+        started = time.perf_counter()
+        if 'mood' in name:
+            write(conn, user_id, day, mood_ids[i % len(mood_ids)])
+        else:
+            write(conn, user_id, day, f'Entry {i}', 'Benchmark entry text. ' * 20)
+        samples.append((name, (time.perf_counter() - started) * 1000, True))
+    return samples, conn.round_trips / iterations
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    add_database_arguments(parser)
+    parser.add_argument('--iterations', type=int, default=300, help='writes per scenario')
+    parser.add_argument('--added-latency-ms', type=float, default=0.0,
+                        help='delay added to every round trip by a local proxy')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    params = dict(user=args.db_user, password=args.db_password, dbname=args.db_name)
+    setup = psycopg2.connect(host=args.db_host, port=args.db_port, sslmode=args.db_sslmode, **params)
+    prepare_database(setup)
+    with setup.cursor() as cur:
+        cur.execute("SELECT id FROM moods ORDER BY id")
+        mood_ids = [row[0] for row in cur.fetchall()]
+    setup.close()
+
+    if args.added_latency_ms:
+        proxy = LatencyProxy(args.db_host, args.db_port, args.added_latency_ms).start()
+        host, port, sslmode = '127.0.0.1', proxy.port, 'disable'
+    else:
+        host, port, sslmode = args.db_host, args.db_port, args.db_sslmode
+    conn = psycopg2.connect(host=host, port=port, sslmode=sslmode, connection_factory=CountingConnection, **params)
+
+    scenarios = (
+        ('create_entry/select_then_insert', legacy_create_entry, False),
+        ('create_entry/upsert', upsert_create_entry, True),
+        ('set_mood/select_then_write', legacy_set_mood, False),
+        ('set_mood/upsert', upsert_set_mood, False),
+    )
+    samples = []
+    round_trips = {}
+    for name, write, autocommit in scenarios:
+        print(f'Running {name}...', file=sys.stderr)
+        scenario_samples, round_trips[name] = run_scenario(conn, name, write, autocommit, args.iterations, mood_ids)
+        samples += scenario_samples
+    reset_user(conn)
+    conn.close()
+
+    summary = summarize(samples, elapsed=0)
+    for name, stats in summary['endpoints'].items():
+        stats['round_trips_per_write'] = round(round_trips[name], 2)
+        del stats['rps']
+    result = {
+        'meta': {'commit': git_commit(), 'iterations': args.iterations, 'added_latency_ms': args.added_latency_ms},
+        'scenarios': summary['endpoints'],
+        'p50_speedup': {
+            path: round(summary['endpoints'][f'{path}/{old}']['p50_ms'] / summary['endpoints'][f'{path}/upsert']['p50_ms'], 2)
+            for path, old in (('create_entry', 'select_then_insert'), ('set_mood', 'select_then_write'))
+        },
+    }
+
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return result
+
+
+if __name__ == '__main__':
+    main()
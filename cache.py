@@ -0,0 +1,44 @@
+# cache.py
+import threading
+import time
+
+
+class CachedValue:
+    "Holds one lazily loaded value for ttl seconds, with explicit invalidation."
+
+    def __init__(self, loader, ttl: float):
+        self._loader = loader
+        self.ttl = ttl
+        self._entry = None  # (value, loaded_at), replaced as a whole so readers need no lock
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self):
+        """Return the cached value, reloading it if it has expired or been invalidated.
+
+        Only one thread runs the loader at a time; the others wait for its result
+        instead of hitting the database as well.
+        """
+        entry = self._entry
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self.hits += 1
+            return entry[0]
+
+        with self._lock:
+            entry = self._entry
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+            generation = self._generation
+            value = self._loader()
+            # Don't store a result that was already invalidated while it was loading
+            if generation == self._generation:
+                self._entry = (value, time.monotonic())
+            self.loads += 1
+            return value
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entry = None
@@ -0,0 +1,232 @@
+# compression.py
+import re
+import threading
+import time
+import zlib
+
+from metrics import LatencyHistogram, record_timing
+
+# brotli and zstd are optional; without the packages those encodings are simply not offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class _GzipEncoder:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Content-Encoding -> (encoder class, default level), best first when the client rates them equally
+ENCODERS = {}
+if zstandard is not None:
+    ENCODERS['zstd'] = (_ZstdEncoder, 3)
+if brotli is not None:
+    ENCODERS['br'] = (_BrotliEncoder, 4)
+ENCODERS['gzip'] = (_GzipEncoder, 6)
+
+# Suffix appended to strong ETags on encoded responses (see ResponseCompressor._after_request)
+_ETAG_ENCODING_SUFFIX = re.compile(r'-(?:gzip|br|zstd)(?=")')
+
+COMPRESSIBLE_MIMETYPES = frozenset((
+    'application/json', 'application/javascript', 'application/x-ndjson', 'image/svg+xml',
+    'text/css', 'text/csv', 'text/html', 'text/javascript', 'text/plain',
+))
+
+
+class _EncodingStats:
+    __slots__ = ('responses', 'bytes_in', 'bytes_out', 'cpu_time')
+
+    def __init__(self):
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_time = LatencyHistogram()
+
+
+class ResponseCompressor:
+    """Compresses Flask responses with the best encoding the client accepts.
+
+    Buffered bodies smaller than ``min_size`` bytes are sent as-is. Streamed bodies
+    are compressed chunk by chunk as the generator produces them, so memory stays
+    flat. ``levels`` overrides the per-encoding compression level.
+    """
+
+    def __init__(self, min_size: int = 1024, levels: dict = None, mimetypes=COMPRESSIBLE_MIMETYPES):
+        self.min_size = min_size
+        self.mimetypes = frozenset(mimetypes)
+        self._levels = {name: (levels or {}).get(name, level) for name, (_, level) in ENCODERS.items()}
+        self._lock = threading.Lock()
+        self._stats = {name: _EncodingStats() for name in ENCODERS}
+        self._skipped_small = 0
+        self._identity = 0
+
+    def init_app(self, app) -> None:
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def stats(self) -> dict:
+        stats = {}
+        with self._lock:
+            stats['skipped_small'] = self._skipped_small
+            stats['identity'] = self._identity
+            for name, encoding in self._stats.items():
+                stats[f'{name}_responses'] = encoding.responses
+                stats[f'{name}_bytes_in'] = encoding.bytes_in
+                stats[f'{name}_bytes_out'] = encoding.bytes_out
+                stats[f'{name}_ratio'] = round(encoding.bytes_in / encoding.bytes_out, 3) if encoding.bytes_out else 0.0
+        for name, encoding in self._stats.items():
+            stats[f'{name}_cpu_time_ms'] = encoding.cpu_time.snapshot()
+        return stats
+
+    def _before_request(self):
+        from flask import request
+
+        # Validators echoed back from an encoded response carry its encoding suffix; strip
+        # it so routes compare If-None-Match against the ETag they set themselves.
+        header = request.environ.get('HTTP_IF_NONE_MATCH')
+        if header:
+            request.environ['compression.if_none_match'] = header
+            request.environ['HTTP_IF_NONE_MATCH'] = _ETAG_ENCODING_SUFFIX.sub('', header)
+
+    # ---------- negotiation ----------
+    def _negotiate(self, request) -> str:
+        return request.accept_encodings.best_match(list(ENCODERS))
+
+    def _should_compress(self, request, response) -> bool:
+        return (
+            response.mimetype in self.mimetypes
+            and 200 <= response.status_code < 300
+            and response.status_code not in (204, 206)
+            and 'Content-Encoding' not in response.headers
+            and not response.direct_passthrough
+            and request.method != 'HEAD'
+        )
+
+    def _after_request(self, response):
+        from flask import request
+
+        if response.status_code == 304:
+            self._restore_etag_suffix(request, response)
+            return response
+        if not self._should_compress(request, response):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = self._negotiate(request)
+        if encoding is None:
+            with self._lock:
+                self._identity += 1
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                with self._lock:
+                    self._skipped_small += 1
+                return response
+            response.set_data(self._compress(data, encoding))
+
+        response.headers['Content-Encoding'] = encoding
+        # A strong ETag promises byte-identical bodies, so each encoding gets its own
+        # (v1 -> v1-gzip); _before_request maps it back when the client revalidates.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f'{etag}-{encoding}')
+        return response
+
+    @staticmethod
+    def _restore_etag_suffix(request, response) -> None:
+        """Give a 304 the same encoded ETag the client revalidated with."""
+        etag, weak = response.get_etag()
+        sent = request.environ.get('compression.if_none_match')
+        if not etag or weak or not sent:
+            return
+        for encoding in ('gzip', 'br', 'zstd'):
+            if f'"{etag}-{encoding}"' in sent:
+                response.set_etag(f'{etag}-{encoding}')
+                return
+
+    # ---------- encoding ----------
+    def _new_encoder(self, encoding):
+        encoder_class, _ = ENCODERS[encoding]
+        return encoder_class(self._levels[encoding])
+
+    def _compress(self, data: bytes, encoding: str) -> bytes:
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        encoder = self._new_encoder(encoding)
+        compressed = encoder.compress(data) + encoder.finish()
+        record_timing('compress', (time.perf_counter() - wall_start) * 1000)
+        self._record(encoding, len(data), len(compressed), time.thread_time() - cpu_start)
+        return compressed
+
+    def _compress_stream(self, chunks, encoding: str):
+        encoder = self._new_encoder(encoding)
+        bytes_in = bytes_out = 0
+        cpu_time = 0.0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                start = time.thread_time()
+                compressed = encoder.compress(chunk)
+                cpu_time += time.thread_time() - start
+                bytes_in += len(chunk)
+                if compressed:
+                    bytes_out += len(compressed)
+                    yield compressed
+            start = time.thread_time()
+            tail = encoder.finish()
+            cpu_time += time.thread_time() - start
+            bytes_out += len(tail)
+            yield tail
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            self._record(encoding, bytes_in, bytes_out, cpu_time)
+
+    def _record(self, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float) -> None:
+        stats = self._stats[encoding]
+        stats.cpu_time.observe(cpu_seconds * 1000)
+        with self._lock:
+            stats.responses += 1
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
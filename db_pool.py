@@ -0,0 +1,622 @@
+# db_pool.py
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+
+import psycopg2
+from psycopg2 import errors, extensions
+from dotenv import load_dotenv
+
+from metrics import LatencyHistogram, record_timing
+from queries import NamedQuery, count_prepare, prepared_statements_enabled
+
+# Load environment variables
+load_dotenv(dotenv_path='db.env')
+
+# Pool sizing is per worker process: total server connections = workers x DB_POOL_MAX_SIZE
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', 1800))  # seconds
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', 300))  # seconds
+DB_POOL_CHECKOUT_TIMEOUT = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', 10))  # seconds
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', 30))  # seconds idle
+
+# Read replicas, comma-separated. A host[:port] item shares the primary's other DB_*
+# settings; anything else is a libpq DSN or postgres:// URL. Unset: everything uses the primary.
+DB_REPLICAS = os.getenv('DB_REPLICAS', '')
+DB_REPLICA_EJECT_SECONDS = float(os.getenv('DB_REPLICA_EJECT_SECONDS', 30))
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 2))  # seconds behind the primary
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', 5))  # seconds
+
+
+class _TimedCursorMixin:
+    """Adds the time spent in each database round trip to the current request's 'db' timing."""
+
+    def _timed(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            record_timing('db', (time.perf_counter() - start) * 1000)
+
+    def execute(self, query, vars=None):
+        if isinstance(query, NamedQuery):
+            return self._execute_named(query, vars)
+        return self._timed(self._base.execute, query, vars)
+
+    def _execute_named(self, query, vars):
+        """Run a registered query, as a prepared statement if the connection keeps them."""
+        # Server-side (named) cursors wrap the text in DECLARE, which can't take EXECUTE
+        prepared = getattr(self.connection, 'prepared_statements', None) if self.name is None else None
+        start = time.perf_counter()
+        try:
+            if prepared is None:
+                return self._base.execute(self, query, vars)
+            if query.name not in prepared:
+                # A separate round trip, once per connection: PREPARE outlives a rollback,
+                # so it must only be recorded once it is known to have run
+                self._base.execute(self, query.prepare_sql)
+                prepared.add(query.name)
+                count_prepare()
+            try:
+                return self._base.execute(self, query.execute_sql, vars)
+            except errors.InvalidSqlStatementName:
+                # Deallocated behind our back (DISCARD ALL); prepare again next time
+                prepared.discard(query.name)
+                raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            record_timing('db', elapsed_ms)
+            query.duration.observe(elapsed_ms)
+
+    def executemany(self, query, vars_list):
+        return self._timed(self._base.executemany, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(self._base.copy_expert, sql, file, size)
+
+    def fetchone(self):
+        return self._timed(self._base.fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed(self._base.fetchmany)
+        return self._timed(self._base.fetchmany, size)
+
+    def fetchall(self):
+        return self._timed(self._base.fetchall)
+
+
+_timed_cursor_classes = {}
+
+
+def _timed_cursor_class(cursor_factory):
+    timed = _timed_cursor_classes.get(cursor_factory)
+    if timed is None:
+        timed = type(f'Timed{cursor_factory.__name__}', (_TimedCursorMixin, cursor_factory),
+                     {'_base': cursor_factory})
+        _timed_cursor_classes[cursor_factory] = timed
+    return timed
+
+
+class TimedConnection(extensions.connection):
+    """psycopg2 connection whose cursors, commits and rollbacks report time to metrics.
+
+    prepared_statements holds the names of the queries.NamedQuery statements prepared
+    on this connection, or is None when prepared statements are turned off.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set() if prepared_statements_enabled() else None
+
+    def cursor(self, *args, **kwargs):
+        kwargs['cursor_factory'] = _timed_cursor_class(
+            kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            record_timing('db', (time.perf_counter() - start) * 1000)
+
+    def rollback(self):
+        start = time.perf_counter()
+        try:
+            return super().rollback()
+        finally:
+            record_timing('db', (time.perf_counter() - start) * 1000)
+
+
+def connection_params() -> dict:
+    """libpq connection parameters from the DB_* environment variables."""
+    return dict(
+        host=os.getenv('DB_HOST', 'aws-1-us-east-1.pooler.supabase.com'),
+        port=int(os.getenv('DB_PORT', 6543)),
+        user=os.getenv('DB_USER', 'postgres.fhhxgifimxcwfplenhmm'),
+        password=os.getenv('DB_PASS', 'OXsneQjf0vBsxfd5'),
+        dbname=os.getenv('DB_NAME', 'postgres'),
+        sslmode=os.getenv('DB_SSLMODE', 'require')
+    )
+
+
+def replica_params(spec: str, primary: dict) -> list:
+    """Connection parameters for each replica listed in spec (see DB_REPLICAS)."""
+    replicas = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        if '=' in item or '://' in item:
+            replicas.append({**primary, **extensions.parse_dsn(item)})
+        else:
+            host, _, port = item.partition(':')
+            replicas.append({**primary, 'host': host, 'port': int(port) if port else primary['port']})
+    return replicas
+
+
+def create_connection(params: dict = None):
+    """Open a new physical connection to the database (the primary unless params say otherwise)."""
+    try:
+        conn = psycopg2.connect(connection_factory=TimedConnection, **(params or connection_params()))
+        return conn
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        raise
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class _Slot:
+    """A pooled connection plus the timestamps used for recycling."""
+
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    "Thread-safe pool of psycopg2 connections with health checks, recycling and stats."
+
+    def __init__(self, connect, min_size: int = 1, max_size: int = 10, max_lifetime: float = 1800.0,
+                 max_idle: float = 300.0, checkout_timeout: float = 10.0, health_check_after: float = 30.0,
+                 reap_interval: float = 60.0):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.reap_interval = reap_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # most recently returned slot on the right
+        self._checked_out = 0  # in use, including connections still being opened
+        self._waiting = 0
+        self._pid = os.getpid()
+        self._closed = False
+        self._reaper = None
+
+        self._opened = 0
+        self._discarded = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._health_check_failures = 0
+        self._wait_count = 0
+        self._wait_time_ms = 0.0
+        self._checkout_latency = LatencyHistogram()
+
+    # ---------- public API ----------
+    @contextmanager
+    def connection(self, autocommit: bool = False):
+        """Borrow a connection for the duration of a ``with`` block.
+
+        Any transaction left open is rolled back when the block exits; connections
+        that raised a connection-level error are closed instead of being reused.
+        With autocommit=True each statement commits on its own, which saves the
+        BEGIN and COMMIT round trips for writes that are a single statement.
+        """
+        slot = self._checkout()
+        broken = False
+        try:
+            if autocommit:
+                slot.conn.autocommit = True
+            yield slot.conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if autocommit and not broken:
+                try:
+                    slot.conn.autocommit = False
+                except Exception:
+                    broken = True
+            self._checkin(slot, broken)
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': self._checked_out,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'connections_opened': self._opened,
+                'connections_closed': self._discarded,
+                'health_check_failures': self._health_check_failures,
+                'wait_count': self._wait_count,
+                'wait_time_total_ms': round(self._wait_time_ms, 3),
+            }
+        stats['checkout_latency_ms'] = self._checkout_latency.snapshot()
+        return stats
+
+    def reap(self) -> int:
+        """Close idle connections past their idle timeout or lifetime. Returns the number closed."""
+        now = time.monotonic()
+        doomed = []
+        with self._cond:
+            self._check_fork()
+            keep = deque()
+            # Oldest first, so the most recently used connections survive down to min_size
+            while self._idle:
+                slot = self._idle.popleft()
+                total = len(keep) + len(self._idle) + 1 + self._checked_out
+                idle_too_long = now - slot.last_used > self.max_idle and total > self.min_size
+                if idle_too_long or self._past_lifetime(slot, now):
+                    doomed.append(slot)
+                else:
+                    keep.append(slot)
+            self._idle = keep
+            self._discarded += len(doomed)
+            if doomed:
+                self._cond.notify_all()
+        for slot in doomed:
+            self._close_quietly(slot.conn)
+        return len(doomed)
+
+    def close(self) -> None:
+        """Close every idle connection; checked-out connections are closed on return."""
+        with self._cond:
+            self._closed = True
+            doomed = list(self._idle)
+            self._idle.clear()
+            self._discarded += len(doomed)
+            self._cond.notify_all()
+        for slot in doomed:
+            self._close_quietly(slot.conn)
+
+    # ---------- checkout / checkin ----------
+    def _checkout(self) -> _Slot:
+        start = time.perf_counter()
+        deadline = start + self.checkout_timeout
+        waited = False
+
+        while True:
+            slot = None
+            doomed = []
+            with self._cond:
+                self._check_fork()
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate = self._idle.pop()
+                        if self._past_lifetime(candidate, now):
+                            doomed.append(candidate)
+                            self._discarded += 1
+                        else:
+                            slot = candidate
+                            break
+                    if slot is not None or self._checked_out + len(self._idle) < self.max_size:
+                        self._checked_out += 1
+                        break
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Timed out after {self.checkout_timeout}s waiting for a database connection")
+                    waited = True
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+            self._start_reaper()
+
+            for old in doomed:
+                self._close_quietly(old.conn)
+
+            if slot is None:
+                try:
+                    slot = _Slot(self._connect())
+                except Exception:
+                    self._release_capacity()
+                    raise
+                with self._cond:
+                    self._opened += 1
+            elif time.monotonic() - slot.last_used > self.health_check_after and not self._is_healthy(slot.conn):
+                self._close_quietly(slot.conn)
+                with self._cond:
+                    self._health_check_failures += 1
+                    self._discarded += 1
+                    self._checked_out -= 1
+                    self._cond.notify()
+                continue
+            break
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._checkout_latency.observe(elapsed_ms)
+        record_timing('pool', elapsed_ms)
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._wait_count += 1
+                self._wait_time_ms += elapsed_ms
+        return slot
+
+    def _checkin(self, slot: _Slot, broken: bool = False) -> None:
+        conn = slot.conn
+        if not broken and not conn.closed:
+            try:
+                status = conn.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    broken = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                broken = True
+
+        with self._cond:
+            if os.getpid() != self._pid:
+                # Connection belongs to the parent process; leave its socket alone
+                return
+            self._checked_out -= 1
+            now = time.monotonic()
+            discard = broken or conn.closed or self._closed or self._past_lifetime(slot, now)
+            if discard:
+                self._discarded += 1
+            else:
+                slot.last_used = now
+                self._idle.append(slot)
+            self._cond.notify()
+        if discard:
+            self._close_quietly(conn)
+
+    # ---------- helpers ----------
+    def _release_capacity(self) -> None:
+        with self._cond:
+            self._checked_out -= 1
+            self._cond.notify()
+
+    def _past_lifetime(self, slot: _Slot, now: float) -> bool:
+        return now - slot.created_at > self.max_lifetime
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _check_fork(self) -> None:
+        # Called with the lock held. After a fork, inherited sockets are shared with the
+        # parent, so forget them without closing and start a fresh pool in this process.
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = deque()
+            self._checked_out = 0
+            self._waiting = 0
+            self._reaper = None
+
+    def _start_reaper(self) -> None:
+        if self._reaper is not None or self.reap_interval <= 0:
+            return
+        with self._cond:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, name='db-pool-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap_forever(self) -> None:
+        while not self._closed:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Connection pool reaper error: {e}")
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class ReplicaSet:
+    """Read replicas, each with its own pool, used round-robin for reads that may lag.
+
+    A replica is ejected for eject_seconds when connecting to it fails, a query on it
+    hits a connection error, or it is more than max_lag seconds behind the primary
+    (checked on checkout, at most every lag_check_interval). Reads go to the primary
+    while every replica is ejected.
+    """
+
+    LAG_SQL = """
+        SELECT CASE
+                   WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                   ELSE EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+                   END
+    """
+
+    def __init__(self, pools: list, primary: ConnectionPool, eject_seconds: float = 30.0, max_lag: float = 2.0,
+                 lag_check_interval: float = 5.0, clock=time.monotonic):
+        self.pools = list(pools)
+        self.primary = primary
+        self.eject_seconds = eject_seconds
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next = 0
+        self._ejected_until = [0.0] * len(self.pools)
+        self._lag_checked_at = [None] * len(self.pools)
+        self._reads = [0] * len(self.pools)
+        self._ejections = 0
+        self._primary_reads = 0
+
+    @contextmanager
+    def connection(self, autocommit: bool = False):
+        """Borrow a connection from the next healthy replica, or from the primary."""
+        for index in self._candidates():
+            started = False
+            try:
+                with self.pools[index].connection(autocommit) as conn:
+                    if not self._lag_ok(index, conn):
+                        continue
+                    with self._lock:
+                        self._reads[index] += 1
+                    started = True
+                    yield conn
+                    return
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if isinstance(e, errors.QueryCanceled):
+                    raise  # a statement timeout says nothing about the replica's health
+                self._eject(index, e)
+                if started:
+                    # The caller's queries already ran here; retrying them is up to the caller
+                    raise
+        with self._lock:
+            self._primary_reads += 1
+        with self.primary.connection(autocommit) as conn:
+            yield conn
+
+    def stats(self) -> dict:
+        now = self._clock()
+        with self._lock:
+            stats = {
+                'replicas': len(self.pools),
+                'healthy': sum(until <= now for until in self._ejected_until),
+                'replica_reads': sum(self._reads),
+                'primary_reads': self._primary_reads,
+                'ejections': self._ejections,
+            }
+        stats['pools'] = [pool.stats() for pool in self.pools]
+        return stats
+
+    def _candidates(self) -> list:
+        """Healthy replicas, starting with the next one in turn."""
+        now = self._clock()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.pools)
+            order = [(start + offset) % len(self.pools) for offset in range(len(self.pools))]
+            return [index for index in order if self._ejected_until[index] <= now]
+
+    def _lag_ok(self, index: int, conn) -> bool:
+        now = self._clock()
+        checked_at = self._lag_checked_at[index]
+        if checked_at is not None and now - checked_at < self.lag_check_interval:
+            return True
+        self._lag_checked_at[index] = now
+        with conn.cursor() as cur:
+            cur.execute(self.LAG_SQL)
+            lag = cur.fetchone()[0]
+        if not conn.autocommit:
+            conn.rollback()
+        if lag is not None and float(lag) > self.max_lag:
+            self._eject(index, f'{float(lag):.1f}s behind the primary')
+            return False
+        return True
+
+    def _eject(self, index: int, reason) -> None:
+        with self._lock:
+            self._ejected_until[index] = self._clock() + self.eject_seconds
+            self._ejections += 1
+        print(f"Ejecting read replica {index} for {self.eject_seconds:g}s: {reason}")
+
+
+# ---------- shared pool used by app.py, secret_manager.py and email_sender.py ----------
+_pool = None
+_replicas = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    create_connection,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    checkout_timeout=DB_POOL_CHECKOUT_TIMEOUT,
+                    health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                )
+    return _pool
+
+
+def get_replicas():
+    """Return the process-wide ReplicaSet, or None when DB_REPLICAS is not set."""
+    global _replicas
+    if _replicas is None and DB_REPLICAS:
+        primary = get_pool()
+        with _pool_lock:
+            if _replicas is None:
+                pools = [ConnectionPool(
+                    partial(create_connection, params),
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    checkout_timeout=DB_POOL_CHECKOUT_TIMEOUT,
+                    health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                ) for params in replica_params(DB_REPLICAS, connection_params())]
+                _replicas = ReplicaSet(pools, primary, eject_seconds=DB_REPLICA_EJECT_SECONDS,
+                                       max_lag=DB_REPLICA_MAX_LAG, lag_check_interval=DB_REPLICA_LAG_CHECK_INTERVAL)
+    return _replicas
+
+
+def db_connection(autocommit: bool = False, replica: bool = False):
+    """Context manager that borrows a connection from the shared pool.
+
+    replica=True borrows from a read replica instead, when DB_REPLICAS is set. Only
+    use it for reads that may be a moment behind the primary.
+    """
+    if replica:
+        replicas = get_replicas()
+        if replicas is not None:
+            return replicas.connection(autocommit)
+    return get_pool().connection(autocommit)
+
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
+
+def replica_stats() -> dict:
+    replicas = get_replicas()
+    return replicas.stats() if replicas is not None else {'replicas': 0}
@@ -1,50 +1,24 @@
 # email_sender.py
-import smtplib
-from email.mime.text import MIMEText
 from dotenv import load_dotenv
-import os
-from secret_manager import generate_and_store_otp, get_otp_from_db  # import from your existing file
-import psycopg2  # Changed from mysql.connector
+from secret_manager import generate_and_store_otp  # import from your existing file
+from db_pool import db_connection  # shared connection pool
+from mail_outbox import get_outbox  # background SMTP sender
 
 # Load environment variables
 load_dotenv(dotenv_path="db.env")
 
-EMAIL_USER = os.getenv("EMAIL_ADDRESS")
-EMAIL_PASS = os.getenv("EMAIL_PASSWORD")
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = int(os.getenv("DB_PORT", 5432))  # Changed to PostgreSQL port
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-DB_NAME = os.getenv("DB_NAME")
-
 # ---------- helper: fetch email ----------
 def get_user_email(username: str) -> str | None:
     """Fetch user email from DB given username."""
     try:
-        conn = psycopg2.connect(  # Changed to psycopg2
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME,
-            sslmode="require"  # Added for Supabase
-        )
-        cur = conn.cursor()
-        sql = "SELECT email FROM users WHERE username=%s LIMIT 1"
-        cur.execute(sql, (username,))
-        result = cur.fetchone()
-        return result[0] if result else None
+        with db_connection() as conn, conn.cursor() as cur:
+            sql = "SELECT email FROM users WHERE username=%s LIMIT 1"
+            cur.execute(sql, (username,))
+            result = cur.fetchone()
+            return result[0] if result else None
     except Exception as e:
         print(f"❌ Error fetching email from database: {e}")
         return None
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
 
 # ---------- main sender ----------
 def send_login_otp(username: str):
@@ -67,18 +41,8 @@ This code will expire in 5 minutes.
 
 Do not share this code with anyone.
 """
-    msg = MIMEText(body)
-    msg["Subject"] = "Your Journal App OTP"
-    msg["From"] = EMAIL_USER
-    msg["To"] = user_email
-
-    try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(EMAIL_USER, EMAIL_PASS)
-            server.send_message(msg)
-        print(f"✅ OTP sent to {user_email}")
+    if get_outbox().enqueue(user_email, "Your Journal App OTP", body):
+        print(f"✅ OTP queued for {user_email}")
         return True
-    except Exception as e:
-        print(f"❌ Error sending email: {e}")
-        return False
\ No newline at end of file
+    print("❌ Error sending email: outbox is full")
+    return False
@@ -0,0 +1,159 @@
+# entry_import.py
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from psycopg2 import DataError, errors
+
+IMPORT_CHUNK_SIZE = 1000  # rows per COPY / transaction
+IMPORT_MAX_REPORTED_ERRORS = 100
+TITLE_MAX_LENGTH = 255  # journal_entries.entry_title is VARCHAR(255)
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')  # ISO, and the format the API returns entries in
+
+
+# Errors a single row's values can cause; any other database error fails the whole import.
+# An entry too large for its search_vector raises ProgramLimitExceeded.
+ROW_DATABASE_ERRORS = (DataError, errors.ProgramLimitExceeded)
+
+
+class ImportRowError(ValueError):
+    """A single uploaded row that could not be imported."""
+
+
+def text_stream(binary):
+    """Wrap a binary upload stream for line-by-line decoding without reading it all into memory."""
+    if not isinstance(binary, io.BufferedIOBase):
+        binary = io.BufferedReader(binary)
+    return io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+
+def text_field(raw: dict, name: str) -> str:
+    """raw[name] as a string, '' if missing or null. JSON rows can hold any type."""
+    value = raw.get(name)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ImportRowError(f"{name.capitalize()} must be text")
+    return value
+
+
+def parse_date(value: str) -> date:
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ImportRowError(f"Invalid date {value!r}; use YYYY-MM-DD")
+
+
+def validate_row(raw) -> tuple:
+    """Turn an uploaded {'title', 'content', 'date'} mapping into (title, content, entry_date)."""
+    if not isinstance(raw, dict):
+        raise ImportRowError("Each row must be an object with title, content and date")
+    title = text_field(raw, 'title').strip()
+    content = text_field(raw, 'content')
+    if not title or not content.strip():
+        raise ImportRowError("Title and content are required")
+    if len(title) > TITLE_MAX_LENGTH:
+        raise ImportRowError(f"Title is longer than {TITLE_MAX_LENGTH} characters")
+    if '\x00' in title or '\x00' in content:
+        raise ImportRowError("Text may not contain NUL characters")
+    return title, content, parse_date(text_field(raw, 'date'))
+
+
+def read_ndjson(stream):
+    """Yield (line_number, row_or_error) for each non-blank line of an NDJSON upload."""
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, validate_row(json.loads(line))
+        except json.JSONDecodeError as e:
+            yield line_number, ImportRowError(f"Invalid JSON: {e.msg}")
+        except ImportRowError as e:
+            yield line_number, e
+
+
+def read_csv(stream):
+    """Yield (line_number, row_or_error) for each record of a CSV upload with a
+    title,content,date header. Quoted fields may span several lines."""
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        return
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    missing = {'title', 'content', 'date'} - set(reader.fieldnames)
+    if missing:
+        raise ImportRowError(f"CSV header is missing {', '.join(sorted(missing))}")
+    while True:
+        try:
+            raw = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield reader.line_num, ImportRowError(f"Invalid CSV: {e}")
+            return
+        try:
+            yield reader.line_num, validate_row(raw)
+        except ImportRowError as e:
+            yield reader.line_num, e
+
+
+def chunks(rows, size: int = IMPORT_CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def copy_entries(cur, user_id: int, rows) -> None:
+    """Load one chunk of validated (line, (title, content, entry_date)) rows.
+
+    The chunk's daily_journals rows are found or created with one set-based
+    statement, then the entries go in with a single COPY.
+    """
+    entry_dates = sorted({entry_date for _, (_, _, entry_date) in rows})
+    # The no-op DO UPDATE makes RETURNING include days that already had a row
+    cur.execute("""
+                INSERT INTO daily_journals (user_id, entry_date)
+                SELECT %(user_id)s, d
+                FROM unnest(%(dates)s::date[]) AS d
+                ON CONFLICT (user_id, entry_date) DO UPDATE SET entry_date = EXCLUDED.entry_date
+                RETURNING entry_date, id
+                """, {'user_id': user_id, 'dates': entry_dates})
+    journal_ids = {row[0]: row[1] for row in cur.fetchall()}
+
+    buffer = io.StringIO()
+    # Quote everything so an entry consisting of just \. can't end the COPY early
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    for _, (title, content, entry_date) in rows:
+        # Imported entries keep their original date as created_at so they sort into place
+        writer.writerow((journal_ids[entry_date], title, content, entry_date.isoformat()))
+    buffer.seek(0)
+    cur.copy_expert("""
+                    COPY journal_entries (daily_journal_id, entry_title, entry_content, created_at)
+                        FROM STDIN WITH (FORMAT csv)
+                    """, buffer)
+
+
+def load_rows(load, rows, reject) -> int:
+    """Load validated (line, row) rows with load(rows), one transaction per call; returns how many went in.
+
+    When the database rejects a batch, it is split in half and each half retried,
+    down to single rows, so only the offending rows are passed to reject(line, error)
+    and the rest of the batch is still imported. load() must roll back on failure.
+    """
+    try:
+        load(rows)
+        return len(rows)
+    except ROW_DATABASE_ERRORS as e:
+        if len(rows) == 1:
+            reject(rows[0][0], e)
+            return 0
+    middle = len(rows) // 2
+    return load_rows(load, rows[:middle], reject) + load_rows(load, rows[middle:], reject)
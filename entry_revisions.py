@@ -0,0 +1,231 @@
+# entry_revisions.py
+"""Edit history for journal entries (see migrations/0011_entry_revisions.sql).
+
+Each revision stores either a full snapshot of the entry or a binary delta against
+the revision before it. Every REVISION_SNAPSHOT_INTERVAL-th revision is a snapshot,
+so rebuilding any revision applies at most that many deltas however long the
+history gets, while storage grows by roughly the size of each edit.
+"""
+import difflib
+import re
+import struct
+import zlib
+
+from psycopg2.extras import execute_values
+
+from queries import named_query
+
+REVISION_SNAPSHOT_INTERVAL = 20
+# Changed blocks up to this size are diffed word by word; larger ones are stored whole
+DELTA_REFINE_LIMIT = 16384
+# Unchanged runs shorter than this are cheaper to store inline than as a copy
+DELTA_MIN_COPY = 8
+
+_COPY = 0
+_INSERT = 1
+_WORD = re.compile(rb'\S+\s*|\s+')
+
+LAST_REVISION_SQL = named_query('last_entry_revision', """
+    SELECT MAX(revision) AS revision FROM entry_revisions WHERE entry_id = %s
+""")
+
+# The revisions needed to rebuild one: the nearest snapshot at or before it, then its deltas
+REVISION_CHAIN_SQL = named_query('entry_revision_chain', """
+    SELECT revision, is_snapshot, data, created_at
+    FROM entry_revisions
+    WHERE entry_id = %(entry_id)s
+      AND revision <= %(revision)s
+      AND revision >= (SELECT MAX(revision)
+                       FROM entry_revisions
+                       WHERE entry_id = %(entry_id)s
+                         AND is_snapshot
+                         AND revision <= %(revision)s)
+    ORDER BY revision
+""")
+
+
+def encode_document(title: str, content: str) -> bytes:
+    """One revision's title and content as the bytes that snapshots and deltas cover.
+
+    The title gets a line of its own, so retitling doesn't change the content's first line.
+    """
+    title_bytes = (title or '').encode('utf-8')
+    return struct.pack('>I', len(title_bytes)) + title_bytes + b'\n' + (content or '').encode('utf-8')
+
+
+def decode_document(document: bytes):
+    """(title, content) from encode_document()"""
+    (length,) = struct.unpack_from('>I', document)
+    return document[4:4 + length].decode('utf-8'), document[5 + length:].decode('utf-8')
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class _DeltaWriter:
+    """Collects copy and insert operations, merging adjacent inserts"""
+
+    def __init__(self):
+        self.out = bytearray()
+        self.pending = bytearray()
+
+    def copy(self, offset: int, length: int) -> None:
+        if not length:
+            return
+        self._flush()
+        self.out.append(_COPY)
+        _write_varint(self.out, offset)
+        _write_varint(self.out, length)
+
+    def insert(self, data: bytes) -> None:
+        self.pending += data
+
+    def finish(self) -> bytes:
+        self._flush()
+        return zlib.compress(bytes(self.out))
+
+    def _flush(self) -> None:
+        if self.pending:
+            self.out.append(_INSERT)
+            _write_varint(self.out, len(self.pending))
+            self.out += self.pending
+            self.pending = bytearray()
+
+
+def make_delta(old: bytes, new: bytes) -> bytes:
+    """Compressed delta that apply_delta() turns old into new with.
+
+    Matches whole lines first, then refines changed blocks word by word so a
+    one-word edit to a long paragraph costs a few bytes rather than the paragraph.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    starts = [0]
+    for line in old_lines:
+        starts.append(starts[-1] + len(line))
+
+    writer = _DeltaWriter()
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            writer.copy(starts[i1], starts[i2] - starts[i1])
+            continue
+        old_block = old[starts[i1]:starts[i2]]
+        new_block = b''.join(new_lines[j1:j2])
+        if not old_block or len(old_block) > DELTA_REFINE_LIMIT or len(new_block) > DELTA_REFINE_LIMIT:
+            writer.insert(new_block)
+            continue
+        old_words = _WORD.findall(old_block)
+        new_words = _WORD.findall(new_block)
+        word_starts = [starts[i1]]
+        for word in old_words:
+            word_starts.append(word_starts[-1] + len(word))
+        refine = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+        for sub_tag, a1, a2, b1, b2 in refine.get_opcodes():
+            if sub_tag == 'equal' and word_starts[a2] - word_starts[a1] >= DELTA_MIN_COPY:
+                writer.copy(word_starts[a1], word_starts[a2] - word_starts[a1])
+            else:
+                writer.insert(b''.join(new_words[b1:b2]))
+    return writer.finish()
+
+
+def apply_delta(old: bytes, delta: bytes) -> bytes:
+    """The document make_delta(old, new) was made from. Raises ValueError if the delta is corrupt."""
+    data = zlib.decompress(delta)
+    out = bytearray()
+    pos = 0
+    while pos < len(data):
+        op = data[pos]
+        pos += 1
+        if op == _COPY:
+            offset, pos = _read_varint(data, pos)
+            length, pos = _read_varint(data, pos)
+            if offset + length > len(old):
+                raise ValueError('Revision delta copies past the end of its base')
+            out += old[offset:offset + length]
+        elif op == _INSERT:
+            length, pos = _read_varint(data, pos)
+            out += data[pos:pos + length]
+            pos += length
+        else:
+            raise ValueError(f'Unknown revision delta operation {op}')
+    return bytes(out)
+
+
+def is_snapshot_revision(revision: int) -> bool:
+    return (revision - 1) % REVISION_SNAPSHOT_INTERVAL == 0
+
+
+def rebuild(chain) -> bytes:
+    """The document for the last of chain, a snapshot followed by its deltas in order.
+
+    Each item is (revision, is_snapshot, data).
+    """
+    document = None
+    for revision, is_snapshot, data in chain:
+        if is_snapshot:
+            document = zlib.decompress(bytes(data))
+        elif document is None:
+            raise ValueError(f'Revision {revision} has no snapshot to apply its delta to')
+        else:
+            document = apply_delta(document, bytes(data))
+    if document is None:
+        raise ValueError('No revisions to rebuild from')
+    return document
+
+
+def record_revision(cur, entry_id: int, previous: dict, title: str, content: str) -> int:
+    """Append the entry's new title and content to its history. Returns the new revision number.
+
+    previous holds entry_title, entry_content and updated_at from before the edit. Entries
+    without a history yet get it as revision 1 first. Run it on the same cursor as the
+    edit, while the entry row is locked, so concurrent edits can't take the same number.
+    """
+    cur.execute(LAST_REVISION_SQL, (entry_id,))
+    row = cur.fetchone()
+    last = row['revision'] if isinstance(row, dict) else row[0]
+
+    old = encode_document(previous['entry_title'], previous['entry_content'])
+    rows = []
+    if last is None:
+        last = 1
+        rows.append((entry_id, 1, True, zlib.compress(old), previous['updated_at']))
+
+    revision = last + 1
+    new = encode_document(title, content)
+    if is_snapshot_revision(revision):
+        rows.append((entry_id, revision, True, zlib.compress(new), None))
+    else:
+        rows.append((entry_id, revision, False, make_delta(old, new), None))
+
+    execute_values(cur, """
+        INSERT INTO entry_revisions (entry_id, revision, is_snapshot, data, created_at)
+        VALUES %s
+    """, rows, template='(%s, %s, %s, %s, COALESCE(%s, NOW()))')
+    return revision
+
+
+def load_revision(cur, entry_id: int, revision: int):
+    """(title, content, created_at) of one stored revision, or None if it doesn't exist"""
+    cur.execute(REVISION_CHAIN_SQL, {'entry_id': entry_id, 'revision': revision})
+    chain = [(row['revision'], row['is_snapshot'], row['data'], row['created_at']) if isinstance(row, dict) else row
+             for row in cur.fetchall()]
+    if not chain or chain[-1][0] != revision:
+        return None
+    title, content = decode_document(rebuild(item[:3] for item in chain))
+    return title, content, chain[-1][3]
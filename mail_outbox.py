@@ -0,0 +1,317 @@
+# mail_outbox.py
+import atexit
+import heapq
+import itertools
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+
+from dotenv import load_dotenv
+
+from metrics import LatencyHistogram
+
+# Load environment variables
+load_dotenv(dotenv_path='db.env')
+
+EMAIL_USER = os.getenv("EMAIL_ADDRESS")
+EMAIL_PASS = os.getenv("EMAIL_PASSWORD")
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+# Set SMTP_USE_TLS=false to point the outbox at a local stand-in server, e.g.
+#   python -m aiosmtpd -n -l localhost:1025
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
+
+MAIL_OUTBOX_WORKERS = int(os.getenv("MAIL_OUTBOX_WORKERS", 2))
+MAIL_OUTBOX_MAX_QUEUE = int(os.getenv("MAIL_OUTBOX_MAX_QUEUE", 1000))
+MAIL_OUTBOX_BATCH_SIZE = int(os.getenv("MAIL_OUTBOX_BATCH_SIZE", 20))
+MAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("MAIL_OUTBOX_MAX_ATTEMPTS", 5))
+
+
+class OutboxMessage:
+    """A queued email plus its delivery bookkeeping."""
+
+    __slots__ = ('mime', 'attempts', 'enqueued_at')
+
+    def __init__(self, mime):
+        self.mime = mime
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+
+class MailOutbox:
+    "Queues outgoing mail and sends it from background threads over long-lived SMTP sessions."
+
+    # Seconds between checks for due retries and idle sessions while the queue is empty
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, host: str, port: int, username: str = None, password: str = None, sender: str = None,
+                 use_tls: bool = True, workers: int = 2, max_queue: int = 1000, batch_size: int = 20,
+                 max_attempts: int = 5, backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 session_idle_timeout: float = 60.0, timeout: float = 30.0, smtp_factory=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.use_tls = use_tls
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session_idle_timeout = session_idle_timeout
+        self.timeout = timeout
+        self._smtp_factory = smtp_factory
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retries = []  # heap of (due_at, seq, message)
+        self._retry_seq = itertools.count()
+        self._lock = threading.Condition()
+        self._pending = 0  # accepted but not yet sent or given up on
+        self._threads = []
+        self._pid = None
+        self._stopping = False
+
+        self._sent = 0
+        self._failed = 0
+        self._retried = 0
+        self._rejected = 0
+        self._sessions_opened = 0
+        self._send_latency = LatencyHistogram()
+        self._delivery_latency = LatencyHistogram()
+
+    # ---------- public API ----------
+    def enqueue(self, to: str, subject: str, body: str) -> bool:
+        """Queue a plain-text email for background delivery.
+
+        Returns False only if the outbox is full; delivery failures are retried in the background.
+        """
+        msg = MIMEText(body)
+        msg['Subject'] = subject
+        msg['From'] = self.sender
+        msg['To'] = to
+
+        self._ensure_started()
+        with self._lock:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(OutboxMessage(msg))
+        except queue.Full:
+            with self._lock:
+                self._pending -= 1
+                self._rejected += 1
+                self._lock.notify_all()
+            print(f"Email outbox full, dropping message to {to}")
+            return False
+        return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until every queued message has been sent or given up on. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Try to deliver what is queued, then stop the sender threads."""
+        self.flush(timeout)
+        with self._lock:
+            self._stopping = True
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                'queue_depth': self._queue.qsize(),
+                'retry_pending': len(self._retries),
+                'pending': self._pending,
+                'sent': self._sent,
+                'failed': self._failed,
+                'retried': self._retried,
+                'rejected': self._rejected,
+                'sessions_opened': self._sessions_opened,
+                'workers': len(self._threads),
+            }
+        stats['send_latency_ms'] = self._send_latency.snapshot()
+        stats['delivery_latency_ms'] = self._delivery_latency.snapshot()
+        return stats
+
+    # ---------- sender threads ----------
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # First use, or first use after a fork: threads do not survive fork()
+            self._pid = os.getpid()
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._run, name=f'mail-outbox-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _run(self) -> None:
+        session = None
+        last_used = 0.0
+        while True:
+            self._promote_due_retries()
+            try:
+                message = self._queue.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                if session is not None and time.monotonic() - last_used > self.session_idle_timeout:
+                    self._quit(session)
+                    session = None
+                with self._lock:
+                    if self._stopping and not self._pending:
+                        break
+                continue
+
+            batch = [message]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for message in batch:
+                session = self._deliver(session, message, reused=session is not None)
+            last_used = time.monotonic()
+
+        if session is not None:
+            self._quit(session)
+
+    def _deliver(self, session, message: OutboxMessage, reused: bool):
+        """Send one message on the worker's session, returning the session to keep using."""
+        message.attempts += 1
+        start = time.perf_counter()
+        try:
+            if session is None:
+                session = self._open_session()
+            try:
+                session.send_message(message.mime)
+            except smtplib.SMTPServerDisconnected:
+                if not reused:
+                    raise
+                # The server dropped our idle session; reconnect once before counting a failure
+                self._quit(session)
+                session = None
+                session = self._open_session()
+                session.send_message(message.mime)
+        except Exception as e:
+            if session is not None and not self._is_message_error(e):
+                self._quit(session)
+                session = None
+            self._retry_or_fail(message, e)
+            return session
+
+        now = time.perf_counter()
+        self._send_latency.observe((now - start) * 1000)
+        self._delivery_latency.observe((time.monotonic() - message.enqueued_at) * 1000)
+        with self._lock:
+            self._sent += 1
+            self._pending -= 1
+            self._lock.notify_all()
+        return session
+
+    def _open_session(self):
+        session = self._smtp_factory(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                session.starttls()
+            if self.username:
+                session.login(self.username, self.password)
+        except Exception:
+            self._quit(session)
+            raise
+        with self._lock:
+            self._sessions_opened += 1
+        return session
+
+    def _retry_or_fail(self, message: OutboxMessage, error: Exception) -> None:
+        permanent = self._is_permanent(error)
+        with self._lock:
+            if permanent or message.attempts >= self.max_attempts:
+                self._failed += 1
+                self._pending -= 1
+                self._lock.notify_all()
+                print(f"Email error: giving up on {message.mime['To']} after {message.attempts} attempt(s): {error}")
+                return
+            delay = min(self.backoff_max, self.backoff_base * (2 ** (message.attempts - 1)))
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._retry_seq), message))
+            self._retried += 1
+        print(f"Email error: retrying {message.mime['To']} in {delay:.1f}s: {error}")
+
+    def _promote_due_retries(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            while self._retries and self._retries[0][0] <= now:
+                # The message is already counted in _pending, so bypass enqueue()
+                try:
+                    self._queue.put_nowait(self._retries[0][2])
+                except queue.Full:
+                    break  # leave it on the heap until the queue has room
+                heapq.heappop(self._retries)
+
+    @staticmethod
+    def _is_message_error(error: Exception) -> bool:
+        # The server rejected this message but the session itself is still usable
+        return isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError))
+
+    @staticmethod
+    def _is_permanent(error: Exception) -> bool:
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(code >= 500 for code, _ in error.recipients.values())
+        if isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+            return error.smtp_code >= 500
+        return False
+
+    @staticmethod
+    def _quit(session) -> None:
+        try:
+            session.quit()
+        except Exception:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+
+# ---------- shared outbox used by app.py and email_sender.py ----------
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> MailOutbox:
+    """Return the process-wide outbox, creating it on first use."""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = MailOutbox(
+                    SMTP_SERVER,
+                    SMTP_PORT,
+                    username=EMAIL_USER,
+                    password=EMAIL_PASS,
+                    use_tls=SMTP_USE_TLS,
+                    workers=MAIL_OUTBOX_WORKERS,
+                    max_queue=MAIL_OUTBOX_MAX_QUEUE,
+                    batch_size=MAIL_OUTBOX_BATCH_SIZE,
+                    max_attempts=MAIL_OUTBOX_MAX_ATTEMPTS,
+                )
+                atexit.register(_outbox.close)
+    return _outbox
+
+
+def outbox_stats() -> dict:
+    return get_outbox().stats()
@@ -0,0 +1,174 @@
+# metrics.py
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds), safe to share between threads."""
+
+    BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float) -> None:
+        # First bucket whose upper bound is >= the value; the last slot is +Inf
+        index = bisect_left(self.buckets, value_ms)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value_ms
+
+    def snapshot(self) -> dict:
+        """Return cumulative bucket counts keyed by upper bound, plus count and sum."""
+        with self._lock:
+            counts = list(self._counts)
+            total_ms = self._sum
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[str(bound)] = running
+        running += counts[-1]
+        cumulative['+Inf'] = running
+        return {'buckets': cumulative, 'count': running, 'sum_ms': round(total_ms, 3)}
+
+
+# ---------- per-request timing breakdown ----------
+# Maps a component name ('db', 'pool', 'bcrypt', ...) to milliseconds spent in it during
+# the current request. None outside a request, so background threads record nothing.
+_request_timing = ContextVar('request_timing', default=None)
+
+
+def record_timing(name: str, value_ms: float) -> None:
+    """Add time spent in a component (e.g. 'db') to the current request's breakdown."""
+    timing = _request_timing.get()
+    if timing is not None:
+        timing[name] = timing.get(name, 0.0) + value_ms
+
+
+class RequestMetrics:
+    "Per-endpoint request counts and latency histograms for a Flask app."
+
+    # Components broken out of each request's total; whatever is left is reported as 'app'
+    COMPONENTS = ('db', 'pool', 'bcrypt', 'compress')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}  # (endpoint, method, status) -> count
+        self._histograms = {}  # (endpoint, method) -> {'total': hist, 'app': hist, 'db': hist, ...}
+
+    def init_app(self, app) -> None:
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        _request_timing.set({'_start': time.perf_counter()})
+
+    def _after_request(self, response):
+        from flask import request
+
+        timing = _request_timing.get()
+        if timing is None:
+            return response
+        _request_timing.set(None)
+
+        total_ms = (time.perf_counter() - timing.pop('_start')) * 1000
+        app_ms = max(0.0, total_ms - sum(timing.values()))
+        endpoint = request.endpoint or 'unmatched'
+        self._record(endpoint, request.method, response.status_code, total_ms, app_ms, timing)
+
+        parts = [f'{name};dur={value:.2f}' for name, value in timing.items()]
+        parts.append(f'app;dur={app_ms:.2f}')
+        parts.append(f'total;dur={total_ms:.2f}')
+        response.headers['Server-Timing'] = ', '.join(parts)
+        return response
+
+    def _record(self, endpoint, method, status, total_ms, app_ms, timing) -> None:
+        key = (endpoint, method)
+        histograms = self._histograms.get(key)
+        if histograms is None:
+            with self._lock:
+                histograms = self._histograms.setdefault(key, {
+                    name: LatencyHistogram() for name in ('total', 'app') + self.COMPONENTS
+                })
+        histograms['total'].observe(total_ms)
+        histograms['app'].observe(app_ms)
+        for name in self.COMPONENTS:
+            if name in timing:
+                histograms[name].observe(timing[name])
+
+        counter_key = (endpoint, method, status)
+        with self._lock:
+            self._requests[counter_key] = self._requests.get(counter_key, 0) + 1
+
+    def render(self) -> str:
+        """Prometheus text exposition of the request metrics."""
+        with self._lock:
+            requests = sorted(self._requests.items())
+            histograms = sorted(self._histograms.items())
+
+        lines = ['# HELP http_requests_total HTTP requests by endpoint, method and status.',
+                 '# TYPE http_requests_total counter']
+        for (endpoint, method, status), count in requests:
+            lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+        for name, description in (('total', 'Total request latency'),
+                                  ('app', 'Time spent in Python outside the components below'),
+                                  ('db', 'Time spent executing SQL'),
+                                  ('pool', 'Time spent waiting for a pooled database connection'),
+                                  ('bcrypt', 'Time spent hashing or verifying passwords'),
+                                  ('compress', 'Time spent compressing buffered response bodies')):
+            metric = 'http_request_duration_seconds' if name == 'total' else f'http_request_{name}_seconds'
+            lines.append(f'# HELP {metric} {description}.')
+            lines.append(f'# TYPE {metric} histogram')
+            for (endpoint, method), hists in histograms:
+                lines.extend(histogram_lines(metric, hists[name].snapshot(),
+                                             {'endpoint': endpoint, 'method': method}))
+        return '\n'.join(lines) + '\n'
+
+
+# ---------- Prometheus text helpers for stats() dictionaries ----------
+def _labels(labels: dict, **extra) -> str:
+    merged = dict(labels or {}, **extra)
+    if not merged:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in merged.items()) + '}'
+
+
+def histogram_lines(metric: str, snapshot: dict, labels: dict = None) -> list:
+    """Render a LatencyHistogram.snapshot() as a Prometheus histogram in seconds."""
+    if not snapshot['count']:
+        return []
+    lines = []
+    for bound, count in snapshot['buckets'].items():
+        le = bound if bound == '+Inf' else repr(float(bound) / 1000)
+        lines.append(f'{metric}_bucket{_labels(labels, le=le)} {count}')
+    lines.append(f'{metric}_sum{_labels(labels)} {round(snapshot["sum_ms"] / 1000, 6)}')
+    lines.append(f'{metric}_count{_labels(labels)} {snapshot["count"]}')
+    return lines
+
+
+def stats_lines(prefix: str, stats: dict, counters=()) -> list:
+    """Render a component's stats() dict: numbers become gauges (or counters if their key
+    is listed in counters), nested histogram snapshots become histograms, and *_ms values
+    are converted to seconds. Other values are skipped."""
+    lines = []
+    for key, value in stats.items():
+        kind = 'counter' if key in counters else 'gauge'
+        in_ms = key.endswith('_ms')
+        if in_ms:
+            key = key[:-len('_ms')].replace('_total', '') + '_seconds'
+        metric = f'{prefix}_{key}'
+        if isinstance(value, dict) and 'buckets' in value:
+            lines.append(f'# TYPE {metric} histogram')
+            lines.extend(histogram_lines(metric, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = f'{metric}_total' if kind == 'counter' else metric
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {round(value / 1000, 6) if in_ms else value}')
+    return lines
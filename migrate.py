@@ -0,0 +1,205 @@
+# migrate.py
+"""Apply the versioned SQL files in migrations/ to the database.
+
+    python migrate.py            apply pending migrations
+    python migrate.py --status   list applied and pending migrations
+
+Connects with the same DB_* settings as the app (db.env), so point DB_HOST/DB_PORT at a
+local PostgreSQL to build a test database. Files are named NNNN_description.sql and
+each is applied once, in version order; applied versions are recorded in
+schema_migrations. A file runs in a single transaction unless it uses CONCURRENTLY,
+which PostgreSQL only allows outside one: those run a statement at a time and must be
+safe to re-run, because a failure part-way leaves the earlier statements applied.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Session advisory lock held while migrating, so two deploys can't apply the same file
+MIGRATION_LOCK_KEY = 72150001
+
+_FILENAME = re.compile(r'^(\d{4})_(\w+)\.sql$')
+# Comments, quoted strings, dollar-quoted bodies ($$ ... $$, $fn$ ... $fn$) and statement ends
+_SQL_TOKEN = re.compile(r"--[^\n]*|'(?:[^']|'')*'|(\$\w*\$).*?\1|;", re.DOTALL)
+_CONCURRENT_INDEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)',
+                               re.IGNORECASE)
+
+CREATE_MIGRATIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version    INTEGER PRIMARY KEY,
+        name       TEXT NOT NULL,
+        checksum   TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+"""
+
+
+def split_statements(sql: str) -> list:
+    """Statements in a migration file, without its comments.
+
+    Semicolons inside quoted strings and dollar-quoted function bodies don't end a statement.
+    """
+    statements = []
+    current = []
+    position = 0
+    for match in _SQL_TOKEN.finditer(sql):
+        current.append(sql[position:match.start()])
+        token = match.group(0)
+        if token == ';':
+            statements.append(''.join(current))
+            current = []
+        elif not token.startswith('--'):
+            current.append(token)
+        position = match.end()
+    current.append(sql[position:])
+    statements.append(''.join(current))
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+class Migration:
+    def __init__(self, version: int, name: str, sql: str):
+        self.version = version
+        self.name = name
+        self.checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        self.statements = split_statements(sql)
+        self.transactional = not any(re.search(r'\bCONCURRENTLY\b', s, re.IGNORECASE) for s in self.statements)
+        self.concurrent_indexes = [match.group(1) for s in self.statements for match in _CONCURRENT_INDEX.finditer(s)]
+
+    def __repr__(self):
+        return f'<Migration {self.version:04d}_{self.name}>'
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> list:
+    """The migrations in directory, in version order."""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.sql'):
+            continue
+        match = _FILENAME.match(filename)
+        if not match:
+            raise ValueError(f'Migration file {filename!r} is not named NNNN_description.sql')
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f'Migration version {version:04d} is used twice')
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            migrations[version] = Migration(version, match.group(2), f.read())
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def applied_versions(conn) -> dict:
+    """{version: checksum} for every migration recorded in schema_migrations."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return {}
+        cur.execute("SELECT version, checksum FROM schema_migrations")
+        return dict(cur.fetchall())
+
+
+def migrate(conn, migrations=None, log=print) -> list:
+    """Apply every migration not yet recorded in schema_migrations. Returns the versions applied.
+
+    Leaves conn in autocommit mode.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(CREATE_MIGRATIONS_TABLE_SQL)
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    try:
+        # Read after taking the lock: another runner may have just finished
+        applied = applied_versions(conn)
+        done = []
+        for migration in migrations:
+            if migration.version in applied:
+                if applied[migration.version] != migration.checksum:
+                    log(f"Warning: {migration!r} has changed since it was applied")
+                continue
+            log(f"Applying {migration!r}")
+            apply_migration(conn, migration)
+            done.append(migration.version)
+        return done
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+
+
+def apply_migration(conn, migration: Migration) -> None:
+    record = ("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+              (migration.version, migration.name, migration.checksum))
+    if not migration.transactional:
+        drop_invalid_indexes(conn, migration.concurrent_indexes)
+        with conn.cursor() as cur:
+            for statement in migration.statements:
+                cur.execute(statement)
+            cur.execute(*record)
+        return
+
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            for statement in migration.statements:
+                cur.execute(statement)
+            cur.execute(*record)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+
+def drop_invalid_indexes(conn, names: list) -> None:
+    """Drop what a failed CREATE INDEX CONCURRENTLY left behind.
+
+    The index stays in place, marked invalid, and IF NOT EXISTS would then skip
+    building it again.
+    """
+    if not names:
+        return
+    with conn.cursor() as cur:
+        cur.execute("""
+                    SELECT c.relname
+                    FROM pg_index i
+                             JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE NOT i.indisvalid
+                      AND c.relname = ANY(%s)
+                      AND pg_table_is_visible(i.indrelid)
+                    """, (names,))
+        for (name,) in cur.fetchall():
+            print(f"Dropping invalid index {name} left by an earlier attempt")
+            cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--status', action='store_true', help='list migrations instead of applying them')
+    args = parser.parse_args(argv)
+
+    import psycopg2
+
+    from db_pool import connection_params
+
+    params = connection_params()
+    if params['port'] == 6543:
+        # Session-level advisory locks and CONCURRENTLY need one server connection throughout
+        print("Warning: port 6543 is a transaction-mode pooler; use the direct connection (5432) to migrate")
+    conn = psycopg2.connect(**params)
+    try:
+        if args.status:
+            applied = applied_versions(conn)
+            for migration in load_migrations():
+                print(f"{'applied' if migration.version in applied else 'pending':<9}{migration!r}")
+            return 0
+        done = migrate(conn)
+        print(f"Applied {len(done)} migration(s)" if done else "Database is up to date")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+-- The tables app.py was first written against. Safe to re-run: existing tables are
+-- left alone, so databases created before migrations existed can adopt them as-is.
+
+CREATE TABLE IF NOT EXISTS users (
+    id             SERIAL PRIMARY KEY,
+    email          VARCHAR(255) UNIQUE NOT NULL,
+    username       VARCHAR(100) UNIQUE NOT NULL,
+    password_hash  VARCHAR(255) NOT NULL,
+    otp_code       VARCHAR(6),
+    otp_expires_at TIMESTAMP,
+    is_verified    BOOLEAN   DEFAULT FALSE,
+    created_at     TIMESTAMP DEFAULT NOW(),
+    updated_at     TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS moods (
+    id          SERIAL PRIMARY KEY,
+    mood_name   VARCHAR(50) NOT NULL,
+    mood_emoji  VARCHAR(16),
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS daily_journals (
+    id         SERIAL PRIMARY KEY,
+    user_id    INTEGER REFERENCES users (id) ON DELETE CASCADE,
+    entry_date DATE NOT NULL,
+    mood_id    INTEGER REFERENCES moods (id),
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS journal_entries (
+    id               SERIAL PRIMARY KEY,
+    daily_journal_id INTEGER REFERENCES daily_journals (id) ON DELETE CASCADE,
+    entry_title      VARCHAR(255),
+    entry_content    TEXT,
+    created_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS intentions (
+    id             SERIAL PRIMARY KEY,
+    user_id        INTEGER REFERENCES users (id) ON DELETE CASCADE,
+    intention_text TEXT NOT NULL,
+    for_date       DATE NOT NULL,
+    is_completed   BOOLEAN DEFAULT FALSE,
+    completed_at   TIMESTAMP,
+    created_at     TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS calendar_events (
+    id                SERIAL PRIMARY KEY,
+    user_id           INTEGER REFERENCES users (id) ON DELETE CASCADE,
+    event_title       VARCHAR(255) NOT NULL,
+    event_description TEXT,
+    event_date        DATE NOT NULL,
+    event_time        TIME,
+    created_at        TIMESTAMP DEFAULT NOW(),
+    updated_at        TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id          SERIAL PRIMARY KEY,
+    user_id     INTEGER REFERENCES users (id) ON DELETE CASCADE,
+    title       VARCHAR(255) NOT NULL,
+    description TEXT,
+    event_date  DATE,
+    event_time  TIME,
+    created_at  TIMESTAMP DEFAULT NOW()
+);
+
+INSERT INTO moods (mood_name, mood_emoji, description)
+SELECT *
+FROM (VALUES ('Happy', '😊', 'Feeling good'),
+             ('Calm', '😌', 'Relaxed and at ease'),
+             ('Sad', '😢', 'Feeling down'),
+             ('Anxious', '😰', 'Worried or tense'),
+             ('Angry', '😠', 'Frustrated')) AS seed (mood_name, mood_emoji, description)
+WHERE NOT EXISTS (SELECT 1 FROM moods);
@@ -0,0 +1,17 @@
+-- Full-text search for journal entries (used by GET /api/entries/search).
+-- Titles are weighted 'A' and content 'B' so title matches rank higher.
+-- The column is generated, so every INSERT/UPDATE keeps it in sync without triggers.
+
+ALTER TABLE journal_entries
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(entry_title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(entry_content, '')), 'B')
+        ) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_journal_entries_search_vector
+    ON journal_entries USING GIN (search_vector);
+
+-- Search results are scoped per user through daily_journals.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_daily_journals_user_id
+    ON daily_journals (user_id);
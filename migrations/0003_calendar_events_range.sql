@@ -0,0 +1,4 @@
+-- Serves GET /api/calendar-events date-range queries:
+--   WHERE user_id = $1 AND event_date >= $2 AND event_date < $3 ORDER BY event_date, event_time
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_calendar_events_user_date_time
+    ON calendar_events (user_id, event_date, event_time);
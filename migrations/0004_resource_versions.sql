@@ -0,0 +1,10 @@
+-- Per-user change counters behind the ETags on GET /api/entries, /api/intentions,
+-- /api/events/today and /api/calendar-events. Every mutation of one of those
+-- resources bumps its row in the same transaction, so a GET can answer
+-- If-None-Match with a single primary-key lookup.
+CREATE TABLE IF NOT EXISTS resource_versions (
+    user_id  INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    resource VARCHAR(32) NOT NULL,
+    version  BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, resource)
+);
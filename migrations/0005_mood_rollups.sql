@@ -0,0 +1,43 @@
+-- Mood history for GET /api/moods/trends, maintained by set_today_mood() as moods
+-- change so the endpoint never has to scan daily_journals.
+
+-- Days logged with each mood, per user and per week (Monday start) or month
+CREATE TABLE IF NOT EXISTS mood_rollups (
+    user_id      INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    period       VARCHAR(5) NOT NULL CHECK (period IN ('week', 'month')),
+    period_start DATE NOT NULL,
+    mood_id      INTEGER NOT NULL REFERENCES moods (id),
+    days         INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, period, period_start, mood_id)
+);
+
+-- Runs of consecutive days with a mood logged (both ends inclusive)
+CREATE TABLE IF NOT EXISTS mood_streaks (
+    user_id    INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    start_date DATE NOT NULL,
+    end_date   DATE NOT NULL,
+    PRIMARY KEY (user_id, start_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_mood_streaks_user_end ON mood_streaks (user_id, end_date);
+
+-- One-off backfill from moods logged before the rollups existed. Only runs while the
+-- tables are still empty, so re-running this file does not double count.
+INSERT INTO mood_rollups (user_id, period, period_start, mood_id, days)
+SELECT user_id, period, period_start, mood_id, COUNT(*)
+FROM (SELECT DISTINCT ON (user_id, entry_date) user_id, entry_date, mood_id
+      FROM daily_journals
+      WHERE mood_id IS NOT NULL
+      ORDER BY user_id, entry_date, id) AS logged
+         CROSS JOIN LATERAL (VALUES ('week', date_trunc('week', entry_date)::date),
+                                    ('month', date_trunc('month', entry_date)::date)) AS p (period, period_start)
+WHERE NOT EXISTS (SELECT 1 FROM mood_rollups)
+GROUP BY user_id, period, period_start, mood_id;
+
+INSERT INTO mood_streaks (user_id, start_date, end_date)
+SELECT user_id, MIN(entry_date), MAX(entry_date)
+FROM (SELECT user_id, entry_date,
+             entry_date - (ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY entry_date))::int AS island
+      FROM (SELECT DISTINCT user_id, entry_date FROM daily_journals WHERE mood_id IS NOT NULL) AS days) AS numbered
+WHERE NOT EXISTS (SELECT 1 FROM mood_streaks)
+GROUP BY user_id, island;
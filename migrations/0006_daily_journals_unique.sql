@@ -0,0 +1,42 @@
+-- One daily_journals row per user and day. create_entry(), set_today_mood() and the
+-- bulk import upsert with INSERT ... ON CONFLICT (user_id, entry_date), which needs
+-- this unique index. Earlier SELECT-then-INSERT code could race and leave duplicates,
+-- so merge those into the oldest row for the day first.
+
+-- Move entries from duplicate rows onto the row being kept
+UPDATE journal_entries je
+SET daily_journal_id = keep.id
+FROM daily_journals dup
+         JOIN LATERAL (SELECT MIN(id) AS id
+                       FROM daily_journals
+                       WHERE user_id = dup.user_id
+                         AND entry_date = dup.entry_date) AS keep ON keep.id <> dup.id
+WHERE je.daily_journal_id = dup.id;
+
+-- Keep the most recently written mood for the day
+UPDATE daily_journals keep
+SET mood_id = latest.mood_id
+FROM (SELECT DISTINCT ON (user_id, entry_date) user_id, entry_date, mood_id
+      FROM daily_journals
+      WHERE mood_id IS NOT NULL
+      ORDER BY user_id, entry_date, id DESC) AS latest
+WHERE keep.user_id = latest.user_id
+  AND keep.entry_date = latest.entry_date
+  AND keep.id = (SELECT MIN(id)
+                 FROM daily_journals
+                 WHERE user_id = keep.user_id
+                   AND entry_date = keep.entry_date)
+  AND keep.mood_id IS DISTINCT FROM latest.mood_id;
+
+DELETE
+FROM daily_journals dup
+    USING daily_journals keep
+WHERE keep.user_id = dup.user_id
+  AND keep.entry_date = dup.entry_date
+  AND keep.id < dup.id;
+
+-- This also serves lookups by user_id alone, making idx_daily_journals_user_id redundant.
+-- A duplicate day written while it builds makes it fail; migrate.py drops the invalid
+-- index left behind, and running the migration again merges that day and retries.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_daily_journals_user_date
+    ON daily_journals (user_id, entry_date);
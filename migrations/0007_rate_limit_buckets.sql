@@ -0,0 +1,9 @@
+-- Shared token buckets for rate_limit.PostgresBuckets (RATE_LIMIT_BACKEND=postgres).
+-- full_at is the epoch time the bucket will be full again; rows past it carry no
+-- state and are swept periodically. UNLOGGED: losing the buckets in a crash only
+-- resets the limits, and skipping the WAL keeps the per-request upsert cheap.
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets
+(
+    bucket_key TEXT PRIMARY KEY,
+    full_at    DOUBLE PRECISION NOT NULL
+);
@@ -0,0 +1,9 @@
+-- Durable copy of otp_store.OTPStore (OTP_STORE_BACKEND=postgres), written behind in
+-- batches. Keeps short-lived codes off the users table, which only changes once a
+-- code is verified.
+CREATE TABLE IF NOT EXISTS otp_codes
+(
+    otp_key    VARCHAR(255) PRIMARY KEY,
+    code       VARCHAR(6)  NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
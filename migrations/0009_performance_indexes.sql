@@ -0,0 +1,20 @@
+-- Indexes for the per-user lookups on every hot path. Foreign keys get no index of their
+-- own in PostgreSQL, so without these each of those queries (and every ON DELETE CASCADE
+-- from users or daily_journals) scans the whole table.
+-- daily_journals (user_id, entry_date) is uq_daily_journals_user_date (0006) and
+-- calendar_events (user_id, event_date) is served by idx_calendar_events_user_date_time (0003).
+
+-- GET /api/entries: each of a user's daily journals, entries newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_journal_entries_journal_created
+    ON journal_entries (daily_journal_id, created_at);
+
+-- /api/events/today and GET /api/journal/today, ordered by event_time
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_user_date_time
+    ON events (user_id, event_date, event_time);
+
+-- /api/intentions and GET /api/journal/today
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_intentions_user_date
+    ON intentions (user_id, for_date);
+
+-- Every lookup by user_id alone is served by uq_daily_journals_user_date
+DROP INDEX CONCURRENTLY IF EXISTS idx_daily_journals_user_id;
@@ -0,0 +1,174 @@
+-- Change log behind GET /api/sync. Every insert, update or delete of an entry,
+-- intention, calendar event, event or day's mood takes the next number from the
+-- owner's sync_cursors row and stamps it on that item's sync_changes row, so a client
+-- holding cursor N asks for "seq > N" and gets each changed item once, deletions as
+-- tombstones. Statement-level triggers keep it current for every write path (the API,
+-- COPY imports, the benchmark seeding), one log write per statement rather than per row.
+
+-- Last change number handed out per user. Writers for the same user serialize on this
+-- row until they commit, so numbers become visible in order and a cursor never skips one.
+CREATE TABLE IF NOT EXISTS sync_cursors (
+    user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+    seq     BIGINT NOT NULL DEFAULT 0
+);
+
+-- Latest change to each item; resource is entries, intentions, calendar_events, events or moods
+CREATE TABLE IF NOT EXISTS sync_changes (
+    user_id  INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    resource VARCHAR(32) NOT NULL,
+    item_id  INTEGER NOT NULL,
+    seq      BIGINT NOT NULL,
+    deleted  BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (user_id, resource, item_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_changes_user_seq ON sync_changes (user_id, seq);
+
+-- Numbers a batch of changed items per user and upserts their sync_changes rows.
+-- Rows without a user, or whose user is being deleted (cascades), are skipped.
+CREATE OR REPLACE FUNCTION record_sync_changes(p_resource TEXT, p_user_ids INTEGER[], p_item_ids INTEGER[],
+                                               p_deleted BOOLEAN[]) RETURNS VOID
+    LANGUAGE sql AS $$
+    WITH changed AS (SELECT c.user_id, c.item_id, c.deleted,
+                            ROW_NUMBER() OVER (PARTITION BY c.user_id ORDER BY c.item_id) AS n,
+                            COUNT(*) OVER (PARTITION BY c.user_id)                        AS total
+                     FROM unnest(p_user_ids, p_item_ids, p_deleted) AS c (user_id, item_id, deleted)
+                     WHERE c.user_id IS NOT NULL
+                       AND EXISTS (SELECT 1 FROM users u WHERE u.id = c.user_id)),
+         cursors AS (INSERT INTO sync_cursors AS s (user_id, seq)
+             SELECT user_id, COUNT(*) FROM changed GROUP BY user_id
+             ON CONFLICT (user_id) DO UPDATE SET seq = s.seq + EXCLUDED.seq
+             RETURNING s.user_id, s.seq)
+    INSERT INTO sync_changes AS sc (user_id, resource, item_id, seq, deleted)
+    SELECT c.user_id, p_resource, c.item_id, cur.seq - c.total + c.n, c.deleted
+    FROM changed c
+             JOIN cursors cur ON cur.user_id = c.user_id
+    ON CONFLICT (user_id, resource, item_id) DO UPDATE SET seq = EXCLUDED.seq, deleted = EXCLUDED.deleted
+$$;
+
+-- intentions, calendar_events and events: TG_ARGV[0] is the resource name
+CREATE OR REPLACE FUNCTION sync_user_rows() RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM record_sync_changes(TG_ARGV[0], array_agg(user_id), array_agg(id), array_agg(TRUE)) FROM old_rows;
+    ELSE
+        PERFORM record_sync_changes(TG_ARGV[0], array_agg(user_id), array_agg(id), array_agg(FALSE)) FROM new_rows;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- journal_entries: the owner is on the entry's daily_journals row
+CREATE OR REPLACE FUNCTION sync_journal_entries() RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM record_sync_changes('entries', array_agg(dj.user_id), array_agg(r.id), array_agg(TRUE))
+        FROM old_rows r
+                 LEFT JOIN daily_journals dj ON dj.id = r.daily_journal_id;
+    ELSE
+        PERFORM record_sync_changes('entries', array_agg(dj.user_id), array_agg(r.id), array_agg(FALSE))
+        FROM new_rows r
+                 LEFT JOIN daily_journals dj ON dj.id = r.daily_journal_id;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- daily_journals: only mood changes count; clearing a mood is a deletion
+CREATE OR REPLACE FUNCTION sync_moods() RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM record_sync_changes('moods', array_agg(user_id), array_agg(id), array_agg(FALSE))
+        FROM new_rows
+        WHERE mood_id IS NOT NULL;
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM record_sync_changes('moods', array_agg(n.user_id), array_agg(n.id), array_agg(n.mood_id IS NULL))
+        FROM new_rows n
+                 JOIN old_rows o ON o.id = n.id
+        WHERE n.mood_id IS DISTINCT FROM o.mood_id;
+    ELSE
+        PERFORM record_sync_changes('moods', array_agg(user_id), array_agg(id), array_agg(TRUE))
+        FROM old_rows
+        WHERE mood_id IS NOT NULL;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- Transition tables allow one event per trigger, hence three per table
+DROP TRIGGER IF EXISTS sync_insert ON journal_entries;
+CREATE TRIGGER sync_insert AFTER INSERT ON journal_entries REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_journal_entries();
+DROP TRIGGER IF EXISTS sync_update ON journal_entries;
+CREATE TRIGGER sync_update AFTER UPDATE ON journal_entries REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_journal_entries();
+DROP TRIGGER IF EXISTS sync_delete ON journal_entries;
+CREATE TRIGGER sync_delete AFTER DELETE ON journal_entries REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_journal_entries();
+
+DROP TRIGGER IF EXISTS sync_insert ON daily_journals;
+CREATE TRIGGER sync_insert AFTER INSERT ON daily_journals REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_moods();
+DROP TRIGGER IF EXISTS sync_update ON daily_journals;
+CREATE TRIGGER sync_update AFTER UPDATE ON daily_journals REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_moods();
+DROP TRIGGER IF EXISTS sync_delete ON daily_journals;
+CREATE TRIGGER sync_delete AFTER DELETE ON daily_journals REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_moods();
+
+DROP TRIGGER IF EXISTS sync_insert ON intentions;
+CREATE TRIGGER sync_insert AFTER INSERT ON intentions REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_rows('intentions');
+DROP TRIGGER IF EXISTS sync_update ON intentions;
+CREATE TRIGGER sync_update AFTER UPDATE ON intentions REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_rows('intentions');
+DROP TRIGGER IF EXISTS sync_delete ON intentions;
+CREATE TRIGGER sync_delete AFTER DELETE ON intentions REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_rows('intentions');
+
+DROP TRIGGER IF EXISTS sync_insert ON calendar_events;
+CREATE TRIGGER sync_insert AFTER INSERT ON calendar_events REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_rows('calendar_events');
+DROP TRIGGER IF EXISTS sync_update ON calendar_events;
+CREATE TRIGGER sync_update AFTER UPDATE ON calendar_events REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_rows('calendar_events');
+DROP TRIGGER IF EXISTS sync_delete ON calendar_events;
+CREATE TRIGGER sync_delete AFTER DELETE ON calendar_events REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_rows('calendar_events');
+
+DROP TRIGGER IF EXISTS sync_insert ON events;
+CREATE TRIGGER sync_insert AFTER INSERT ON events REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_rows('events');
+DROP TRIGGER IF EXISTS sync_update ON events;
+CREATE TRIGGER sync_update AFTER UPDATE ON events REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_rows('events');
+DROP TRIGGER IF EXISTS sync_delete ON events;
+CREATE TRIGGER sync_delete AFTER DELETE ON events REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_user_rows('events');
+
+-- One-off backfill of everything that existed before the log, numbered per user. Only
+-- runs while the log is still empty, so re-running this file does not renumber.
+INSERT INTO sync_changes (user_id, resource, item_id, seq)
+SELECT user_id, resource, item_id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY resource, item_id)
+FROM (SELECT dj.user_id, 'entries' AS resource, je.id AS item_id
+      FROM journal_entries je
+               JOIN daily_journals dj ON dj.id = je.daily_journal_id
+      UNION ALL
+      SELECT user_id, 'moods', id FROM daily_journals WHERE mood_id IS NOT NULL
+      UNION ALL
+      SELECT user_id, 'intentions', id FROM intentions
+      UNION ALL
+      SELECT user_id, 'calendar_events', id FROM calendar_events
+      UNION ALL
+      SELECT user_id, 'events', id FROM events) AS items
+WHERE user_id IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM sync_changes);
+
+INSERT INTO sync_cursors (user_id, seq)
+SELECT user_id, MAX(seq)
+FROM sync_changes
+GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
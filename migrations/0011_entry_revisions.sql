@@ -0,0 +1,12 @@
+-- Edit history for PUT /api/entries/<id>, written by entry_revisions.record_revision().
+-- data is a zlib-compressed snapshot of the entry when is_snapshot, otherwise a delta
+-- against the previous revision. Entries that were never edited have no rows; their
+-- first edit stores the original as revision 1.
+CREATE TABLE IF NOT EXISTS entry_revisions (
+    entry_id    INTEGER NOT NULL REFERENCES journal_entries (id) ON DELETE CASCADE,
+    revision    INTEGER NOT NULL,
+    is_snapshot BOOLEAN NOT NULL,
+    data        BYTEA NOT NULL,
+    created_at  TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (entry_id, revision)
+);
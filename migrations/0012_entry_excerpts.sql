@@ -0,0 +1,22 @@
+-- Preview columns for entry listings (GET /api/entries), so a page of entries never has
+-- to read, or detoast, the full entry_content. Like search_vector they are generated, so
+-- every write path (create, update, COPY import) keeps them current without triggers.
+-- Adding a stored generated column rewrites the table once, under an exclusive lock.
+
+-- Whitespace collapsed to single spaces; one character longer than
+-- ENTRY_EXCERPT_LENGTH in app.py so the listing can tell whether it was cut short
+ALTER TABLE journal_entries
+    ADD COLUMN IF NOT EXISTS entry_excerpt VARCHAR(201)
+        GENERATED ALWAYS AS (
+            left(btrim(regexp_replace(coalesce(entry_content, ''), '\s+', ' ', 'g')), 201)
+        ) STORED;
+
+ALTER TABLE journal_entries
+    ADD COLUMN IF NOT EXISTS word_count INTEGER
+        GENERATED ALWAYS AS (
+            CASE
+                WHEN entry_content ~ '\S'
+                    THEN array_length(regexp_split_to_array(regexp_replace(entry_content, '^\s+|\s+$', '', 'g'), '\s+'), 1)
+                ELSE 0
+                END
+        ) STORED;
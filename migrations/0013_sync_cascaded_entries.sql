@@ -0,0 +1,20 @@
+-- Tombstones for entries removed by the ON DELETE CASCADE from daily_journals. The
+-- cascade deletes them after their day is gone, so sync_journal_entries() (0010) finds
+-- no owner for them and skips them. This runs per day, before the day is deleted, while
+-- the entries can still be found. Days deleted along with their user are skipped early:
+-- record_sync_changes() would drop those changes anyway.
+CREATE OR REPLACE FUNCTION sync_day_entries() RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM users WHERE id = OLD.user_id) THEN
+        PERFORM record_sync_changes('entries', array_agg(OLD.user_id), array_agg(je.id), array_agg(TRUE))
+        FROM journal_entries je
+        WHERE je.daily_journal_id = OLD.id;
+    END IF;
+    RETURN OLD;
+END
+$$;
+
+DROP TRIGGER IF EXISTS sync_delete_entries ON daily_journals;
+CREATE TRIGGER sync_delete_entries BEFORE DELETE ON daily_journals
+    FOR EACH ROW EXECUTE FUNCTION sync_day_entries();
@@ -0,0 +1,166 @@
+# mood_trends.py
+from datetime import date, timedelta
+
+from queries import named_query
+
+# Rollup granularities kept in mood_rollups (see migrations/0005_mood_rollups.sql)
+PERIODS = ('week', 'month')
+TRENDS_DEFAULT_BUCKETS = 12
+TRENDS_MAX_BUCKETS = 520
+
+
+def period_start(day: date, period: str) -> date:
+    """First day of the week (Monday) or month containing day"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period(start: date, period: str) -> date:
+    if period == 'week':
+        return start + timedelta(days=7)
+    return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def previous_period(start: date, period: str) -> date:
+    if period == 'week':
+        return start - timedelta(days=7)
+    return date(start.year - (start.month == 1), (start.month - 2) % 12 + 1, 1)
+
+
+def trend_range(args, today: date):
+    """Work out (period, first_bucket, end) for a trends request.
+
+    start/end are optional dates with end exclusive; start is widened to the beginning
+    of its week or month because rollups only exist for whole periods. Raises
+    ValueError for unknown periods, bad dates and ranges with too many buckets.
+    """
+    period = args.get('period', 'week')
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+
+    end = date.fromisoformat(args['end']) if args.get('end') else today + timedelta(days=1)
+    if args.get('start'):
+        first = period_start(date.fromisoformat(args['start']), period)
+    else:
+        first = period_start(end - timedelta(days=1), period)
+        for _ in range(TRENDS_DEFAULT_BUCKETS - 1):
+            first = previous_period(first, period)
+    if end <= first:
+        raise ValueError('end must be after start')
+
+    buckets = 0
+    current = first
+    while current < end:
+        buckets += 1
+        if buckets > TRENDS_MAX_BUCKETS:
+            raise ValueError(f'Range covers more than {TRENDS_MAX_BUCKETS} {period}s')
+        current = next_period(current, period)
+    return period, first, end
+
+
+# Finds or creates the day's daily_journals row and locks it until the transaction ends,
+# returning the mood it has now. ON CONFLICT DO UPDATE waits for, and then reads, the
+# latest committed version of the row, so a concurrent mood change for the same day is
+# seen rather than the one in this statement's snapshot.
+LOCK_DAY_SQL = named_query('lock_day', """
+    INSERT INTO daily_journals (user_id, entry_date)
+    VALUES (%(user_id)s, %(day)s)
+    -- no-op update so RETURNING also yields (and locks) an existing row
+    ON CONFLICT (user_id, entry_date) DO UPDATE SET entry_date = EXCLUDED.entry_date
+    RETURNING id, mood_id
+""")
+
+# Sets the mood on the row LOCK_DAY_SQL locked and applies the change to the rollups.
+# When the mood changes, the day moves from the old mood's week and month buckets to
+# the new one's; when the day had no mood yet, it also extends the streak that ended
+# the day before or starts a new one.
+SET_MOOD_SQL = named_query('set_mood', """
+    WITH journal AS (
+             UPDATE daily_journals
+                 SET mood_id = %(mood_id)s
+                 WHERE id = %(journal_id)s
+                 RETURNING id),
+         change AS (SELECT %(old_mood_id)s::int AS old_mood_id
+                    WHERE %(old_mood_id)s::int IS DISTINCT FROM %(mood_id)s),
+         periods (period, period_start) AS (VALUES ('week', %(week)s::date), ('month', %(month)s::date)),
+         decremented AS (
+             UPDATE mood_rollups r
+                 SET days = r.days - 1
+                 FROM change, periods p
+                 WHERE r.user_id = %(user_id)s
+                     AND r.period = p.period
+                     AND r.period_start = p.period_start
+                     AND r.mood_id = change.old_mood_id),
+         incremented AS (
+             INSERT INTO mood_rollups (user_id, period, period_start, mood_id, days)
+                 SELECT %(user_id)s, p.period, p.period_start, %(mood_id)s, 1
+                 FROM change, periods p
+                 ON CONFLICT (user_id, period, period_start, mood_id)
+                     DO UPDATE SET days = mood_rollups.days + 1),
+         extended AS (
+             UPDATE mood_streaks
+                 SET end_date = %(day)s
+                 WHERE user_id = %(user_id)s
+                     AND end_date = %(day)s::date - 1
+                     AND EXISTS (SELECT 1 FROM change WHERE old_mood_id IS NULL)
+                 RETURNING start_date),
+         started AS (
+             INSERT INTO mood_streaks (user_id, start_date, end_date)
+                 SELECT %(user_id)s, %(day)s, %(day)s
+                 WHERE EXISTS (SELECT 1 FROM change WHERE old_mood_id IS NULL)
+                   AND NOT EXISTS (SELECT 1 FROM extended)
+                 ON CONFLICT (user_id, start_date) DO NOTHING)
+    SELECT id
+    FROM journal
+""")
+
+
+def set_mood_params(user_id: int, day: date, mood_id: int, journal) -> dict:
+    """Query parameters for SET_MOOD_SQL, given the (id, mood_id) row from LOCK_DAY_SQL."""
+    journal_id, old_mood_id = (journal['id'], journal['mood_id']) if isinstance(journal, dict) else journal
+    return {
+        'user_id': user_id,
+        'day': day,
+        'mood_id': mood_id,
+        'journal_id': journal_id,
+        'old_mood_id': old_mood_id,
+        'week': period_start(day, 'week'),
+        'month': period_start(day, 'month'),
+    }
+
+
+def set_mood(cur, user_id: int, day: date, mood_id: int) -> int:
+    """Record a day's mood and update the rollups. Returns the daily_journals id.
+
+    Must run inside a transaction (not autocommit), which the caller commits: the day's
+    row stays locked until then, so concurrent changes to the same day apply one after
+    the other and each moves the rollups from the mood the other one set. Needs the
+    unique (user_id, entry_date) index from migrations/0006_daily_journals_unique.sql.
+    """
+    cur.execute(LOCK_DAY_SQL, {'user_id': user_id, 'day': day})
+    journal = cur.fetchone()
+    cur.execute(SET_MOOD_SQL, set_mood_params(user_id, day, mood_id, journal))
+    row = cur.fetchone()
+    return row['id'] if isinstance(row, dict) else row[0]
+
+
+def summarize_streaks(runs, first: date, end: date, today: date) -> dict:
+    """Longest run of logged days inside [first, end) and the run still going today.
+
+    runs are (start_date, end_date) pairs, both inclusive. A streak that last logged
+    yesterday still counts as current, since today can still be logged.
+    """
+    longest = None
+    current = 0
+    for run_start, run_end in runs:
+        if run_end >= today - timedelta(days=1) and run_start <= today:
+            current = (min(run_end, today) - run_start).days + 1
+        clipped_start = max(run_start, first)
+        clipped_end = min(run_end, end - timedelta(days=1))
+        if clipped_end < clipped_start:
+            continue
+        length = (clipped_end - clipped_start).days + 1
+        if longest is None or length > longest['days']:
+            longest = {'days': length, 'start': clipped_start.isoformat(), 'end': clipped_end.isoformat()}
+    return {'current': current, 'longest': longest or {'days': 0, 'start': None, 'end': None}}
@@ -0,0 +1,297 @@
+# otp_store.py
+import atexit
+import heapq
+import hmac
+import os
+import threading
+import time
+from datetime import datetime
+
+from psycopg2.extras import execute_values
+
+from db_pool import db_connection
+
+OTP_TTL_SECONDS = 600
+# 'postgres' also writes codes behind to the otp_codes table (migrations/0008_otp_codes.sql)
+# so other workers and restarts can see them. 'memory' keeps them in this process only,
+# which is only safe for a single-process dev server: a code issued by one worker would
+# be rejected by every other.
+OTP_STORE_BACKEND = os.getenv('OTP_STORE_BACKEND', 'postgres')
+OTP_FLUSH_INTERVAL = float(os.getenv('OTP_FLUSH_INTERVAL', 0.5))
+
+
+class PostgresOTPBackend:
+    """Durable copy of the OTP store in otp_codes, written behind by a background thread.
+
+    Issued and discarded codes are coalesced per key and flushed in one transaction
+    every flush_interval seconds. Consuming a code is the one synchronous write: it
+    must not succeed on two workers. A code only reaches other workers once flushed,
+    up to flush_interval after it was issued; it goes out by email first, so it is in
+    the table well before anyone can type it in.
+    """
+
+    def __init__(self, flush_interval: float = 0.5):
+        self.flush_interval = flush_interval
+        self._pending = {}  # key -> (code, expires_at), or None to delete
+        self._lock = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+
+    def save(self, key: str, code: str, expires_at: float) -> None:
+        self._write_behind(key, (code, expires_at))
+
+    def delete(self, key: str) -> None:
+        self._write_behind(key, None)
+
+    def load(self, key: str):
+        """(code, expires_at) for key from the table, or None."""
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                        SELECT code, EXTRACT(EPOCH FROM expires_at)
+                        FROM otp_codes
+                        WHERE otp_key = %s AND expires_at > NOW()
+                        """, (key,))
+            row = cur.fetchone()
+        return (row[0], float(row[1])) if row else None
+
+    def consume(self, key: str, code: str) -> bool:
+        """Delete key's code if it is still code; True if this call removed it."""
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None and hmac.compare_digest(pending[0], code):
+                # Issued here and not flushed yet: nothing else can have seen it
+                self._pending[key] = None
+                self._lock.notify()
+                return True
+        with db_connection(autocommit=True) as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM otp_codes WHERE otp_key = %s AND code = %s AND expires_at > NOW()",
+                        (key, code))
+            return cur.rowcount == 1
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        upserts = [(key, *entry) for key, entry in batch.items() if entry is not None]
+        deletes = [key for key, entry in batch.items() if entry is None]
+        try:
+            with db_connection() as conn, conn.cursor() as cur:
+                if upserts:
+                    execute_values(cur, """
+                                        INSERT INTO otp_codes (otp_key, code, expires_at)
+                                        VALUES %s
+                                        ON CONFLICT (otp_key) DO UPDATE
+                                            SET code = EXCLUDED.code, expires_at = EXCLUDED.expires_at
+                                        """, upserts, template='(%s, %s, TO_TIMESTAMP(%s))')
+                if deletes:
+                    cur.execute("DELETE FROM otp_codes WHERE otp_key = ANY(%s)", (deletes,))
+                cur.execute("DELETE FROM otp_codes WHERE expires_at < NOW()")
+                conn.commit()
+            self.flushes += 1
+            self.rows_written += len(batch)
+        except Exception as e:
+            self.errors += 1
+            print(f"OTP write-behind failed, retrying: {e}")
+            with self._lock:
+                # Keep anything written since, then retry on the next tick
+                for key, entry in batch.items():
+                    self._pending.setdefault(key, entry)
+
+    def close(self) -> None:
+        with self._lock:
+            self._stopping = True
+            self._lock.notify()
+        if self._thread is not None:
+            self._thread.join(10)
+        self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _write_behind(self, key, entry) -> None:
+        self._ensure_started()
+        with self._lock:
+            self._pending[key] = entry
+            self._lock.notify()
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # First use, or first use after a fork: threads do not survive fork()
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='otp-write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._pending and not self._stopping:
+                    self._lock.wait()
+                if self._stopping:
+                    return
+            # Let a few more writes pile up so they go out together
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+def _matches(entry, code) -> bool:
+    return hmac.compare_digest(entry[0].encode(), str(code).encode())
+
+
+class OTPStore:
+    """Short-lived one-time codes kept in memory, with an optional durable backend.
+
+    Checking a code is a dict lookup. Codes expire after their TTL and are removed
+    lazily, in expiry order, from a heap. With a backend, a code missing from memory
+    (issued by another worker, or before a restart) is looked up there, and so is one
+    that doesn't match: a resend on another worker replaces the code there, not here.
+    """
+
+    def __init__(self, backend=None, clock=time.time):
+        self.backend = backend
+        self._clock = clock
+        self._codes = {}  # key -> (code, expires_at)
+        self._expiry = []  # heap of (expires_at, key); stale after a reissue
+        self._lock = threading.Lock()
+        self._issued = 0
+        self._verified = 0
+        self._rejected = 0
+        self._expired = 0
+        self._loaded = 0
+
+    def issue(self, key: str, code: str, ttl: float = OTP_TTL_SECONDS) -> None:
+        """Store key's code for ttl seconds, replacing any earlier one."""
+        expires_at = self._clock() + ttl
+        with self._lock:
+            self._expire()
+            self._codes[key] = (code, expires_at)
+            heapq.heappush(self._expiry, (expires_at, key))
+            self._issued += 1
+        if self.backend is not None:
+            self.backend.save(key, code, expires_at)
+
+    def peek(self, key: str):
+        """(code, expires_at as a datetime) for key, or None if it has none."""
+        entry = self._get(key)
+        return (entry[0], datetime.fromtimestamp(entry[1])) if entry else None
+
+    def verify(self, key: str, code: str) -> bool:
+        """Check code against key's; a matching code is used up."""
+        entry = self._get(key)
+        if self.backend is not None and code and entry is not None and not _matches(entry, code):
+            entry = self._reload(key, entry)
+        if entry is None or not code or not _matches(entry, code):
+            with self._lock:
+                self._rejected += 1
+            return False
+        with self._lock:
+            if self._codes.get(key) != entry:
+                # Consumed or replaced by a concurrent request
+                self._rejected += 1
+                return False
+            del self._codes[key]
+        if self.backend is not None and not self.backend.consume(key, entry[0]):
+            # Already used on another worker
+            with self._lock:
+                self._rejected += 1
+            return False
+        with self._lock:
+            self._verified += 1
+        return True
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._codes.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire()
+            stats = {
+                'live': len(self._codes),
+                'issued': self._issued,
+                'verified': self._verified,
+                'rejected': self._rejected,
+                'expired': self._expired,
+                'loaded': self._loaded,
+            }
+        if self.backend is not None:
+            stats.update({
+                'write_behind_pending': self.backend.pending(),
+                'write_behind_flushes': self.backend.flushes,
+                'write_behind_rows': self.backend.rows_written,
+                'write_behind_errors': self.backend.errors,
+            })
+        return stats
+
+    def _get(self, key: str):
+        with self._lock:
+            self._expire()
+            entry = self._codes.get(key)
+        if entry is not None or self.backend is None:
+            return entry
+        entry = self.backend.load(key)
+        if entry is None:
+            return None
+        with self._lock:
+            if key not in self._codes:
+                self._codes[key] = entry
+                heapq.heappush(self._expiry, (entry[1], key))
+                self._loaded += 1
+            return self._codes[key]
+
+    def _reload(self, key: str, cached):
+        """key's entry after checking the backend for a code issued since cached."""
+        entry = self.backend.load(key)
+        with self._lock:
+            current = self._codes.get(key)
+            if entry is None or current != cached or entry[1] <= cached[1]:
+                # Nothing newer there: a code issued here may not be flushed yet
+                return current
+            self._codes[key] = entry
+            heapq.heappush(self._expiry, (entry[1], key))
+            self._loaded += 1
+            return entry
+
+    def _expire(self) -> None:
+        """Drop codes past their expiry. Call with the lock held."""
+        now = self._clock()
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            entry = self._codes.get(key)
+            if entry is not None and entry[1] == expires_at:
+                del self._codes[key]
+                self._expired += 1
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_otp_store() -> OTPStore:
+    """Return the process-wide OTP store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = None
+                if OTP_STORE_BACKEND != 'memory':
+                    backend = PostgresOTPBackend(flush_interval=OTP_FLUSH_INTERVAL)
+                    atexit.register(backend.close)
+                _store = OTPStore(backend)
+    return _store
+
+
+def otp_store_stats() -> dict:
+    return get_otp_store().stats()
@@ -1,15 +1,164 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import bcrypt
 
+from metrics import LatencyHistogram, record_timing
+
+
+class PasswordManagerBusy(Exception):
+    """Raised when too many hash/verify calls are already waiting for the bcrypt pool."""
+
+
+def _timed_hashpw(password: bytes, rounds: int, submitted_at: float):
+    started_at = time.time()
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)), started_at - submitted_at
+
+
+def _timed_checkpw(password: bytes, hashed: bytes, submitted_at: float):
+    started_at = time.time()
+    return bcrypt.checkpw(password, hashed), started_at - submitted_at
+
 
 class PasswordManager:
-    "This class handles password hashing and verification using bcrypt."
+    """This class handles password hashing and verification using bcrypt.
+
+    By default bcrypt runs inline on the calling thread. With mode='thread' or
+    mode='process' the work runs on a bounded pool of ``workers``; at most
+    ``max_pending`` calls may be queued or running at once, and callers wait at
+    most ``queue_timeout`` seconds for a slot before PasswordManagerBusy is raised.
+    """
 
-    def __init__(self, rounds: int = 12):
+    MODES = ('inline', 'thread', 'process')
+
+    def __init__(self, rounds: int = 12, mode: str = 'inline', workers: int = None, max_pending: int = None,
+                 queue_timeout: float = 5.0):
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}")
         self.rounds = rounds
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.queue_timeout = queue_timeout
+
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+        self._rehashed = 0
+        self._queue_time = LatencyHistogram()
+        self._hash_time = LatencyHistogram()
 
     def hash_password(self, plain_text_password: str) -> str:
-        hashed = bcrypt.hashpw(plain_text_password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+        hashed = self._run(_timed_hashpw, plain_text_password.encode('utf-8'), self.rounds)
         return hashed.decode('utf-8')
 
     def verify_password(self, plain_text_password: str, hashed_password: str) -> bool:
-        return bcrypt.checkpw(plain_text_password.encode('utf-8'), hashed_password.encode('utf-8'))
\ No newline at end of file
+        return self._run(_timed_checkpw, plain_text_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+    # ---------- cost management ----------
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """True when a stored hash was made with a different cost than the current target."""
+        try:
+            return int(hashed_password.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def verify_and_update(self, plain_text_password: str, hashed_password: str):
+        """Verify a password and, if its stored cost is stale, produce a replacement hash.
+
+        Returns (is_valid, new_hash); new_hash is None unless the caller should store it.
+        """
+        if not self.verify_password(plain_text_password, hashed_password):
+            return False, None
+        if not self.needs_rehash(hashed_password):
+            return True, None
+        new_hash = self.hash_password(plain_text_password)
+        with self._stats_lock:
+            self._rehashed += 1
+        return True, new_hash
+
+    def calibrate(self, target_ms: float = 250.0, min_rounds: int = 10, max_rounds: int = 16,
+                  sample_rounds: int = 8, samples: int = 3) -> int:
+        """Pick the bcrypt cost whose hash time is closest to target_ms on this machine.
+
+        Each extra round doubles the work, so one cheap measurement at sample_rounds is
+        extrapolated instead of timing every candidate cost. Sets and returns self.rounds.
+        """
+        password = b'calibration-password'
+        best = None
+        for _ in range(samples):
+            start = time.perf_counter()
+            bcrypt.hashpw(password, bcrypt.gensalt(sample_rounds))
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+
+        rounds = sample_rounds + round(math.log2(target_ms / max(best, 0.001)))
+        self.rounds = max(min_rounds, min(max_rounds, rounds))
+        return self.rounds
+
+    # ---------- execution ----------
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = {
+                'mode': self.mode,
+                'rounds': self.rounds,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'in_flight': self._in_flight,
+                'rejected': self._rejected,
+                'rehashed': self._rehashed,
+            }
+        stats['queue_time_ms'] = self._queue_time.snapshot()
+        stats['bcrypt_time_ms'] = self._hash_time.snapshot()
+        return stats
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _run(self, func, *args):
+        if self.mode == 'inline':
+            start = time.perf_counter()
+            result, _ = func(*args, time.time())
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._hash_time.observe(elapsed_ms)
+            record_timing('bcrypt', elapsed_ms)
+            return result
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._stats_lock:
+                self._rejected += 1
+            raise PasswordManagerBusy("Too many password checks in progress, please try again")
+        try:
+            with self._stats_lock:
+                self._in_flight += 1
+            submitted = time.perf_counter()
+            result, queued_for = self._get_executor().submit(func, *args, time.time()).result()
+            total_ms = (time.perf_counter() - submitted) * 1000
+            queued_ms = max(0.0, queued_for * 1000)
+            self._queue_time.observe(queued_ms)
+            self._hash_time.observe(max(0.0, total_ms - queued_ms))
+            record_timing('bcrypt', total_ms)
+            return result
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # bcrypt releases the GIL while hashing, so threads already run in parallel;
+                    # processes additionally isolate the work from the web worker's interpreter.
+                    executor_class = ProcessPoolExecutor if self.mode == 'process' else ThreadPoolExecutor
+                    self._executor = executor_class(max_workers=self.workers)
+        return self._executor
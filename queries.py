@@ -0,0 +1,84 @@
+# queries.py
+import os
+import re
+import threading
+
+from metrics import LatencyHistogram
+
+# 'on' prepares each named query once per pooled connection and from then on sends
+# only EXECUTE name(args), so Postgres skips parsing and planning. 'off' sends the SQL
+# text every time, which is what works behind a transaction-mode pooler (Supabase's
+# :6543, PgBouncer pool_mode=transaction): each transaction may run on a different
+# server connection, where the statement was never prepared. 'auto' is 'off' on 6543.
+DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'auto')
+
+_PLACEHOLDER = re.compile(r'%%|%\((\w+)\)s|%s')
+
+
+def prepared_statements_enabled() -> bool:
+    if DB_PREPARED_STATEMENTS == 'auto':
+        return os.getenv('DB_PORT', '6543') != '6543'
+    return DB_PREPARED_STATEMENTS == 'on'
+
+
+class NamedQuery(str):
+    """SQL text plus the name it is prepared under, and per-query timing.
+
+    Still a str, so it can be passed anywhere SQL is expected; cursors from
+    db_pool.TimedConnection recognise it and run it as a prepared statement.
+    Placeholders are either all %(name)s or all %s, as for cursor.execute().
+    """
+
+    def __new__(cls, name: str, sql: str):
+        self = super().__new__(cls, sql)
+        self.name = name
+        names = []
+        positional = 0
+
+        def number(match):
+            nonlocal positional
+            if match.group(0) == '%%':
+                return '%'
+            if match.group(1):
+                if match.group(1) not in names:
+                    names.append(match.group(1))
+                return f'${names.index(match.group(1)) + 1}'
+            positional += 1
+            return f'${positional}'
+
+        body = _PLACEHOLDER.sub(number, sql)
+        if names and positional:
+            raise ValueError(f'Query {name!r} mixes %s and %(name)s placeholders')
+        args = ', '.join([f'%({arg})s' for arg in names] or ['%s'] * positional)
+        self.prepare_sql = f'PREPARE {name} AS {body}'
+        self.execute_sql = f'EXECUTE {name}({args})' if args else f'EXECUTE {name}'
+        self.duration = LatencyHistogram()
+        return self
+
+
+_queries = {}
+_lock = threading.Lock()
+_prepares = 0
+
+
+def named_query(name: str, sql: str) -> NamedQuery:
+    """Declare a hot statement once, at import time."""
+    query = NamedQuery(name, sql)
+    with _lock:
+        if name in _queries:
+            raise ValueError(f'Query {name!r} is already registered')
+        _queries[name] = query
+    return query
+
+
+def count_prepare() -> None:
+    global _prepares
+    with _lock:
+        _prepares += 1
+
+
+def query_stats() -> dict:
+    stats = {'prepared_statements': prepared_statements_enabled(), 'prepares': _prepares}
+    for name, query in sorted(_queries.items()):
+        stats[f'{name}_duration_ms'] = query.duration.snapshot()
+    return stats
@@ -0,0 +1,217 @@
+# rate_limit.py
+import heapq
+import os
+import threading
+import time
+
+# Every check runs before any bcrypt work or OTP email, so a flood of bad requests is
+# turned away for the price of a dict lookup. Limits are "requests/seconds", e.g. 10/300
+# allows a burst of 10 and then one more every 30 seconds. Override any of them with
+# RATE_LIMIT_RULES, e.g. "signin.ip=50/60,resend_otp.email=5/600".
+DEFAULT_RULES = {
+    'signin': (('ip', '20/60'), ('email', '10/300')),
+    'signup': (('ip', '5/300'), ('email', '3/600')),
+    'resend_otp': (('ip', '10/300'), ('email', '3/600')),
+    'verify_otp': (('ip', '20/60'), ('email', '10/600')),
+}
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# 'memory' keeps buckets per process; 'postgres' shares them between workers and hosts
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))
+
+
+def parse_limit(spec: str):
+    """Turn "requests/seconds" into (burst, seconds between tokens)."""
+    requests, _, seconds = spec.partition('/')
+    burst, period = int(requests), float(seconds)
+    if burst < 1 or period <= 0:
+        raise ValueError(f'Invalid rate limit {spec!r}')
+    return burst, period / burst
+
+
+def parse_rules(overrides: str = '', defaults=None) -> dict:
+    """Build {route: ((scope, burst, interval), ...)} from the defaults plus overrides.
+
+    Overrides are comma-separated "route.scope=requests/seconds" items; 0/1 turns a
+    scope's limit off.
+    """
+    specs = {route: dict(scopes) for route, scopes in (defaults or DEFAULT_RULES).items()}
+    for item in filter(None, (part.strip() for part in overrides.split(','))):
+        key, _, spec = item.partition('=')
+        route, _, scope = key.strip().partition('.')
+        if not scope or not spec:
+            raise ValueError(f'Invalid rate limit rule {item!r}')
+        specs.setdefault(route, {})[scope] = spec.strip()
+    return {
+        route: tuple((scope, *parse_limit(spec)) for scope, spec in scopes.items() if not spec.startswith('0/'))
+        for route, scopes in specs.items()
+    }
+
+
+class MemoryBuckets:
+    """Token buckets for many keys in one dict, holding a single float per key.
+
+    Each bucket is stored as the time it will next be full (GCRA), which behaves
+    exactly like a token bucket: a request is admitted while the bucket is less than
+    `burst` intervals from full. Keys whose bucket has refilled are equivalent to
+    absent ones, so they are dropped lazily by an occasional sweep.
+    """
+
+    def __init__(self, max_keys: int = 100000, sweep_interval: float = 60.0, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._full_at = {}
+        self._lock = threading.Lock()
+        self._next_sweep = clock() + sweep_interval
+        self.evicted = 0
+
+    def take(self, key, burst: int, interval: float) -> float:
+        """Take one token from key's bucket. Returns 0 if admitted, else seconds to wait."""
+        with self._lock:
+            now = self._clock()
+            full_at = max(self._full_at.get(key, now), now) + interval
+            wait = full_at - now - burst * interval
+            if wait > 0:
+                return wait
+            self._full_at[key] = full_at
+            if now >= self._next_sweep or len(self._full_at) > self.max_keys:
+                self._sweep(now)
+            return 0.0
+
+    def _sweep(self, now: float) -> None:
+        self._full_at = {key: full_at for key, full_at in self._full_at.items() if full_at > now}
+        # Still too many live buckets: rather than grow without bound, forget the ones that
+        # will be full again soonest, which lose the least of their clients' history
+        excess = len(self._full_at) - self.max_keys
+        if excess > 0:
+            for key, _ in heapq.nsmallest(excess, self._full_at.items(), key=lambda item: item[1]):
+                del self._full_at[key]
+            self.evicted += excess
+        self._next_sweep = now + self.sweep_interval
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+
+class PostgresBuckets:
+    """The same buckets in an UNLOGGED table (migrations/0007_rate_limit_buckets.sql), shared by all workers.
+
+    Costs one round trip per check. If the database is unreachable, requests are
+    admitted: the routes behind the limiter need it anyway.
+    """
+
+    TAKE_SQL = """
+        INSERT INTO rate_limit_buckets AS b (bucket_key, full_at)
+        VALUES (%(key)s, EXTRACT(EPOCH FROM clock_timestamp()) + %(interval)s)
+        ON CONFLICT (bucket_key) DO UPDATE
+            SET full_at = GREATEST(b.full_at, EXCLUDED.full_at - %(interval)s) + %(interval)s
+            WHERE GREATEST(b.full_at, EXCLUDED.full_at - %(interval)s) + %(interval)s
+                      <= EXCLUDED.full_at + %(tolerance)s
+        RETURNING full_at
+    """
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.swept = 0
+        self.errors = 0
+
+    def take(self, key, burst: int, interval: float) -> float:
+        from db_pool import db_connection
+
+        key = ':'.join(map(str, key))
+        try:
+            with db_connection(autocommit=True) as conn, conn.cursor() as cur:
+                cur.execute(self.TAKE_SQL, {'key': key, 'interval': interval, 'tolerance': (burst - 1) * interval})
+                if cur.fetchone():
+                    if time.monotonic() >= self._next_sweep:
+                        self._next_sweep = time.monotonic() + self.sweep_interval
+                        cur.execute("DELETE FROM rate_limit_buckets WHERE full_at < EXTRACT(EPOCH FROM clock_timestamp())")
+                        self.swept += cur.rowcount
+                    return 0.0
+                cur.execute("""
+                            SELECT full_at - EXTRACT(EPOCH FROM clock_timestamp())
+                            FROM rate_limit_buckets WHERE bucket_key = %s
+                            """, (key,))
+                row = cur.fetchone()
+                return max(float(row[0]) + interval - burst * interval, 0.001) if row else 0.0
+        except Exception as e:
+            self.errors += 1
+            print(f"Rate limit check failed, admitting request: {e}")
+            return 0.0
+
+
+class RateLimiter:
+    "Admission control for the auth routes: per-IP and per-email token buckets."
+
+    def __init__(self, rules: dict, backend=None, enabled: bool = True):
+        self.rules = rules
+        self.backend = backend if backend is not None else MemoryBuckets()
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._admitted = {}
+        self._shed = {}
+
+    def check(self, route: str, **keys) -> float:
+        """Count a request to route; returns 0 to admit it, else seconds until it would be.
+
+        keys gives the caller's value for each scope (ip=..., email=...). Rules are
+        checked in order and the first full bucket sheds the request, so a blocked IP
+        stops draining the buckets of the emails it is trying.
+        """
+        if not self.enabled:
+            return 0.0
+        for scope, burst, interval in self.rules.get(route, ()):
+            value = keys.get(scope)
+            if not value:
+                continue
+            if scope == 'email':
+                value = str(value).strip().lower()
+            wait = self.backend.take((route, scope, value), burst, interval)
+            if wait > 0:
+                self._count(self._shed, f'{route}_{scope}')
+                return wait
+        self._count(self._admitted, route)
+        return 0.0
+
+    def _count(self, counters: dict, name: str) -> None:
+        with self._lock:
+            counters[name] = counters.get(name, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {f'admitted_{name}': count for name, count in self._admitted.items()}
+            stats.update({f'shed_{name}': count for name, count in self._shed.items()})
+        stats['shed'] = sum(self._shed.values())
+        if isinstance(self.backend, MemoryBuckets):
+            stats['buckets'] = len(self.backend)
+            stats['evicted'] = self.backend.evicted
+        else:
+            stats['swept'] = self.backend.swept
+            stats['backend_errors'] = self.backend.errors
+        return stats
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide limiter, creating it on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                if RATE_LIMIT_BACKEND == 'postgres':
+                    backend = PostgresBuckets()
+                else:
+                    backend = MemoryBuckets(max_keys=RATE_LIMIT_MAX_KEYS)
+                _limiter = RateLimiter(parse_rules(os.getenv('RATE_LIMIT_RULES', '')), backend,
+                                       enabled=RATE_LIMIT_ENABLED)
+    return _limiter
+
+
+def limiter_stats() -> dict:
+    return get_limiter().stats()
@@ -0,0 +1,49 @@
+# resource_versions.py
+import hashlib
+
+from queries import named_query
+
+# Resources whose list endpoints are revalidated with ETags (see migrations/0004_resource_versions.sql)
+ENTRIES = 'entries'
+INTENTIONS = 'intentions'
+EVENTS = 'events'
+CALENDAR_EVENTS = 'calendar_events'
+
+
+# Also usable as a data-modifying CTE, so a write can bump its version in the same statement
+BUMP_VERSION_SQL = named_query('bump_version', """
+    INSERT INTO resource_versions (user_id, resource, version)
+    VALUES (%(user_id)s, %(resource)s, 1)
+    ON CONFLICT (user_id, resource)
+        DO UPDATE SET version = resource_versions.version + 1
+""")
+
+GET_VERSION_SQL = named_query('get_version', "SELECT version FROM resource_versions WHERE user_id = %s AND resource = %s")
+
+
+def bump_version(cur, user_id: int, resource: str) -> None:
+    """Record that one of a user's resources changed.
+
+    Run it on the same cursor as the change itself, before commit, so the new
+    version becomes visible exactly when the new data does.
+    """
+    cur.execute(BUMP_VERSION_SQL, {'user_id': user_id, 'resource': resource})
+
+
+def get_version(cur, user_id: int, resource: str) -> int:
+    """Current change version of a user's resource (0 if it has never changed)."""
+    cur.execute(GET_VERSION_SQL, (user_id, resource))
+    row = cur.fetchone()
+    if row is None:
+        return 0
+    return row['version'] if isinstance(row, dict) else row[0]
+
+
+def version_etag(resource: str, version: int, *vary) -> str:
+    """ETag for a response built from `version` of a resource.
+
+    `vary` lists everything else the response depends on (user, query string, date),
+    so the same version never matches a different user's or a different page's copy.
+    """
+    digest = hashlib.sha256(repr(vary).encode('utf-8')).hexdigest()[:16]
+    return f'{resource}-{version}-{digest}'
@@ -11,24 +11,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const result = await response.json();
 
             if (result.success) {
-                const moodOptionsContainer = document.getElementById('moodOptions');
-                moodOptionsContainer.innerHTML = '';
-
-                result.moods.forEach(mood => {
-                    const moodDiv = document.createElement('div');
-                    moodDiv.className = 'mood-option';
-                    moodDiv.dataset.moodId = mood.id;
-                    moodDiv.innerHTML = `
-                        <div style="font-size: 1.8rem; margin-bottom: 8px;">${mood.emoji}</div>
-                        <span>${mood.name}</span>
-                    `;
-
-                    moodDiv.addEventListener('click', async function() {
-                        await selectMood(mood.id, mood.name, mood.emoji);
-                    });
-
-                    moodOptionsContainer.appendChild(moodDiv);
-                });
+                renderMoods(result.moods);
 
                 // Load today's mood
                 loadTodayMood();
@@ -38,6 +21,27 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    function renderMoods(moods) {
+        const moodOptionsContainer = document.getElementById('moodOptions');
+        moodOptionsContainer.innerHTML = '';
+
+        moods.forEach(mood => {
+            const moodDiv = document.createElement('div');
+            moodDiv.className = 'mood-option';
+            moodDiv.dataset.moodId = mood.id;
+            moodDiv.innerHTML = `
+                <div style="font-size: 1.8rem; margin-bottom: 8px;">${mood.emoji}</div>
+                <span>${mood.name}</span>
+            `;
+
+            moodDiv.addEventListener('click', async function() {
+                await selectMood(mood.id, mood.name, mood.emoji);
+            });
+
+            moodOptionsContainer.appendChild(moodDiv);
+        });
+    }
+
     // Select and save mood
     async function selectMood(moodId, moodName, moodEmoji) {
         try {
@@ -84,17 +88,21 @@ document.addEventListener('DOMContentLoaded', function() {
             const result = await response.json();
 
             if (result.success && result.mood) {
-                const moodOption = document.querySelector(`[data-mood-id="${result.mood.id}"]`);
-                if (moodOption) {
-                    moodOption.classList.add('active');
-                }
-                displaySelectedMood(result.mood.name, result.mood.emoji);
+                showTodayMood(result.mood);
             }
         } catch (error) {
             console.error('Error loading today\'s mood:', error);
         }
     }
 
+    function showTodayMood(mood) {
+        const moodOption = document.querySelector(`[data-mood-id="${mood.id}"]`);
+        if (moodOption) {
+            moodOption.classList.add('active');
+        }
+        displaySelectedMood(mood.name, mood.emoji);
+    }
+
     // ==================== LOAD INTENTIONS FROM DATABASE ====================
     async function loadIntentions() {
         try {
@@ -104,20 +112,24 @@ document.addEventListener('DOMContentLoaded', function() {
             const result = await response.json();
 
             if (result.success) {
-                const intentionsContainer = document.querySelector('.intentions');
-                // Remove existing intentions except the add-intention div
-                const existingIntentions = intentionsContainer.querySelectorAll('.intention');
-                existingIntentions.forEach(intent => intent.remove());
-
-                result.intentions.forEach(intention => {
-                    addIntentionToUI(intention);
-                });
+                renderIntentions(result.intentions);
             }
         } catch (error) {
             console.error('Error loading intentions:', error);
         }
     }
 
+    function renderIntentions(intentions) {
+        const intentionsContainer = document.querySelector('.intentions');
+        // Remove existing intentions except the add-intention div
+        const existingIntentions = intentionsContainer.querySelectorAll('.intention');
+        existingIntentions.forEach(intent => intent.remove());
+
+        intentions.forEach(intention => {
+            addIntentionToUI(intention);
+        });
+    }
+
     function addIntentionToUI(intention) {
         const intentionsContainer = document.querySelector('.intentions');
         const addIntentionDiv = document.querySelector('.add-intention');
@@ -203,22 +215,26 @@ document.addEventListener('DOMContentLoaded', function() {
             const result = await response.json();
 
             if (result.success) {
-                const eventsContainer = document.getElementById('eventsList');
-                eventsContainer.innerHTML = '';
-
-                if (result.events.length === 0) {
-                    eventsContainer.innerHTML = '<p style="text-align: center; color: #7A7F5C; padding: 20px;">No events for today. Click ADD to create one!</p>';
-                } else {
-                    result.events.forEach(event => {
-                        addEventToUI(event);
-                    });
-                }
+                renderEvents(result.events);
             }
         } catch (error) {
             console.error('Error loading events:', error);
         }
     }
 
+    function renderEvents(events) {
+        const eventsContainer = document.getElementById('eventsList');
+        eventsContainer.innerHTML = '';
+
+        if (events.length === 0) {
+            eventsContainer.innerHTML = '<p style="text-align: center; color: #7A7F5C; padding: 20px;">No events for today. Click ADD to create one!</p>';
+        } else {
+            events.forEach(event => {
+                addEventToUI(event);
+            });
+        }
+    }
+
     function addEventToUI(event) {
         const eventsContainer = document.getElementById('eventsList');
 
@@ -489,9 +505,35 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // ==================== LOAD TODAY'S PAGE IN ONE REQUEST ====================
+    async function loadToday() {
+        try {
+            const response = await fetch(`${API_BASE}/api/journal/today`, {
+                credentials: 'include'
+            });
+            const result = await response.json();
+
+            if (result.success) {
+                renderMoods(result.moods);
+                if (result.mood) {
+                    showTodayMood(result.mood);
+                }
+                renderIntentions(result.intentions);
+                renderEvents(result.events);
+                return;
+            }
+            console.error('Failed to load today\'s journal:', result.message);
+        } catch (error) {
+            console.error('Error loading today\'s journal:', error);
+        }
+
+        // Fall back to loading each section separately
+        loadMoods();
+        loadIntentions();
+        loadEvents();
+    }
+
     // ==================== INITIALIZE ====================
-    loadMoods();
-    loadIntentions();
-    loadEvents();
+    loadToday();
 
 });
\ No newline at end of file
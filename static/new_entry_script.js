@@ -4,6 +4,20 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // API base URL
     const API_BASE = 'http://127.0.0.1:5000';
+    const ENTRIES_PAGE_SIZE = 20;
+
+    // Cursor for the next (older) page of entries; null once everything is loaded
+    let nextCursor = null;
+
+    const loadMoreBtn = document.createElement('button');
+    loadMoreBtn.type = 'button';
+    loadMoreBtn.className = 'load-more-btn';
+    loadMoreBtn.textContent = 'Load older entries';
+    loadMoreBtn.style.display = 'none';
+    loadMoreBtn.addEventListener('click', function() {
+        loadEntries(nextCursor);
+    });
+    entriesList.parentNode.appendChild(loadMoreBtn);
 
     // Load entries from database
     loadEntries();
@@ -55,9 +69,15 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    async function loadEntries() {
+    async function loadEntries(cursor = null) {
         try {
-            const response = await fetch(`${API_BASE}/api/entries`, {
+            const params = new URLSearchParams({ limit: ENTRIES_PAGE_SIZE });
+            if (cursor) {
+                params.set('cursor', cursor);
+            }
+
+            loadMoreBtn.disabled = true;
+            const response = await fetch(`${API_BASE}/api/entries?${params}`, {
                 method: 'GET',
                 credentials: 'include'
             });
@@ -65,39 +85,53 @@ document.addEventListener('DOMContentLoaded', function() {
             const result = await response.json();
 
             if (result.success) {
-                // Clear existing entries
-                entriesList.innerHTML = '';
+                // First page replaces the list, later pages are appended below it
+                if (!cursor) {
+                    entriesList.innerHTML = '';
+                }
 
-                // Add each entry from database to UI
+                // Entries arrive newest first
                 result.entries.forEach(entry => {
-                    addEntryToUI(entry);
+                    addEntryToUI(entry, false);
                 });
 
                 // If no entries, show a placeholder
-                if (result.entries.length === 0) {
+                if (!cursor && result.entries.length === 0) {
                     entriesList.innerHTML = '<p style="text-align: center; color: #666;">No entries yet. Start writing your first entry!</p>';
                 }
+
+                nextCursor = result.next_cursor;
+                loadMoreBtn.style.display = nextCursor ? 'block' : 'none';
             } else {
                 console.error('Failed to load entries:', result.message);
             }
         } catch (error) {
             console.error('Error loading entries:', error);
+        } finally {
+            loadMoreBtn.disabled = false;
         }
     }
 
-    function addEntryToUI(entry) {
+    function addEntryToUI(entry, atTop = true) {
         const entryElement = document.createElement('div');
         entryElement.className = 'entry';
         entryElement.setAttribute('data-entry-id', entry.id);
+        // Listings carry an excerpt; a newly saved entry comes back with its full content
+        const text = entry.excerpt ?? entry.content;
         entryElement.innerHTML = `
             <h3>${escapeHtml(entry.title)}</h3>
-            <p>${escapeHtml(entry.content)}</p>
+            <p class="entry-text">${escapeHtml(text)}</p>
+            ${entry.truncated ? `<button class="read-more-btn" onclick="readEntry(${entry.id})">Read more</button>` : ''}
             <div class="date">${entry.date}</div>
             <button class="delete-btn" onclick="deleteEntry(${entry.id})">Delete</button>
         `;
 
-        // Add to the top of the list
-        entriesList.insertBefore(entryElement, entriesList.firstChild);
+        if (atTop) {
+            // Newly saved entries go to the top of the list
+            entriesList.insertBefore(entryElement, entriesList.firstChild);
+        } else {
+            entriesList.appendChild(entryElement);
+        }
     }
 
     // Helper function to escape HTML to prevent XSS
@@ -107,6 +141,32 @@ document.addEventListener('DOMContentLoaded', function() {
         return div.innerHTML;
     }
 
+    // Fetch the full text of an entry shown as an excerpt
+    window.readEntry = async function(entryId) {
+        const entryElement = document.querySelector(`[data-entry-id="${entryId}"]`);
+        if (!entryElement) {
+            return;
+        }
+
+        try {
+            const response = await fetch(`${API_BASE}/api/entries/${entryId}`, {
+                method: 'GET',
+                credentials: 'include'
+            });
+
+            const result = await response.json();
+
+            if (result.success) {
+                entryElement.querySelector('.entry-text').textContent = result.entry.content;
+                entryElement.querySelector('.read-more-btn').remove();
+            } else {
+                console.error('Failed to load entry:', result.message);
+            }
+        } catch (error) {
+            console.error('Error loading entry:', error);
+        }
+    };
+
     // Make deleteEntry available globally
     window.deleteEntry = async function(entryId) {
         if (!confirm('Are you sure you want to delete this entry?')) {
@@ -0,0 +1,70 @@
+# test_app.py
+from datetime import date, datetime
+
+import pytest
+
+from app import (CALENDAR_MAX_AROUND_MONTHS, ENTRY_EXCERPT_LENGTH, calendar_range, decode_cursor, encode_cursor,
+                 format_entry_summary)
+
+
+def test_cursor_round_trips_its_sort_key():
+    created_at = datetime(2026, 10, 18, 9, 30, 15, 250)
+    cursor = encode_cursor(created_at, 42)
+    assert '=' not in cursor
+    assert decode_cursor(cursor, datetime.fromisoformat, int) == (created_at, 42)
+    assert decode_cursor(encode_cursor(7), int) == (7,)
+
+
+def test_decode_cursor_rejects_malformed_cursors():
+    for cursor in ['', 'not base64!', 'bm90IGpzb24',  # the last is "not json"
+                   encode_cursor(1), encode_cursor('2026-10-18', 1, 2),
+                   encode_cursor('yesterday', 1), encode_cursor('2026-13-40T00:00:00', 1),
+                   encode_cursor('2026-10-18T00:00:00', 'x'), encode_cursor(None, 1)]:
+        with pytest.raises(ValueError):
+            decode_cursor(cursor, datetime.fromisoformat, int)
+
+
+def test_calendar_range_from_dates_or_month_and_around():
+    assert calendar_range({}) is None
+    assert calendar_range({'start': '2026-10-01', 'end': '2026-11-01'}) == (date(2026, 10, 1), date(2026, 11, 1))
+    assert calendar_range({'month': '10', 'year': '2026'}) == (date(2026, 10, 1), date(2026, 11, 1))
+    assert calendar_range({'month': '1', 'year': '2026', 'around': '1'}) == (date(2025, 12, 1), date(2026, 3, 1))
+    assert calendar_range({'month': '12', 'year': '2026', 'around': str(CALENDAR_MAX_AROUND_MONTHS)}) == \
+        (date(2026, 6, 1), date(2027, 7, 1))
+
+
+def test_calendar_range_rejects_malformed_reversed_and_oversized_ranges():
+    for args in [{'start': '2026-10-01'},
+                 {'end': '2026-10-01'},
+                 {'start': 'yesterday', 'end': '2026-10-01'},
+                 {'start': '2026-10-01', 'end': '2026-10-01'},      # empty
+                 {'start': '2026-11-01', 'end': '2026-10-01'},      # reversed
+                 {'start': '2020-01-01', 'end': '2026-01-01'},      # too long
+                 {'month': '13', 'year': '2026'},
+                 {'month': '0', 'year': '2026'},
+                 {'month': 'May', 'year': '2026'},
+                 {'month': '12', 'year': '9999', 'around': '1'},   # past the last representable date
+                 {'month': '10', 'year': '2026', 'around': '-1'},
+                 {'month': '10', 'year': '2026', 'around': 'x'},
+                 {'month': '10', 'year': '2026', 'around': str(CALENDAR_MAX_AROUND_MONTHS + 1)}]:
+        with pytest.raises(ValueError):
+            calendar_range(args)
+
+
+def test_entry_summary_cuts_long_excerpts_with_an_ellipsis():
+    def summary(excerpt):
+        return format_entry_summary({'id': 7, 'entry_title': 'Monday', 'entry_excerpt': excerpt, 'word_count': 3,
+                                     'created_at': datetime(2026, 10, 18, 21, 5)})
+
+    short = summary('Rain all day.')
+    assert short == {'id': 7, 'title': 'Monday', 'excerpt': 'Rain all day.', 'truncated': False, 'word_count': 3,
+                     'date': '18/10/2026'}
+    assert summary(None)['excerpt'] == ''
+
+    exact = 'x' * ENTRY_EXCERPT_LENGTH
+    assert (summary(exact)['excerpt'], summary(exact)['truncated']) == (exact, False)
+
+    # The column holds one character more than is shown, which is how a cut is detected
+    long = summary('word ' * (ENTRY_EXCERPT_LENGTH // 5) + 'w')
+    assert long['truncated']
+    assert long['excerpt'] == ('word ' * (ENTRY_EXCERPT_LENGTH // 5)).rstrip() + '…'
@@ -0,0 +1,179 @@
+# test_asgi.py
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from psycopg import OperationalError
+
+import asgi
+from app import CREATE_ENTRY_SQL, app
+from asgi import AsyncReplicaSet, build_environ
+from mood_trends import LOCK_DAY_SQL, SET_MOOD_SQL
+
+
+def test_build_environ_maps_an_asgi_scope_to_wsgi():
+    environ = build_environ({
+        'type': 'http',
+        'method': 'POST',
+        'root_path': '',
+        'path': '/api/entries/café',
+        'query_string': b'limit=5&cursor=abc',
+        'http_version': '1.1',
+        'scheme': 'https',
+        'server': ('journal.test', 443),
+        'client': ('10.0.0.7', 51234),
+        'headers': [(b'host', b'journal.test'),
+                    (b'content-type', b'application/json'),
+                    (b'content-length', b'17'),
+                    (b'accept-encoding', b'gzip'),
+                    (b'accept-encoding', b'br'),
+                    (b'if-none-match', b'"v1-gzip"')],
+    })
+    assert environ['REQUEST_METHOD'] == 'POST'
+    assert environ['PATH_INFO'] == '/api/entries/café'.encode('utf-8').decode('latin-1')
+    assert environ['QUERY_STRING'] == 'limit=5&cursor=abc'
+    assert environ['SERVER_PROTOCOL'] == 'HTTP/1.1'
+    assert environ['wsgi.url_scheme'] == 'https'
+    assert (environ['SERVER_NAME'], environ['SERVER_PORT']) == ('journal.test', '443')
+    assert (environ['REMOTE_ADDR'], environ['REMOTE_PORT']) == ('10.0.0.7', '51234')
+    # The two body headers keep their CGI names; repeated headers are joined
+    assert (environ['CONTENT_TYPE'], environ['CONTENT_LENGTH']) == ('application/json', '17')
+    assert 'HTTP_CONTENT_TYPE' not in environ
+    assert environ['HTTP_ACCEPT_ENCODING'] == 'gzip,br'
+    assert environ['HTTP_IF_NONE_MATCH'] == '"v1-gzip"'
+
+    bare = build_environ({'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'', 'headers': []})
+    assert (bare['SERVER_NAME'], bare['SERVER_PORT']) == ('localhost', '80')
+    assert 'REMOTE_ADDR' not in bare
+
+
+class FakeCursor:
+    def __init__(self, lag):
+        self.lag = lag
+
+    async def fetchone(self):
+        return {'lag': self.lag}
+
+
+class FakeConnection:
+    def __init__(self, name):
+        self.name = name
+        self.lag = 0
+        self.broken = False
+
+    async def execute(self, sql, params=None):
+        if self.broken:
+            raise OperationalError("server closed the connection unexpectedly")
+        return FakeCursor(self.lag)
+
+
+class FakePool:
+    def __init__(self, name):
+        self.conn = FakeConnection(name)
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self.conn
+
+
+def test_async_replicas_are_used_in_turn_and_ejected_when_unhealthy():
+    now = [100.0]
+    primary, first, second = FakePool('primary'), FakePool('first'), FakePool('second')
+
+    async def get_primary():
+        return primary
+
+    replicas = AsyncReplicaSet([first, second], get_primary, eject_seconds=30, max_lag=2, lag_check_interval=5,
+                               clock=lambda: now[0])
+
+    async def read():
+        async with replicas.connection() as conn:
+            return conn.name
+
+    async def scenario():
+        assert [await read() for _ in range(4)] == ['first', 'second', 'first', 'second']
+
+        # Too far behind: ejected at its next lag check, and the other replica takes its turn
+        second.conn.lag = 10
+        now[0] += 5
+        assert [await read() for _ in range(2)] == ['first', 'first']
+        assert replicas.stats()['healthy'] == 1
+
+        # Connection failure on the last healthy replica: reads fall back to the primary
+        first.conn.broken = True
+        now[0] += 5
+        assert await read() == 'primary'
+        stats = replicas.stats()
+        assert (stats['healthy'], stats['ejections'], stats['primary_reads'], stats['replica_reads']) == (0, 2, 1, 6)
+
+        # Back in rotation once the ejection expires
+        second.conn.lag = 0
+        first.conn.broken = False
+        now[0] += 30
+        assert await read() in ('first', 'second')
+        assert replicas.stats()['healthy'] == 2
+
+    asyncio.run(scenario())
+
+
+class TransactionRecordingConnection:
+    """Autocommit connection, like the pool's, noting which transaction each statement ran in"""
+
+    def __init__(self):
+        self.transactions = 0
+        self.in_transaction = False
+        self.statements = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.transactions += 1
+        self.in_transaction = True
+        try:
+            yield
+        finally:
+            self.in_transaction = False
+
+    async def execute(self, sql, params=None, prepare=None):
+        self.statements.append((sql, self.transactions if self.in_transaction else None))
+        return FakeCursor(None)
+
+
+def run_write_view(monkeypatch, view, path, body, row):
+    """Run an async view as user 1 on a TransactionRecordingConnection whose every query returns row"""
+    conn = TransactionRecordingConnection()
+
+    @asynccontextmanager
+    async def db_connection(replica=False):
+        yield conn
+
+    async def fetchone(conn, sql, params=None):
+        await conn.execute(sql, params)
+        return row
+
+    monkeypatch.setattr(asgi, 'db_connection', db_connection)
+    monkeypatch.setattr(asgi, 'fetchone', fetchone)
+    monkeypatch.setattr(asgi, 'find_mood', lambda mood_id: {'id': mood_id, 'name': 'calm'})
+
+    async def scenario():
+        with app.test_request_context(path, method='POST', json=body):
+            asgi.session['user_id'] = 1
+            return await view()
+
+    return asyncio.run(scenario()), conn
+
+
+def test_set_today_mood_locks_and_updates_in_one_transaction(monkeypatch):
+    response, conn = run_write_view(monkeypatch, asgi.set_today_mood, '/api/moods/today', {'mood_id': 2},
+                                    {'id': 3, 'mood_id': 1})
+    assert response.get_json() == {'success': True, 'mood': {'id': 2, 'name': 'calm'}}
+    # The day's row lock only holds back a concurrent change if the rollup update shares its transaction
+    assert conn.statements == [(LOCK_DAY_SQL, 1), (SET_MOOD_SQL, 1)]
+
+
+def test_create_entry_is_a_single_statement(monkeypatch):
+    response, conn = run_write_view(monkeypatch, asgi.create_entry, '/api/entries', {'title': 't', 'content': 'c'},
+                                    {'id': 5, 'entry_title': 't', 'entry_content': 'c',
+                                     'created_at': datetime(2026, 10, 18, 9, 0)})
+    assert response.get_json()['entry']['id'] == 5
+    # Atomic on its own in autocommit; a second statement here would need conn.transaction()
+    assert conn.statements == [(CREATE_ENTRY_SQL, None)]
@@ -0,0 +1,24 @@
+# test_cache.py
+import time
+
+from cache import CachedValue
+
+
+def test_value_is_loaded_once_until_invalidated():
+    calls = []
+    cached = CachedValue(lambda: calls.append(1) or len(calls), ttl=60)
+
+    assert cached.get() == 1
+    assert cached.get() == 1
+    cached.invalidate()
+    assert cached.get() == 2
+    assert cached.loads == 2 and cached.hits == 1
+
+
+def test_value_expires_after_ttl():
+    calls = []
+    cached = CachedValue(lambda: calls.append(1) or len(calls), ttl=0.01)
+
+    assert cached.get() == 1
+    time.sleep(0.02)
+    assert cached.get() == 2
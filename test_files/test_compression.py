@@ -0,0 +1,59 @@
+# test_compression.py
+import gzip
+
+from flask import Flask, Response, jsonify, request
+
+from compression import ResponseCompressor
+
+
+def make_app():
+    app = Flask(__name__)
+    compressor = ResponseCompressor(min_size=100)
+    compressor.init_app(app)
+
+    @app.route('/big')
+    def big():
+        response = jsonify({'text': 'dear diary ' * 200})
+        response.set_etag('v1')
+        return response.make_conditional(request)
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'line {i}\n' for i in range(500)), mimetype='text/plain')
+
+    return app, compressor
+
+
+def test_buffered_responses_are_compressed_above_the_threshold():
+    app, compressor = make_app()
+    client = app.test_client()
+
+    plain = client.get('/big')
+    compressed = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert plain.headers['ETag'] == '"v1"'
+    assert compressed.headers['ETag'] == '"v1-gzip"'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    revalidated = client.get('/big', headers={'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == '"v1-gzip"'
+
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    stats = compressor.stats()
+    assert stats['gzip_responses'] == 1 and stats['skipped_small'] == 1
+    assert stats['gzip_ratio'] > 1
+
+
+def test_streamed_responses_are_compressed_incrementally():
+    app, compressor = make_app()
+    response = app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip;q=1, identity;q=0.5'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers or response.headers['Content-Length'] == str(len(response.data))
+    assert gzip.decompress(response.data).decode().count('\n') == 500
+    assert compressor.stats()['gzip_bytes_in'] == len(''.join(f'line {i}\n' for i in range(500)))
@@ -0,0 +1,205 @@
+# test_db_pool.py
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+from db_pool import ConnectionPool, PoolTimeout, ReplicaSet, replica_params
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.status = extensions.TRANSACTION_STATUS_INTRANS
+
+    def fetchone(self):
+        return (self.conn.lag,)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+        self.autocommit = False
+        self.lag = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    kwargs.setdefault('reap_interval', 0)
+    return ConnectionPool(connect, **kwargs), opened
+
+
+def test_connections_are_reused_and_rolled_back():
+    pool, opened = make_pool(max_size=2)
+
+    with pool.connection() as conn:
+        conn.cursor().execute("SELECT 1")
+    with pool.connection() as again:
+        assert again is conn
+
+    assert len(opened) == 1
+    assert conn.rollbacks == 1
+    stats = pool.stats()
+    assert stats['checkouts'] == 2
+    assert stats['in_use'] == 0
+    assert stats['idle'] == 1
+    assert stats['checkout_latency_ms']['count'] == 2
+
+
+def test_autocommit_checkout_is_reset_on_release():
+    pool, opened = make_pool(max_size=1)
+
+    with pool.connection(autocommit=True) as conn:
+        assert conn.autocommit is True
+    with pool.connection() as again:
+        assert again is conn
+        assert again.autocommit is False
+
+    assert len(opened) == 1
+
+
+def test_checkout_times_out_when_exhausted():
+    pool, _ = make_pool(max_size=1, checkout_timeout=0.05)
+
+    with pool.connection():
+        try:
+            with pool.connection():
+                pass
+            assert False, "expected PoolTimeout"
+        except PoolTimeout:
+            pass
+
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiter_gets_connection_when_released():
+    pool, opened = make_pool(max_size=1, checkout_timeout=2)
+    got = []
+
+    with pool.connection() as conn:
+        worker = threading.Thread(target=lambda: got.append(pool.connection().__enter__()))
+        worker.start()
+        time.sleep(0.05)
+    worker.join()
+
+    assert got == [conn]
+    assert len(opened) == 1
+    assert pool.stats()['wait_count'] == 1
+
+
+def test_broken_and_unhealthy_connections_are_replaced():
+    pool, opened = make_pool(max_size=2, health_check_after=0)
+
+    try:
+        with pool.connection():
+            raise psycopg2.OperationalError("boom")
+    except psycopg2.OperationalError:
+        pass
+    assert opened[0].closed
+
+    with pool.connection() as conn:
+        pass
+    conn.broken = True
+    with pool.connection() as fresh:
+        assert fresh is not conn
+
+    stats = pool.stats()
+    assert stats['health_check_failures'] == 1
+    assert stats['connections_opened'] == 3
+
+
+def test_reap_closes_idle_connections_above_min_size():
+    pool, opened = make_pool(min_size=1, max_size=3, max_idle=0)
+
+    with pool.connection(), pool.connection():
+        pass
+    time.sleep(0.01)
+
+    assert pool.reap() == 1
+    assert pool.stats()['idle'] == 1
+    assert sum(1 for conn in opened if conn.closed) == 1
+
+
+def test_replicas_are_used_in_turn_and_ejected_when_unhealthy():
+    now = [100.0]
+    primary, primary_opened = make_pool()
+    first, first_opened = make_pool()
+    second, second_opened = make_pool()
+    replicas = ReplicaSet([first, second], primary, eject_seconds=30, max_lag=2, lag_check_interval=5,
+                          clock=lambda: now[0])
+
+    used = []
+    for _ in range(4):
+        with replicas.connection() as conn:
+            used.append(conn)
+    assert used == [first_opened[0], second_opened[0], first_opened[0], second_opened[0]]
+
+    # Too far behind: ejected at its next lag check, and the other replica takes its turn
+    second_opened[0].lag = 10
+    now[0] += 5
+    for _ in range(2):
+        with replicas.connection() as conn:
+            assert conn is first_opened[0]
+    assert replicas.stats()['healthy'] == 1
+
+    # Connection failure on the last healthy replica: reads fall back to the primary
+    first_opened[0].broken = True
+    now[0] += 5
+    with replicas.connection() as conn:
+        assert conn is primary_opened[0]
+    stats = replicas.stats()
+    assert (stats['healthy'], stats['ejections'], stats['primary_reads'], stats['replica_reads']) == (0, 2, 1, 6)
+
+    # Back in rotation once the ejection expires
+    second_opened[0].lag = 0
+    now[0] += 30
+    with replicas.connection() as conn:
+        assert conn in (second_opened[0], first_opened[-1])
+    assert replicas.stats()['healthy'] == 2
+
+
+def test_replica_params_inherit_primary_settings():
+    primary = {'host': 'primary', 'port': 6543, 'user': 'app', 'password': 'pw', 'dbname': 'journal',
+               'sslmode': 'require'}
+    replicas = replica_params(' r1, r2:5433,host=r3 port=5434 sslmode=disable,', primary)
+
+    assert [(r['host'], int(r['port'])) for r in replicas] == [('r1', 6543), ('r2', 5433), ('r3', 5434)]
+    assert [r['sslmode'] for r in replicas] == ['require', 'require', 'disable']
+    assert all(r['user'] == 'app' and r['dbname'] == 'journal' for r in replicas)
+    assert replica_params('', primary) == []
@@ -0,0 +1,81 @@
+# test_entry_import.py
+import io
+from datetime import date
+
+import psycopg2
+import pytest
+
+from entry_import import ImportRowError, chunks, load_rows, read_csv, read_ndjson, text_stream
+
+
+def upload(text):
+    return text_stream(io.BytesIO(text.encode('utf-8')))
+
+
+def test_ndjson_rows_are_validated_individually():
+    rows = list(read_ndjson(upload(
+        '{"title": "Day one", "content": "Hello", "date": "2024-03-01"}\n'
+        '\n'
+        '{"title": "", "content": "x", "date": "2024-03-01"}\n'
+        'not json\n'
+        '{"title": "Day two", "content": "Again", "date": "02/03/2024"}\n'
+    )))
+
+    assert rows[0] == (1, ('Day one', 'Hello', date(2024, 3, 1)))
+    assert rows[1][0] == 3 and isinstance(rows[1][1], ImportRowError)
+    assert rows[2][0] == 4 and isinstance(rows[2][1], ImportRowError)
+    assert rows[3] == (5, ('Day two', 'Again', date(2024, 3, 2)))
+
+
+def test_ndjson_fields_must_be_text():
+    rows = list(read_ndjson(upload(
+        '{"title": "ok", "content": 5, "date": "2024-03-01"}\n'
+        '{"title": ["a"], "content": "x", "date": "2024-03-01"}\n'
+        '{"title": "ok", "content": "x", "date": 20240301}\n'
+        '{"title": "ok", "content": {"text": "x"}, "date": "2024-03-01"}\n'
+        '{"title": null, "content": "x", "date": "2024-03-01"}\n'
+        '{"title": "ok", "content": null, "date": "2024-03-01"}\n'
+        '{"title": "ok", "content": "x", "date": null}\n'
+        '{"title": true, "content": "x", "date": "2024-03-01"}\n'
+        '{"title": "Still imported", "content": "x", "date": "2024-03-01"}\n'
+    )))
+
+    for line, row in rows[:-1]:
+        assert isinstance(row, ImportRowError), line
+    assert str(rows[0][1]) == 'Content must be text'
+    assert rows[-1] == (9, ('Still imported', 'x', date(2024, 3, 1)))
+
+
+def test_csv_supports_multiline_fields_and_checks_the_header():
+    rows = list(read_csv(upload('Title,Content,Date\nA,"two\nlines",2024-01-05\nB,x,someday\n')))
+    assert rows[0] == (3, ('A', 'two\nlines', date(2024, 1, 5)))
+    assert isinstance(rows[1][1], ImportRowError)
+
+    with pytest.raises(ImportRowError):
+        list(read_csv(upload('title,body\nA,B\n')))
+
+
+def test_chunks_are_bounded():
+    assert [len(chunk) for chunk in chunks(range(25), size=10)] == [10, 10, 5]
+
+
+def test_a_row_the_database_rejects_fails_alone():
+    rows = [(line, ('Title', 'bad' if line == 600 else 'ok', date(2024, 1, 1))) for line in range(1, 1001)]
+    loaded = []
+    rejected = []
+
+    def load(batch):
+        if any(content == 'bad' for _, (_, content, _) in batch):
+            raise psycopg2.DataError('value out of range')
+        loaded.extend(line for line, _ in batch)
+
+    assert load_rows(load, rows, lambda line, e: rejected.append(line)) == 999
+    assert rejected == [600]
+    assert sorted(loaded) == [line for line in range(1, 1001) if line != 600]
+
+    # Anything else is not the row's fault, and fails the import
+    def broken(batch):
+        raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+    with pytest.raises(psycopg2.OperationalError):
+        load_rows(broken, rows, lambda line, e: rejected.append(line))
@@ -0,0 +1,36 @@
+# test_entry_revisions.py
+import zlib
+
+from entry_revisions import (REVISION_SNAPSHOT_INTERVAL, apply_delta, decode_document, encode_document,
+                             is_snapshot_revision, make_delta, rebuild)
+
+
+def test_delta_round_trips_and_stays_small_for_small_edits():
+    paragraph = 'Walked to the river after work and watched the herons for a while. ' * 40
+    old = encode_document('Evening', paragraph + '\nSecond paragraph.\n')
+    new = encode_document('Evening walk', paragraph.replace('herons', 'egrets', 1) + '\nSecond paragraph.\nThird.\n')
+
+    delta = make_delta(old, new)
+    assert apply_delta(old, delta) == new
+    assert decode_document(apply_delta(old, delta)) == (
+        'Evening walk', paragraph.replace('herons', 'egrets', 1) + '\nSecond paragraph.\nThird.\n')
+    assert len(delta) < len(new) // 20
+
+    assert apply_delta(old, make_delta(old, old)) == old
+    assert apply_delta(b'', make_delta(b'', new)) == new
+
+
+def test_rebuild_applies_deltas_from_the_nearest_snapshot():
+    versions = [encode_document(f'Title {n}', f'line one\nedit number {n}\nline three\n') for n in range(1, 46)]
+    chain = []
+    for revision, document in enumerate(versions, start=1):
+        if is_snapshot_revision(revision):
+            chain.append((revision, True, zlib.compress(document)))
+        else:
+            chain.append((revision, False, make_delta(versions[revision - 2], document)))
+
+    assert [r for r, snapshot, _ in chain if snapshot] == [1, 1 + REVISION_SNAPSHOT_INTERVAL,
+                                                           1 + 2 * REVISION_SNAPSHOT_INTERVAL]
+    for revision in (1, 2, 20, 21, 33, 45):
+        start = max(r for r, snapshot, _ in chain if snapshot and r <= revision)
+        assert rebuild(chain[start - 1:revision]) == versions[revision - 1]
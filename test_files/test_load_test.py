@@ -0,0 +1,23 @@
+# test_load_test.py
+from benchmarks.load_test import percentile, summarize
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) == 0.0
+
+
+def test_summarize_groups_by_endpoint():
+    samples = [('GET /a', 10.0, True), ('GET /a', 30.0, False), ('POST /b', 5.0, True)]
+    result = summarize(samples, elapsed=2.0)
+
+    assert result['endpoints']['GET /a']['requests'] == 2
+    assert result['endpoints']['GET /a']['errors'] == 1
+    assert result['endpoints']['GET /a']['rps'] == 1.0
+    assert result['endpoints']['GET /a']['p99_ms'] == 30.0
+    assert result['total']['requests'] == 3
+    assert result['total']['max_ms'] == 30.0
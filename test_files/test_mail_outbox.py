@@ -0,0 +1,99 @@
+# test_mail_outbox.py
+import os
+import smtplib
+
+from mail_outbox import MailOutbox
+
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP; records every session and message."""
+
+    sessions = []
+    failures = []  # exceptions to raise from upcoming send_message calls
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.logged_in = False
+        self.closed = False
+        FakeSMTP.sessions.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        self.logged_in = True
+
+    def send_message(self, msg):
+        if FakeSMTP.failures:
+            raise FakeSMTP.failures.pop(0)
+        self.sent.append(msg['To'])
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+def make_outbox(**kwargs):
+    FakeSMTP.sessions = []
+    FakeSMTP.failures = []
+    kwargs.setdefault('workers', 1)
+    kwargs.setdefault('backoff_base', 0.01)
+    return MailOutbox('localhost', 1025, username='app@example.com', password='secret',
+                      smtp_factory=FakeSMTP, **kwargs)
+
+
+def test_messages_share_one_authenticated_session():
+    outbox = make_outbox()
+    for i in range(5):
+        assert outbox.enqueue(f'user{i}@example.com', 'Your OTP', '123456')
+
+    assert outbox.flush(timeout=5)
+    outbox.close()
+
+    assert len(FakeSMTP.sessions) == 1
+    assert FakeSMTP.sessions[0].logged_in
+    assert len(FakeSMTP.sessions[0].sent) == 5
+    stats = outbox.stats()
+    assert stats['sent'] == 5
+    assert stats['pending'] == 0
+    assert stats['send_latency_ms']['count'] == 5
+
+
+def test_transient_failures_are_retried_on_a_new_session():
+    outbox = make_outbox()
+    FakeSMTP.failures = [smtplib.SMTPServerDisconnected('gone'), OSError('connection reset')]
+
+    outbox.enqueue('user@example.com', 'Your OTP', '123456')
+    assert outbox.flush(timeout=5)
+    outbox.close()
+
+    stats = outbox.stats()
+    assert stats['sent'] == 1
+    assert stats['retried'] == 2
+    assert len(FakeSMTP.sessions) == 3
+
+
+def test_permanent_rejections_are_not_retried():
+    outbox = make_outbox(max_attempts=3)
+    FakeSMTP.failures = [smtplib.SMTPRecipientsRefused({'bad@example.com': (550, b'No such user')})]
+
+    outbox.enqueue('bad@example.com', 'Your OTP', '123456')
+    outbox.enqueue('good@example.com', 'Your OTP', '123456')
+    assert outbox.flush(timeout=5)
+    outbox.close()
+
+    stats = outbox.stats()
+    assert stats['failed'] == 1
+    assert stats['sent'] == 1
+    assert stats['retried'] == 0
+
+
+def test_enqueue_rejects_when_full():
+    outbox = make_outbox(max_queue=1)
+    outbox._pid = os.getpid()  # keep the sender threads from draining the queue
+
+    assert outbox.enqueue('a@example.com', 'Your OTP', '1')
+    assert not outbox.enqueue('b@example.com', 'Your OTP', '2')
+    assert outbox.stats()['rejected'] == 1
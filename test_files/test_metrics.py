@@ -0,0 +1,39 @@
+# test_metrics.py
+from flask import Flask
+
+from metrics import LatencyHistogram, RequestMetrics, record_timing, stats_lines
+
+
+def test_request_breakdown_is_recorded_and_sent_as_server_timing():
+    app = Flask(__name__)
+    request_metrics = RequestMetrics()
+    request_metrics.init_app(app)
+
+    @app.route('/work')
+    def work():
+        record_timing('db', 2.0)
+        record_timing('db', 3.0)
+        return 'ok'
+
+    response = app.test_client().get('/work')
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('db;dur=5.00, app;dur=')
+    assert 'total;dur=' in timing
+
+    text = request_metrics.render()
+    assert 'http_requests_total{endpoint="work",method="GET",status="200"} 1' in text
+    assert 'http_request_db_seconds_sum{endpoint="work",method="GET"} 0.005' in text
+
+
+def test_stats_lines_converts_milliseconds_and_counters():
+    histogram = LatencyHistogram(buckets=(10,))
+    histogram.observe(4)
+    lines = stats_lines('pool', {'in_use': 2, 'checkouts': 7, 'wait_time_total_ms': 1500.0,
+                                 'latency_ms': histogram.snapshot(), 'mode': 'thread'},
+                        counters=('checkouts', 'wait_time_total_ms'))
+
+    assert 'pool_in_use 2' in lines
+    assert 'pool_checkouts_total 7' in lines
+    assert 'pool_wait_time_seconds_total 1.5' in lines
+    assert 'pool_latency_seconds_bucket{le="0.01"} 1' in lines
+    assert not any('mode' in line for line in lines)
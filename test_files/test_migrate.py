@@ -0,0 +1,63 @@
+# test_migrate.py
+import os
+
+import pytest
+
+from migrate import Migration, load_migrations, migrate
+
+
+def test_migration_parses_statements_and_concurrent_indexes():
+    migration = Migration(9, 'indexes', """
+        -- Comment lines are dropped; so is anything they contain;
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON a (x);
+        CREATE UNIQUE INDEX CONCURRENTLY idx_b ON b (y);
+        DROP INDEX CONCURRENTLY IF EXISTS idx_old;
+    """)
+    assert len(migration.statements) == 3
+    assert not migration.transactional
+    assert migration.concurrent_indexes == ['idx_a', 'idx_b']
+
+    table = Migration(1, 'schema', "CREATE TABLE t (id INT);\nCREATE INDEX idx_t ON t (id);")
+    assert table.transactional
+    assert table.concurrent_indexes == []
+
+    function = Migration(10, 'function', """
+        CREATE FUNCTION f() RETURNS TEXT LANGUAGE plpgsql AS $$
+        BEGIN
+            RETURN 'a;b'; -- not the end of the statement;
+        END
+        $$;
+        COMMENT ON FUNCTION f() IS 'it''s; fine'; -- trailing comment
+    """)
+    assert len(function.statements) == 2
+    assert "RETURN 'a;b';" in function.statements[0]
+    assert function.statements[1] == "COMMENT ON FUNCTION f() IS 'it''s; fine'"
+
+
+def test_load_migrations_orders_by_version_and_rejects_bad_names(tmp_path):
+    migrations = load_migrations()
+    assert [m.version for m in migrations] == list(range(1, len(migrations) + 1))
+
+    (tmp_path / '0002_second.sql').write_text('SELECT 2;')
+    (tmp_path / '0001_first.sql').write_text('SELECT 1;')
+    (tmp_path / 'notes.txt').write_text('ignored')
+    assert [(m.version, m.name) for m in load_migrations(str(tmp_path))] == [(1, 'first'), (2, 'second')]
+
+    (tmp_path / 'third.sql').write_text('SELECT 3;')
+    with pytest.raises(ValueError):
+        load_migrations(str(tmp_path))
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason='set TEST_DATABASE_URL to an empty local database')
+def test_migrate_builds_schema_once():
+    import psycopg2
+
+    conn = psycopg2.connect(os.environ['TEST_DATABASE_URL'])
+    try:
+        migrate(conn, log=lambda message: None)
+        assert migrate(conn, log=lambda message: None) == []
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM pg_index WHERE NOT indisvalid")
+            assert cur.fetchone()[0] == 0
+    finally:
+        conn.close()
@@ -0,0 +1,33 @@
+# test_mood_trends.py
+from datetime import date
+
+import pytest
+
+from mood_trends import next_period, period_start, previous_period, summarize_streaks, trend_range
+
+
+def test_periods_align_to_monday_and_first_of_month():
+    assert period_start(date(2026, 10, 18), 'week') == date(2026, 10, 12)
+    assert period_start(date(2026, 10, 18), 'month') == date(2026, 10, 1)
+    assert next_period(date(2026, 12, 1), 'month') == date(2027, 1, 1)
+    assert previous_period(date(2026, 1, 1), 'month') == date(2025, 12, 1)
+
+
+def test_trend_range_defaults_and_limits():
+    today = date(2026, 10, 18)
+    assert trend_range({}, today) == ('week', date(2026, 7, 27), date(2026, 10, 19))
+    assert trend_range({'period': 'month', 'start': '2026-02-10', 'end': '2026-04-01'}, today) == \
+        ('month', date(2026, 2, 1), date(2026, 4, 1))
+
+    with pytest.raises(ValueError):
+        trend_range({'period': 'year'}, today)
+    with pytest.raises(ValueError):
+        trend_range({'start': '1990-01-01'}, today)
+
+
+def test_streaks_are_clipped_to_the_range():
+    runs = [(date(2026, 9, 1), date(2026, 9, 10)), (date(2026, 10, 15), date(2026, 10, 17))]
+    streaks = summarize_streaks(runs, date(2026, 9, 5), date(2026, 10, 19), today=date(2026, 10, 18))
+
+    assert streaks['current'] == 3
+    assert streaks['longest'] == {'days': 6, 'start': '2026-09-05', 'end': '2026-09-10'}
@@ -0,0 +1,99 @@
+# test_otp_store.py
+from otp_store import OTPStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_codes_are_used_up_and_replaced():
+    store = OTPStore(clock=FakeClock())
+
+    store.issue('email:a@example.com', '111111', ttl=60)
+    store.issue('email:a@example.com', '222222', ttl=60)
+    assert not store.verify('email:a@example.com', '111111')
+    assert not store.verify('email:b@example.com', '222222')
+    assert store.verify('email:a@example.com', '222222')
+    assert not store.verify('email:a@example.com', '222222')
+
+    stats = store.stats()
+    assert stats['issued'] == 2
+    assert stats['verified'] == 1
+    assert stats['rejected'] == 3
+    assert stats['live'] == 0
+
+
+def test_codes_expire_in_order():
+    clock = FakeClock()
+    store = OTPStore(clock=clock)
+
+    store.issue('a', '111111', ttl=10)
+    store.issue('b', '222222', ttl=30)
+    store.issue('a', '333333', ttl=60)  # reissued: the old expiry no longer applies
+    clock.now += 40
+    assert store.peek('b') is None
+    assert store.peek('a')[0] == '333333'
+    assert store.stats()['expired'] == 1
+    clock.now += 30
+    assert not store.verify('a', '333333')
+
+
+class SharedBackend:
+    """Stands in for otp_codes shared by every worker, flushed as soon as it is written"""
+
+    def __init__(self):
+        self.codes = {}
+        self.flushes = self.rows_written = self.errors = 0
+
+    def save(self, key, code, expires_at):
+        self.codes[key] = (code, expires_at)
+
+    def delete(self, key):
+        self.codes.pop(key, None)
+
+    def load(self, key):
+        return self.codes.get(key)
+
+    def consume(self, key, code):
+        if key in self.codes and self.codes[key][0] == code:
+            del self.codes[key]
+            return True
+        return False
+
+    def pending(self):
+        return 0
+
+
+def test_a_resend_on_another_worker_replaces_the_cached_code():
+    clock = FakeClock()
+    backend = SharedBackend()
+    worker_a = OTPStore(backend, clock=clock)
+    worker_b = OTPStore(backend, clock=clock)
+
+    worker_a.issue('email:a@example.com', '111111', ttl=600)
+    assert not worker_b.verify('email:a@example.com', '999999')  # a typo; B now caches 111111
+    clock.now += 30
+    worker_a.issue('email:a@example.com', '222222', ttl=600)  # "resend code"
+
+    assert worker_b.verify('email:a@example.com', '222222')
+    assert worker_b.stats()['loaded'] == 2
+    assert not worker_b.verify('email:a@example.com', '111111')
+    # Used up on B, so A's own copy no longer counts
+    assert not worker_a.verify('email:a@example.com', '222222')
+
+
+def test_an_unflushed_code_is_not_replaced_by_an_older_one():
+    clock = FakeClock()
+    backend = SharedBackend()
+    store = OTPStore(backend, clock=clock)
+
+    backend.save('email:a@example.com', '111111', clock.now + 600)
+    clock.now += 30
+    store.issue('email:a@example.com', '222222', ttl=600)
+    backend.codes['email:a@example.com'] = ('111111', 1600.0)  # the write-behind hasn't run yet
+    assert not store.verify('email:a@example.com', '111111')
+    assert store.peek('email:a@example.com')[0] == '222222'
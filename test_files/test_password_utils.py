@@ -1,5 +1,5 @@
 # test_password_utils.py
-from password_manager import PasswordManager
+from password_manager import PasswordManager, PasswordManagerBusy
 
 def test_password_manager():
     manager=PasswordManager()
@@ -12,6 +12,43 @@ def test_password_manager():
 
     print("All tests passed!")
 
+def test_thread_pool_mode_records_queue_time():
+    manager = PasswordManager(rounds=4, mode='thread', workers=2)
+    hashed = manager.hash_password("Brezzy123!")
+
+    assert manager.verify_password("Brezzy123!", hashed)
+    stats = manager.stats()
+    assert stats['queue_time_ms']['count'] == 2
+    assert stats['in_flight'] == 0
+    manager.shutdown()
+
+def test_busy_pool_rejects_instead_of_queueing_forever():
+    manager = PasswordManager(rounds=4, mode='thread', workers=1, max_pending=1, queue_timeout=0.01)
+    manager._slots.acquire()  # simulate a call already occupying the only slot
+
+    try:
+        manager.hash_password("Brezzy123!")
+        assert False, "expected PasswordManagerBusy"
+    except PasswordManagerBusy:
+        pass
+    assert manager.stats()['rejected'] == 1
+
+def test_stale_cost_is_rehashed_on_login():
+    old_hash = PasswordManager(rounds=4).hash_password("Brezzy123!")
+    manager = PasswordManager(rounds=5)
+
+    assert manager.needs_rehash(old_hash)
+    ok, new_hash = manager.verify_and_update("Brezzy123!", old_hash)
+    assert ok and new_hash.startswith("$2b$05$")
+    assert manager.verify_and_update("Brezzy123!", new_hash) == (True, None)
+    assert manager.verify_and_update("WrongPassword", old_hash) == (False, None)
+
+def test_calibrate_stays_within_bounds():
+    manager = PasswordManager()
+
+    assert manager.calibrate(target_ms=0.001, min_rounds=4, max_rounds=6, sample_rounds=4, samples=1) == 4
+    assert manager.calibrate(target_ms=10 ** 9, min_rounds=4, max_rounds=6, sample_rounds=4, samples=1) == 6
+
 if __name__ == "__main__":
     test_password_manager()
     print("Tests completed successfully.")
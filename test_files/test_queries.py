@@ -0,0 +1,25 @@
+# test_queries.py
+import pytest
+
+from queries import NamedQuery
+
+
+def test_named_query_numbers_placeholders():
+    query = NamedQuery('by_user', "SELECT * FROM t WHERE user_id = %(user_id)s AND day > %(day)s "
+                                  "AND name LIKE 'a%%' AND owner = %(user_id)s")
+
+    assert query == "SELECT * FROM t WHERE user_id = %(user_id)s AND day > %(day)s " \
+                    "AND name LIKE 'a%%' AND owner = %(user_id)s"
+    assert query.prepare_sql == "PREPARE by_user AS SELECT * FROM t WHERE user_id = $1 AND day > $2 " \
+                                "AND name LIKE 'a%' AND owner = $1"
+    assert query.execute_sql == 'EXECUTE by_user(%(user_id)s, %(day)s)'
+
+    positional = NamedQuery('range', 'SELECT 1 WHERE a = %s AND b < %s')
+    assert positional.prepare_sql == 'PREPARE range AS SELECT 1 WHERE a = $1 AND b < $2'
+    assert positional.execute_sql == 'EXECUTE range(%s, %s)'
+    assert NamedQuery('now', 'SELECT NOW()').execute_sql == 'EXECUTE now'
+
+
+def test_named_query_rejects_mixed_placeholders():
+    with pytest.raises(ValueError):
+        NamedQuery('mixed', 'SELECT %s, %(a)s')
@@ -0,0 +1,40 @@
+# test_query_plans.py
+from benchmarks.query_plans import check_plan, summarize_plan
+
+EXPLAIN = [{
+    'Plan': {
+        'Node Type': 'Nested Loop', 'Total Cost': 120.5, 'Actual Rows': 3,
+        'Shared Hit Blocks': 40, 'Shared Read Blocks': 2,
+        'Plans': [
+            {'Node Type': 'Seq Scan', 'Relation Name': 'moods', 'Total Cost': 1.0},
+            {'Node Type': 'Seq Scan', 'Relation Name': 'journal_entries', 'Total Cost': 100.0},
+            {'Node Type': 'Index Scan', 'Relation Name': 'daily_journals', 'Total Cost': 8.3},
+        ],
+    },
+    'Execution Time': 1.25,
+}]
+
+
+def test_summarize_plan_flags_seq_scans_on_large_tables_only():
+    summary = summarize_plan(EXPLAIN, {'moods': 5, 'journal_entries': 50000}, large_table_rows=10000)
+
+    assert summary['cost'] == 120.5
+    assert summary['buffers'] == 42
+    assert summary['rows'] == 3
+    assert summary['tables'] == ['daily_journals', 'journal_entries', 'moods']
+    assert summary['seq_scans'] == ['journal_entries', 'moods']
+    assert summary['large_seq_scans'] == ['journal_entries']
+
+
+def test_check_plan_applies_budgets_with_tolerance():
+    summary = summarize_plan(EXPLAIN, {}, large_table_rows=10000)
+
+    assert check_plan(summary, None, tolerance=0.5) == []
+    assert check_plan(summary, {'cost': 100, 'buffers': 40}, tolerance=0.5) == []
+    assert check_plan(summary, {'cost': 50, 'buffers': 20}, tolerance=0.5) == [
+        'cost 120.5 over budget 50', 'buffers 42 over budget 20']
+
+    large = summarize_plan(EXPLAIN, {'journal_entries': 50000}, large_table_rows=10000)
+    assert check_plan(large, {'cost': 200, 'buffers': 50}, tolerance=0.5) == ['seq scan on journal_entries']
+    allowed = {'cost': 200, 'buffers': 50, 'allow_seq_scan': ['journal_entries']}
+    assert check_plan(large, allowed, tolerance=0.5) == []
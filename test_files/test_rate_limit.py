@@ -0,0 +1,55 @@
+# test_rate_limit.py
+from rate_limit import MemoryBuckets, RateLimiter, parse_rules
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_a_burst_then_refills():
+    clock = FakeClock()
+    buckets = MemoryBuckets(clock=clock)
+
+    assert [buckets.take('k', 3, 10.0) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take('k', 3, 10.0) == 10.0
+    clock.now += 10
+    assert buckets.take('k', 3, 10.0) == 0
+    assert buckets.take('k', 3, 10.0) == 10.0
+
+    # Refilled buckets are dropped by the sweep; live ones are kept
+    buckets.take('other', 3, 10.0)
+    clock.now += 100
+    buckets.take('new', 3, 10.0)
+    assert len(buckets) == 1
+
+    # Over max_keys, the buckets closest to full are forgotten, not the earliest created
+    crowded = MemoryBuckets(max_keys=2, clock=clock)
+    for _ in range(3):
+        crowded.take('busy', 5, 10.0)
+    crowded.take('quiet', 5, 10.0)
+    clock.now += 1
+    crowded.take('late', 5, 10.0)
+    assert crowded.evicted == 1
+    assert crowded.take('busy', 1, 10.0) > 0  # kept, so still drained
+    assert crowded.take('quiet', 1, 10.0) == 0  # forgotten, so a fresh bucket
+
+
+def test_limiter_sheds_per_scope_and_counts():
+    rules = parse_rules('signin.ip=2/60,signin.email=1/60,signup.ip=0/1')
+    limiter = RateLimiter(rules, MemoryBuckets())
+
+    assert limiter.check('signin', ip='1.2.3.4', email='A@example.com') == 0
+    assert limiter.check('signin', ip='5.6.7.8', email=' a@example.com') > 0
+    assert limiter.check('signin', ip='1.2.3.4', email='b@example.com') == 0
+    assert limiter.check('signin', ip='1.2.3.4', email='c@example.com') > 0
+    assert all(limiter.check('signup', ip='1.2.3.4', email=f'{i}@x') == 0 for i in range(3))
+
+    stats = limiter.stats()
+    assert stats['shed_signin_email'] == 1
+    assert stats['shed_signin_ip'] == 1
+    assert stats['admitted_signin'] == 2
+    assert stats['shed'] == 2
@@ -0,0 +1,28 @@
+# test_resource_versions.py
+from resource_versions import ENTRIES, get_version, version_etag
+
+
+class FakeCursor:
+    def __init__(self, row):
+        self.row = row
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return self.row
+
+
+def test_etag_changes_with_version_and_vary_values():
+    etag = version_etag(ENTRIES, 3, 1, b'limit=5')
+
+    assert etag == version_etag(ENTRIES, 3, 1, b'limit=5')
+    assert etag != version_etag(ENTRIES, 4, 1, b'limit=5')
+    assert etag != version_etag(ENTRIES, 3, 2, b'limit=5')
+    assert etag != version_etag(ENTRIES, 3, 1, b'')
+
+
+def test_missing_version_row_counts_as_zero():
+    assert get_version(FakeCursor(None), 1, ENTRIES) == 0
+    assert get_version(FakeCursor((7,)), 1, ENTRIES) == 7
+    assert get_version(FakeCursor({'version': 9}), 1, ENTRIES) == 9